@@ -0,0 +1,170 @@
+"""Year-based archival of old attendance into per-year SQLite files.
+
+A closed academic year's attendance is moved out of the live ``attendance`` table
+of a school's shard into ``attendance_<year>.db`` in the school's ARCHIVE_DIR, so the live table and its index only
+hold current data. Report queries for an archived month ATTACH that file and read
+the same columns from it (see ``attendance_table``), so they return the same rows.
+
+    python archive.py                # list academic years and where their data lives
+    python archive.py 2022 2023      # archive the given academic years
+    python archive.py --all          # archive every closed academic year
+    python archive.py --school north --all
+"""
+import argparse
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import date
+
+import aiosqlite
+
+import tenancy
+from config import ACADEMIC_YEAR_START_MONTH, ARCHIVE_DIR, SQLITE_BUSY_TIMEOUT_MS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS archive.attendance (
+        id INTEGER PRIMARY KEY,
+        student_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        UNIQUE(student_id, date)
+    )
+"""
+
+
+def academic_year_of(year: int, month: int) -> int:
+    """Return the academic year (named by the calendar year it starts in) of a month."""
+    return year if month >= ACADEMIC_YEAR_START_MONTH else year - 1
+
+
+def year_bounds(academic_year: int) -> tuple[str, str]:
+    """Return the [start, end) dates of an academic year as YYYY-MM-DD strings."""
+    return (
+        f"{academic_year}-{ACADEMIC_YEAR_START_MONTH:02d}-01",
+        f"{academic_year + 1}-{ACADEMIC_YEAR_START_MONTH:02d}-01",
+    )
+
+
+def is_closed(academic_year: int, today: date | None = None) -> bool:
+    """Return True once the academic year has ended."""
+    today = today or date.today()
+    return year_bounds(academic_year)[1] <= today.isoformat()
+
+
+def archive_path(academic_year: int) -> str:
+    """Return the current school's archive file for an academic year."""
+    return os.path.join(tenancy.scoped_dir(ARCHIVE_DIR), f"attendance_{academic_year}.db")
+
+
+@asynccontextmanager
+async def attendance_table(conn: aiosqlite.Connection, year: int, month: int):
+    """Yield the table holding a month's attendance, attaching its archive for the block."""
+    academic_year = academic_year_of(year, month)
+    async with conn.execute("SELECT 1 FROM archived_years WHERE year = ?", (academic_year,)) as cursor:
+        archived = await cursor.fetchone() is not None
+    if not archived:
+        yield "attendance"
+        return
+    path = archive_path(academic_year)
+    if conn.in_transaction:
+        # ATTACH can't run in a transaction; a snapshot attaches its month's archive before it begins.
+        async with conn.execute("PRAGMA database_list") as cursor:
+            attached = {row[1]: row[2] for row in await cursor.fetchall()}
+        if attached.get("archive") != os.path.abspath(path):
+            raise RuntimeError(f"Archive for academic year {academic_year} is not attached to this snapshot.")
+        yield "archive.attendance"
+        return
+    # ATTACH would silently create an empty file; a missing archive must not look like no attendance.
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Archive for academic year {academic_year} is missing: {path}")
+    await conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    try:
+        yield "archive.attendance"
+    finally:
+        await conn.execute("DETACH DATABASE archive")
+
+
+async def archive_year(academic_year: int) -> int:
+    """Move a closed academic year's attendance into its archive file. Returns rows moved.
+
+    The copy, the delete and the ``archived_years`` entry commit in one transaction
+    across both files, so a failure leaves the data where it was.
+    """
+    if not is_closed(academic_year):
+        raise ValueError(f"Academic year {academic_year} has not ended yet.")
+    start, end = year_bounds(academic_year)
+    os.makedirs(os.path.dirname(archive_path(academic_year)), exist_ok=True)
+    async with aiosqlite.connect(tenancy.shard_path()) as conn:
+        # The bot's writer keeps working meanwhile; wait for it rather than fail.
+        await conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        await conn.execute("ATTACH DATABASE ? AS archive", (archive_path(academic_year),))
+        await conn.execute(ARCHIVE_SCHEMA)
+        cursor = await conn.execute(
+            """
+            INSERT OR IGNORE INTO archive.attendance (id, student_id, date)
+            SELECT id, student_id, date FROM main.attendance WHERE date >= ? AND date < ?
+            """,
+            (start, end),
+        )
+        moved = cursor.rowcount
+        await conn.execute("DELETE FROM main.attendance WHERE date >= ? AND date < ?", (start, end))
+        await conn.execute(
+            """
+            INSERT INTO archived_years (year, rows, archived_at) VALUES (?, ?, datetime('now'))
+            ON CONFLICT(year) DO UPDATE SET rows = rows + excluded.rows, archived_at = excluded.archived_at
+            """,
+            (academic_year, moved),
+        )
+        await conn.commit()
+    logger.info("Archived %d attendance rows of academic year %d.", moved, academic_year)
+    return moved
+
+
+async def year_overview() -> dict[int, dict]:
+    """Return {academic_year: {"live": rows, "archived": rows}} for every year with data."""
+    overview: dict[int, dict] = {}
+    async with aiosqlite.connect(tenancy.shard_path()) as conn:
+        async with conn.execute(
+            "SELECT substr(date, 1, 7), COUNT(*) FROM attendance GROUP BY substr(date, 1, 7)"
+        ) as cursor:
+            for month_str, count in await cursor.fetchall():
+                year, month = map(int, month_str.split("-"))
+                entry = overview.setdefault(academic_year_of(year, month), {"live": 0, "archived": 0})
+                entry["live"] += count
+        async with conn.execute("SELECT year, rows FROM archived_years") as cursor:
+            for year, rows in await cursor.fetchall():
+                overview.setdefault(year, {"live": 0, "archived": 0})["archived"] = rows
+    return dict(sorted(overview.items()))
+
+
+async def _main(school: str, years: list[int], archive_all: bool) -> None:
+    import db  # db imports this module; only the command line needs the reverse.
+
+    if db.backend() != "sqlite":
+        raise SystemExit("Archival applies to the SQLite backend only.")
+    tenancy.activate(school)
+    await db.init_db()
+    await db.close()
+    overview = await year_overview()
+    if archive_all:
+        years = [year for year, entry in overview.items() if entry["live"] and is_closed(year)]
+    if not years:
+        for year, entry in overview.items():
+            state = "مغلق" if is_closed(year) else "جارٍ"
+            print(f"{year}/{year + 1} ({state}): {entry['live']} سجل نشط، {entry['archived']} سجل مؤرشف")
+        return
+    for year in years:
+        moved = await archive_year(year)
+        print(f"تمت أرشفة {moved} سجل من العام الدراسي {year}/{year + 1} إلى {archive_path(year)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="أرشفة حضور الأعوام الدراسية المنتهية.")
+    parser.add_argument("years", nargs="*", type=int, help="الأعوام الدراسية المراد أرشفتها (سنة البداية)")
+    parser.add_argument("--all", action="store_true", help="أرشفة كل الأعوام المنتهية")
+    parser.add_argument("--school", default=tenancy.DEFAULT_SCHOOL, help="معرّف المدرسة")
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    asyncio.run(_main(args.school, args.years, args.all))
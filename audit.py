@@ -0,0 +1,74 @@
+"""Append-only audit log of attendance changes, written in batches.
+
+``record`` only appends to an in-memory buffer, so a toggle costs no extra
+database write. ``flush`` — run every AUDIT_FLUSH_INTERVAL seconds, before the
+history is read and at shutdown — inserts the buffered entries with one
+``executemany`` transaction per school. Entries from a failed flush are kept
+and retried on the next one.
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+
+import db
+import tenancy
+
+logger = logging.getLogger(__name__)
+
+MARKED = "mark"
+REMOVED = "remove"
+
+
+@dataclass(frozen=True, slots=True)
+class AuditEntry:
+    school: str
+    teacher_id: int
+    student_id: int
+    date: str
+    action: str
+    changed_at: str
+
+
+_pending: list[AuditEntry] = []
+
+
+def record(teacher_id: int, student_id: int, date: str, action: str) -> None:
+    """Buffer one change made by ``teacher_id`` in the current school."""
+    _pending.append(AuditEntry(
+        tenancy.current(), teacher_id, student_id, date, action, datetime.now().isoformat(timespec="seconds")
+    ))
+
+
+def pending() -> int:
+    """Return how many entries are waiting to be written."""
+    return len(_pending)
+
+
+async def flush() -> int:
+    """Write every buffered entry and return how many were written."""
+    global _pending
+    if not _pending:
+        return 0
+    batch, _pending = _pending, []
+    by_school: dict[str, list[AuditEntry]] = defaultdict(list)
+    for entry in batch:
+        by_school[entry.school].append(entry)
+
+    written = 0
+    for school, entries in by_school.items():
+        rows = [(e.teacher_id, e.student_id, e.date, e.action, e.changed_at) for e in entries]
+        try:
+            with tenancy.use(school):
+                await db.add_audit_entries(rows)
+        except Exception:
+            logger.exception("Writing %d audit entries of school %s failed; will retry", len(rows), school)
+            _pending[:0] = entries
+        else:
+            written += len(rows)
+    return written
+
+
+async def flush_job(context) -> None:
+    """Job: write the buffered audit entries."""
+    await flush()
@@ -0,0 +1,5 @@
+"""Benchmarks for the database, report and attendance paths."""
+import os
+
+# config.py refuses to import without a token; benchmarks never talk to Telegram.
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
@@ -0,0 +1,325 @@
+"""Run one scripted workload against every storage backend, compare and time it.
+
+Each backend gets the same sequence of repository calls — teachers, students with
+Arabic names, attendance across month and year boundaries, renames, moves and
+cascading removals. Every read's result is recorded with ids replaced by their
+creation order, and the transcripts must be identical across backends.
+
+Usage:
+    python -m benchmarks.backends                                  # SQLite only
+    python -m benchmarks.backends --postgres postgresql://localhost/attendance
+    python -m benchmarks.backends --start-postgres                 # temporary local cluster
+    PG_DSN=postgresql://localhost/attendance python -m benchmarks.backends
+
+``--start-postgres`` needs ``initdb`` and ``pg_ctl`` on PATH, a user other than
+root (PostgreSQL refuses to run as root) and the ``asyncpg`` package. The exit
+status is 1 when a backend's results differ from SQLite's.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from benchmarks.datagen import arabic_name
+
+import tenancy
+from storage.base import Repository
+
+DATES = ["2024-11-29", "2024-12-06", "2024-12-27", "2025-01-03", "2025-01-10", "2025-02-28"]
+MONTHS = [(2024, 11), (2024, 12), (2025, 1), (2025, 2), (2025, 3)]
+
+
+class _Transcript:
+    """Times repository calls and records their results with ids made backend-neutral."""
+
+    def __init__(self):
+        self.entries: list[tuple] = []
+        self.timings: dict[str, list[float]] = defaultdict(list)
+        self._ids: dict[tuple[str, int], int] = {}
+
+    def register(self, kind: str, real_id: int) -> int:
+        self._ids[(kind, real_id)] = len(self._ids)
+        return real_id
+
+    def neutral(self, kind: str, real_id):
+        return None if real_id is None else self._ids.get((kind, real_id), "?")
+
+    def _normalize(self, value):
+        if isinstance(value, dict):
+            out = {}
+            for key, item in value.items():
+                if key in ("id", "teacher_id", "student_id"):
+                    kind = "teacher" if key == "teacher_id" or "telegram_user_id" in value else "student"
+                    item = self.neutral(kind, item)
+                out[key] = item
+            return out
+        if isinstance(value, (list, tuple)):
+            return [self._normalize(v) for v in value]
+        if isinstance(value, set):
+            return sorted(self.neutral("student", v) for v in value)
+        return value
+
+    async def call(self, name: str, coro, record: bool = True, returns: str | None = None):
+        """Await ``coro``; ``returns`` names the kind of id it returns, if any."""
+        started = time.perf_counter()
+        result = await coro
+        self.timings[name].append((time.perf_counter() - started) * 1000)
+        if record:
+            self.entries.append((name, self.neutral(returns, result) if returns else self._normalize(result)))
+        return result
+
+
+async def _snapshot(repo: Repository, t: _Transcript, teacher_ids: list[int]):
+    await t.call("get_all_teachers", repo.get_all_teachers())
+    for teacher_id in teacher_ids:
+        await t.call("get_students_by_teacher", repo.get_students_by_teacher(teacher_id))
+        for date in DATES[:2]:
+            await t.call("get_attendance_for_date", repo.get_attendance_for_date(teacher_id, date))
+        for year, month in MONTHS:
+            await t.call("get_attendance_for_month", repo.get_attendance_for_month(teacher_id, year, month))
+            await t.call(
+                "get_attendance_dates_for_month", repo.get_attendance_dates_for_month(teacher_id, year, month)
+            )
+
+
+async def _searches(repo: Repository, t: _Transcript, teacher_ids: list[int]):
+    for text in ("اسامة", "أسامه ابر", "مصطفي", "ادم", "م", "  ", "لا_يوجد"):
+        await t.call("search_students", repo.search_students(text, None, 50))
+        await t.call("search_students", repo.search_students(text, teacher_ids[1], 50))
+
+
+async def run_workload(repo: Repository, telegram_base: int, students_per_teacher: int = 12, seed: int = 1):
+    """Run the scripted workload on ``repo`` and return its transcript."""
+    rng = random.Random(seed)
+    t = _Transcript()
+    await repo.init()
+
+    teacher_ids = []
+    for n in range(3):
+        teacher_id = await t.call(
+            "add_teacher", repo.add_teacher(telegram_base + n, arabic_name(rng), n == 0), record=False
+        )
+        teacher_ids.append(t.register("teacher", teacher_id))
+    await t.call("get_teacher_by_telegram_id", repo.get_teacher_by_telegram_id(telegram_base))
+    await t.call("get_teacher_by_telegram_id", repo.get_teacher_by_telegram_id(telegram_base + 99))
+
+    student_ids = []
+    for teacher_id in teacher_ids:
+        names = [arabic_name(rng) for _ in range(students_per_teacher)]
+        names[-1] = names[0]  # two students with the same name
+        for name in names:
+            student_id = await t.call("add_student", repo.add_student(name, teacher_id), record=False)
+            student_ids.append(t.register("student", student_id))
+
+    # Spellings the search normalization has to fold together.
+    for name in ("أُسامة إبراهيم", "اسامه ابراهيم", "مـصطفى آدم"):
+        student_id = await t.call("add_student", repo.add_student(name, teacher_ids[1]), record=False)
+        student_ids.append(t.register("student", student_id))
+    await _searches(repo, t, teacher_ids)
+
+    for student_id in student_ids:
+        for date in DATES:
+            if rng.random() < 0.7:
+                await t.call("mark_attendance", repo.mark_attendance(student_id, date), record=False)
+    await t.call("mark_attendance", repo.mark_attendance(student_ids[0], DATES[0]), record=False)  # duplicate
+    await _snapshot(repo, t, teacher_ids)
+
+    await t.call("remove_attendance", repo.remove_attendance(student_ids[0], DATES[0]), record=False)
+    await t.call("get_student_by_id", repo.get_student_by_id(student_ids[1]))
+    await t.call("update_student_name", repo.update_student_name(student_ids[1], "اسم جديد"), returns="teacher")
+    await t.call("move_student", repo.move_student(student_ids[2], teacher_ids[1]), returns="teacher")
+    await t.call("remove_student", repo.remove_student(student_ids[3]), returns="teacher")
+    await t.call("get_student_by_id", repo.get_student_by_id(student_ids[3]))
+    await _snapshot(repo, t, teacher_ids)
+    await _searches(repo, t, teacher_ids)
+    await t.call("search_students", repo.search_students("جديد", None, 5))
+
+    history = [
+        (teacher_ids[i % 3], student_ids[i % 4], DATES[i % len(DATES)], ("mark", "remove")[i % 2],
+         f"2025-01-{i // 24 + 1:02d}T{i % 24:02d}:00:00")
+        for i in range(40)
+    ]
+    await t.call("add_audit_entries", repo.add_audit_entries(history), record=False)
+    for student_id in student_ids[:4]:
+        await t.call("get_attendance_history", repo.get_attendance_history(student_id, 10))
+
+    # The same reads through one read-only snapshot.
+    async with repo.snapshot(*MONTHS[1]):
+        await _snapshot(repo, t, teacher_ids)
+
+    await _bulk(repo, t, telegram_base, teacher_ids, student_ids, rng)
+    await _removals(repo, t, teacher_ids, student_ids)
+
+    await t.call("remove_teacher", repo.remove_teacher(teacher_ids[2]))
+    await t.call("pending_removals", repo.pending_removals())
+    await _snapshot(repo, t, teacher_ids)
+    await _searches(repo, t, teacher_ids)
+    # History outlives the students and teachers it mentions.
+    await t.call("get_attendance_history", repo.get_attendance_history(student_ids[3], 10))
+
+    for teacher_id in teacher_ids[:2] + teacher_ids[3:]:
+        await repo.remove_teacher(teacher_id)
+    return t
+
+
+async def _bulk(repo: Repository, t: _Transcript, telegram_base: int, teacher_ids: list[int],
+                student_ids: list[int], rng: random.Random):
+    """Import a roster that changes one teacher and adds another, then move several students at once."""
+    teachers = [(telegram_base + 1, "معلم معدّل", True), (telegram_base + 3, arabic_name(rng), False)]
+    students = [(telegram_base + 3, arabic_name(rng)) for _ in range(4)] + [(telegram_base, "طالب مستورد")]
+    imported = await t.call("import_roster", repo.import_roster(teachers, students), record=False)
+    teacher_ids.append(t.register("teacher", imported[telegram_base + 3]))
+    t.entries.append((
+        "import_roster",
+        sorted((telegram_id - telegram_base, t.neutral("teacher", i)) for telegram_id, i in imported.items()),
+    ))
+    # Imported students get neutral ids in the order they were inserted.
+    new_ids = []
+    for teacher_id in (teacher_ids[0], teacher_ids[3]):
+        new_ids += [s["id"] for s in await repo.get_students_by_teacher(teacher_id) if t.neutral("student", s["id"]) == "?"]
+    student_ids += [t.register("student", student_id) for student_id in sorted(new_ids)]
+    await _snapshot(repo, t, teacher_ids)
+
+    # student_ids[3] was removed and 10**9 never existed; both are skipped.
+    moved = await t.call(
+        "move_students",
+        repo.move_students([student_ids[4], student_ids[5], student_ids[3], student_ids[-1], 10**9], teacher_ids[3]),
+        record=False,
+    )
+    t.entries.append((
+        "move_students",
+        sorted((t.neutral("student", s), t.neutral("teacher", old)) for s, old in moved.items()),
+    ))
+    await t.call("move_students", repo.move_students([], teacher_ids[0]))
+    await _snapshot(repo, t, teacher_ids)
+    await _searches(repo, t, teacher_ids)
+
+
+async def _removals(repo: Repository, t: _Transcript, teacher_ids: list[int], student_ids: list[int]):
+    """Remove a student, then start removing a teacher, in batches as the bot does."""
+    await t.call("start_removal", repo.start_removal("student", student_ids[6], 1, 2))
+    while await t.call("delete_attendance_batch", repo.delete_attendance_batch("student", student_ids[6], 2)):
+        pass
+    await t.call("pending_removals", _neutral_removals(t, repo.pending_removals()), record=False)
+    await t.call("remove_student", repo.remove_student(student_ids[6]), returns="teacher")
+    await t.call("pending_removals", repo.pending_removals())
+
+    await t.call("start_removal", repo.start_removal("teacher", teacher_ids[2], None, None))
+    await t.call("start_removal", repo.start_removal("teacher", teacher_ids[2], 3, 4))  # restarted
+    await t.call("delete_attendance_batch", repo.delete_attendance_batch("teacher", teacher_ids[2], 5))
+    await t.call("pending_removals", _neutral_removals(t, repo.pending_removals()), record=False)
+    await _snapshot(repo, t, teacher_ids[2:3])
+
+
+async def _neutral_removals(t: _Transcript, coro) -> None:
+    rows = await coro
+    t.entries.append(("pending_removals", [{**r, "target_id": t.neutral(r["kind"], r["target_id"])} for r in rows]))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def local_postgres():
+    """Start a throwaway PostgreSQL cluster in a temp dir and yield its DSN."""
+    if not (shutil.which("initdb") and shutil.which("pg_ctl")):
+        raise SystemExit("--start-postgres needs initdb and pg_ctl on PATH.")
+    if os.geteuid() == 0:
+        raise SystemExit("--start-postgres cannot run as root; run as another user or pass --postgres.")
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, "data")
+        port = _free_port()
+        subprocess.run(
+            ["initdb", "-D", data, "-U", "postgres", "-A", "trust", "-E", "UTF8"],
+            check=True, capture_output=True,
+        )
+        subprocess.run(
+            ["pg_ctl", "-D", data, "-l", os.path.join(tmp, "log"), "-w",
+             "-o", f"-p {port} -k {tmp} -c listen_addresses=127.0.0.1", "start"],
+            check=True, capture_output=True,
+        )
+        try:
+            yield f"postgresql://postgres@127.0.0.1:{port}/postgres"
+        finally:
+            subprocess.run(["pg_ctl", "-D", data, "-m", "fast", "stop"], capture_output=True)
+
+
+async def _run_backend(name: str, dsn: str | None, tmp: str, args) -> _Transcript:
+    if name == "sqlite":
+        from storage.sqlite import SQLiteRepository
+
+        tenancy.DB_PATH = os.path.join(tmp, "backends.db")
+        repo = SQLiteRepository()
+    else:
+        from storage.postgres import PostgresRepository
+
+        repo = PostgresRepository(dsn)
+    # A school and Telegram ids of its own, so an existing Postgres database is left alone.
+    school = f"bench_{os.getpid()}"
+    tenancy.SHARD_DIR = tmp
+    try:
+        with tenancy.use(school):
+            return await run_workload(repo, telegram_base=10**12 + os.getpid() * 1000, seed=args.seed)
+    finally:
+        await repo.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare and time the storage backends.")
+    parser.add_argument(
+        "--postgres", metavar="DSN", default=os.environ.get("PG_DSN"),
+        help="also run against this PostgreSQL database (default: $PG_DSN)",
+    )
+    parser.add_argument("--start-postgres", action="store_true", help="start a temporary local PostgreSQL")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, (
+        local_postgres() if args.start_postgres else _nothing(args.postgres)
+    ) as dsn:
+        backends = ["sqlite"] + (["postgres"] if dsn else [])
+        transcripts = {name: asyncio.run(_run_backend(name, dsn, tmp, args)) for name in backends}
+
+    reference = transcripts["sqlite"]
+    print(f"{len(reference.entries)} recorded results per backend")
+    failed = False
+    for name, transcript in transcripts.items():
+        if name == "sqlite":
+            continue
+        for i, (expected, actual) in enumerate(zip(reference.entries, transcript.entries)):
+            if expected != actual:
+                print(f"MISMATCH [{name}] #{i} {expected[0]}:\n  sqlite:   {expected[1]}\n  {name}: {actual[1]}")
+                failed = True
+                break
+        if len(reference.entries) != len(transcript.entries):
+            print(f"MISMATCH [{name}] {len(transcript.entries)} results vs {len(reference.entries)}")
+            failed = True
+    if not failed:
+        print("All backends returned identical results." if len(backends) > 1 else "No second backend to compare.")
+
+    print(f"\n{'median ms':>48s}" + "".join(f"{name:>12s}" for name in backends))
+    for op in reference.timings:
+        row = "".join(f"{statistics.median(transcripts[b].timings[op]):12.3f}" for b in backends)
+        print(f"  {op:44s}{row}")
+    sys.exit(1 if failed else 0)
+
+
+@contextmanager
+def _nothing(value):
+    yield value
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare two benchmark result files and flag regressions.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/abc123.json benchmarks/results/def456.json
+
+Exits with status 1 when any benchmark's median is slower than the baseline by
+more than ``--threshold`` (relative) and ``--min-ms`` (absolute).
+"""
+import argparse
+import json
+import sys
+
+
+def compare(base: dict, new: dict, threshold: float, min_ms: float) -> list[tuple]:
+    """Return rows of (scale, name, base_ms, new_ms, ratio, regressed)."""
+    rows = []
+    for scale, new_scale in new["scales"].items():
+        base_scale = base["scales"].get(scale)
+        if not base_scale:
+            continue
+        for name, result in new_scale["results"].items():
+            base_result = base_scale["results"].get(name)
+            if not base_result:
+                continue
+            base_ms = base_result["median_ms"]
+            new_ms = result["median_ms"]
+            ratio = new_ms / base_ms if base_ms else float("inf")
+            regressed = ratio > 1 + threshold and new_ms - base_ms > min_ms
+            rows.append((scale, name, base_ms, new_ms, ratio, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON files.")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.20, help="relative slowdown to flag (default 0.20)")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"base {base['meta'].get('commit')}  →  new {new['meta'].get('commit')}")
+    rows = compare(base, new, args.threshold, args.min_ms)
+    for scale, name, base_ms, new_ms, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"[{scale:6s}] {name:45s} {base_ms:9.3f} → {new_ms:9.3f} ms  ({ratio:5.2f}x){flag}")
+
+    regressions = [r for r in rows if r[5]]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}.")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
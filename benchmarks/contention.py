@@ -0,0 +1,200 @@
+"""Roll-call writes while a heavy export reads the same shard.
+
+Simulated teachers toggle attendance as fast as they can while an export reads
+every month of every class, one snapshot per class, over and over until the
+run ends (--exporters such exports at once). The run is
+repeated with no export, with the export on the read-only connections
+(SQLITE_READERS) and with the export sharing the writer connection as before
+the read/write split, and reports toggle throughput and latency for each.
+
+It is also a check, exiting with status 1 when the export holds up the writer.
+With readers, every export snapshot must have run on a read-only connection
+and the export must have run for --min-export-share of the window. Toggles/s
+must stay at --min-throughput-ratio of the idle run's or more, and toggle p50
+and p99 within --max-p50-ratio and --max-p99-ratio times the idle run's. On a
+single core the export's reads take CPU from the toggles, which sets how far
+throughput falls even without lock waits; the defaults leave room for that and
+no more. The shared-writer run is shown for comparison and fails them.
+
+Usage:
+    python -m benchmarks.contention --seconds 5
+    python -m benchmarks.contention --teachers 20 --students 40 --years 3 --togglers 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.datagen import Scale, generate_database
+from benchmarks.loadtest import _percentile
+
+import tenancy
+from storage import sqlite as sqlite_storage
+from storage.sqlite import SQLiteRepository
+
+
+async def _toggler(repo: SQLiteRepository, student_ids: list[int], deadline: float, rng, latencies: list[float]):
+    today = date.today().isoformat()
+    present: set[int] = set()
+    while time.perf_counter() < deadline:
+        student_id = rng.choice(student_ids)
+        started = time.perf_counter()
+        if student_id in present:
+            await repo.remove_attendance(student_id, today)
+            present.discard(student_id)
+        else:
+            await repo.mark_attendance(student_id, today)
+            present.add(student_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def _export(repo: SQLiteRepository, teacher_ids: list[int], months: list[tuple[int, int]], deadline: float):
+    """Read every class's attendance month by month, over and over, until the deadline.
+
+    Return the queries run, the snapshots taken, how many of those ran on a
+    read-only connection and the seconds spent exporting.
+    """
+    queries = snapshots = on_readers = 0
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for teacher_id in teacher_ids:
+            async with repo.snapshot():
+                snapshots += 1
+                # A snapshot binds a read-only connection only when readers are enabled.
+                if sqlite_storage._snapshot.get() is not None:
+                    on_readers += 1
+                await repo.get_students_by_teacher(teacher_id)
+                for year, month in months:
+                    if time.perf_counter() >= deadline:
+                        break
+                    await repo.get_attendance_for_month(teacher_id, year, month)
+                    await repo.get_attendance_dates_for_month(teacher_id, year, month)
+                    queries += 2
+            if time.perf_counter() >= deadline:
+                break
+    return queries, snapshots, on_readers, time.perf_counter() - started
+
+
+async def run_mode(readers: int | None, args) -> dict:
+    """One run: ``readers`` read-only connections for the export, or None for no export."""
+    repo = SQLiteRepository(readers=readers or 0)
+    try:
+        teachers = await repo.get_all_teachers()
+        classes = {t["id"]: [s["id"] for s in await repo.get_students_by_teacher(t["id"])] for t in teachers}
+        today = date.today()
+        months = [
+            ((today.month - 1 - i) // 12 + today.year, (today.month - 1 - i) % 12 + 1)
+            for i in range(12 * args.years)
+        ]
+        deadline = time.perf_counter() + args.seconds
+        latencies: list[float] = []
+        togglers = [
+            _toggler(repo, classes[t["id"]], deadline, random.Random(t["id"]), latencies)
+            for t in teachers[: args.togglers]
+        ]
+        # Each exporter starts at a different class, so together they keep every reader busy.
+        export = [
+            _export(repo, list(classes)[i:] + list(classes)[:i], months, deadline)
+            for i in range(args.exporters if readers is not None else 0)
+        ]
+        results = await asyncio.gather(*togglers, *export)
+    finally:
+        await repo.close()
+    exported = results[len(togglers):]
+    queries, snapshots, on_readers = (sum(e[i] for e in exported) for i in range(3))
+    export_seconds = min((e[3] for e in exported), default=0.0)
+    return {
+        "mode": "idle" if readers is None else (f"{readers} readers" if readers else "shared writer"),
+        "toggles_per_s": round(len(latencies) / args.seconds, 1),
+        "toggle_p50_ms": round(statistics.median(latencies), 3),
+        "toggle_p99_ms": round(_percentile(latencies, 0.99), 3),
+        "export_queries_per_s": round(queries / args.seconds, 1),
+        "export_snapshots": snapshots,
+        "export_snapshots_on_readers": on_readers,
+        "export_share": round(min(export_seconds / args.seconds, 1.0), 3),
+    }
+
+
+def check(idle: dict, run: dict, args) -> list[str]:
+    """Return why the export in ``run`` held up the writer, or nothing if it did not."""
+    failures = []
+    if not run["export_snapshots"]:
+        failures.append("the export took no snapshot")
+    elif run["export_snapshots_on_readers"] < run["export_snapshots"]:
+        failures.append(
+            f"{run['export_snapshots'] - run['export_snapshots_on_readers']} of {run['export_snapshots']} "
+            "export snapshots ran on the writer connection"
+        )
+    if run["export_share"] < args.min_export_share:
+        failures.append(f"the export ran for {run['export_share']:.0%} of the window (at least {args.min_export_share:.0%})")
+    throughput = run["toggles_per_s"] / idle["toggles_per_s"]
+    if throughput < args.min_throughput_ratio:
+        failures.append(f"toggles/s fell to {throughput:.2f}x the idle run's (at least {args.min_throughput_ratio:g}x)")
+    for stat, limit in (("p50", args.max_p50_ratio), ("p99", args.max_p99_ratio)):
+        ratio = run[f"toggle_{stat}_ms"] / idle[f"toggle_{stat}_ms"]
+        if ratio > limit:
+            failures.append(f"toggle {stat} was {ratio:.2f}x the idle run's (limit {limit:g}x)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure roll-call writes under a concurrent heavy export.")
+    parser.add_argument("--teachers", type=int, default=10)
+    parser.add_argument("--students", type=int, default=300, help="students per teacher")
+    parser.add_argument("--years", type=int, default=5, help="years of attendance history, all exported")
+    parser.add_argument("--togglers", type=int, default=10, help="teachers toggling at the same time")
+    parser.add_argument("--readers", type=int, default=2, help="read-only connections for the export")
+    parser.add_argument("--exporters", type=int, default=1, help="export tasks running at once")
+    parser.add_argument("--seconds", type=float, default=5.0, help="length of each run")
+    parser.add_argument(
+        "--min-throughput-ratio", type=float, default=0.4, help="fewest toggles/s with the export, as a share of idle"
+    )
+    parser.add_argument(
+        "--max-p50-ratio", type=float, default=2.5, help="largest toggle p50 with the export, as a multiple of idle"
+    )
+    parser.add_argument(
+        "--max-p99-ratio", type=float, default=2.0, help="largest toggle p99 with the export, as a multiple of idle"
+    )
+    parser.add_argument(
+        "--min-export-share", type=float, default=0.9, help="least part of the window the export must run for"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "contention.db")
+        generate_database(path, Scale("contention", args.teachers, args.students, args.years), admins=0)
+        tenancy.DB_PATH = path
+        results = [asyncio.run(run_mode(readers, args)) for readers in (None, args.readers, 0)]
+
+    idle, with_readers, shared = results
+    print(
+        f"{'mode':>14s}{'toggles/s':>11s}{'x idle':>8s}{'p50 ms':>9s}{'x idle':>8s}{'p99 ms':>9s}{'x idle':>8s}"
+        f"{'export q/s':>12s}{'snapshots':>11s}"
+    )
+    for r in results:
+        print(
+            f"{r['mode']:>14s}{r['toggles_per_s']:11.1f}{r['toggles_per_s'] / idle['toggles_per_s']:8.2f}"
+            f"{r['toggle_p50_ms']:9.2f}{r['toggle_p50_ms'] / idle['toggle_p50_ms']:8.2f}"
+            f"{r['toggle_p99_ms']:9.2f}{r['toggle_p99_ms'] / idle['toggle_p99_ms']:8.2f}"
+            f"{r['export_queries_per_s']:12.1f}{r['export_snapshots']:11d}"
+        )
+
+    print(f"\nShared writer, for comparison: {'; '.join(check(idle, shared, args)) or 'no hold-up'}.")
+    failures = check(idle, with_readers, args)
+    if failures:
+        print(f"FAIL ({with_readers['mode']}): {'; '.join(failures)}.")
+        sys.exit(1)
+    print(
+        f"OK ({with_readers['mode']}): the export ran on read-only connections for "
+        f"{with_readers['export_share']:.0%} of the window; toggles kept {args.min_throughput_ratio:g}x idle "
+        f"throughput or more, with p50 within {args.max_p50_ratio:g}x and p99 within {args.max_p99_ratio:g}x idle."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Synthetic attendance databases with realistic Arabic names."""
+import asyncio
+import os
+import random
+import sqlite3
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import db
+import tenancy
+
+FIRST_NAMES = [
+    "مينا", "مارك", "بيتر", "جورج", "مايكل", "أندرو", "بولس", "بطرس", "يوحنا", "متى",
+    "لوقا", "مرقس", "توماس", "فيلبس", "إسحق", "يعقوب", "يوسف", "داود", "إبراهيم", "موسى",
+    "كيرلس", "أثناسيوس", "أنطونيوس", "باخوميوس", "شنودة", "أبانوب", "مكاريوس", "ديفيد", "رامي", "هاني",
+    "مريم", "مارينا", "ماريا", "كريستين", "ساندرا", "فيبي", "إيريني", "دميانة", "مرثا", "رفقة",
+    "سارة", "رحاب", "نادية", "جوليا", "كاترين", "فيرونيكا", "يوستينا", "مادونا", "ميرنا", "نانسي",
+]
+
+FAMILY_NAMES = [
+    "جرجس", "عبد المسيح", "حنا", "ميخائيل", "فهمي", "لبيب", "شحاتة", "بشارة", "غالي", "رزق",
+    "سعد", "منصور", "عياد", "إسكندر", "نصيف", "صليب", "فرج", "تادرس", "واصف", "زكي",
+    "عزيز", "نجيب", "سمعان", "قلادة", "بطرس", "جاد", "يسى", "عوض", "مرقس", "كامل",
+]
+
+
+@dataclass(frozen=True)
+class Scale:
+    """Size of a generated database."""
+
+    name: str
+    teachers: int
+    students_per_teacher: int
+    years: int
+
+    @property
+    def students(self) -> int:
+        return self.teachers * self.students_per_teacher
+
+
+SCALES = {
+    "small": Scale("small", teachers=5, students_per_teacher=15, years=1),
+    "medium": Scale("medium", teachers=20, students_per_teacher=30, years=3),
+    "large": Scale("large", teachers=50, students_per_teacher=60, years=5),
+}
+
+# Generated teacher N gets Telegram id TELEGRAM_ID_BASE + N.
+TELEGRAM_ID_BASE = 100_000
+
+
+def arabic_name(rng: random.Random) -> str:
+    """Return a three-part Arabic name: given, father's and family name."""
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(FIRST_NAMES[:30])} {rng.choice(FAMILY_NAMES)}"
+
+
+def session_dates(years: int, end: date | None = None, weekday: int = 4) -> list[str]:
+    """Return weekly session dates (Fridays by default) covering ``years`` years up to ``end``."""
+    end = end or date.today()
+    day = end - timedelta(days=365 * years)
+    day += timedelta(days=(weekday - day.weekday()) % 7)
+    dates = []
+    while day <= end:
+        dates.append(day.isoformat())
+        day += timedelta(days=7)
+    return dates
+
+
+async def _init_schema():
+    await db.init_db()
+    await db.close()
+
+
+def generate_database(
+    path: str,
+    scale: Scale,
+    attendance_rate: float = 0.75,
+    seed: int = 1,
+    admins: int = 1,
+) -> dict:
+    """Create a fresh database at ``path`` filled according to ``scale``.
+
+    The schema comes from ``db.init_db``; rows are bulk-inserted with ``executemany``.
+    The first ``admins`` teachers are admins. Returns a summary dict with the row counts.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    tenancy.DB_PATH = path
+    asyncio.run(_init_schema())
+
+    rng = random.Random(seed)
+    dates = session_dates(scale.years)
+    conn = sqlite3.connect(path)
+    try:
+        conn.executemany(
+            "INSERT INTO teachers (id, telegram_user_id, name, is_admin) VALUES (?, ?, ?, ?)",
+            [
+                (t, TELEGRAM_ID_BASE + t, arabic_name(rng), 1 if t <= admins else 0)
+                for t in range(1, scale.teachers + 1)
+            ],
+        )
+        students = [
+            (s, arabic_name(rng), (s - 1) // scale.students_per_teacher + 1)
+            for s in range(1, scale.students + 1)
+        ]
+        conn.executemany("INSERT INTO students (id, name, teacher_id) VALUES (?, ?, ?)", students)
+
+        # Each student has a personal attendance tendency around the global rate.
+        attendance = []
+        for student_id, _, _ in students:
+            rate = min(1.0, max(0.05, rng.gauss(attendance_rate, 0.15)))
+            attendance.extend((student_id, d) for d in dates if rng.random() < rate)
+        conn.executemany("INSERT INTO attendance (student_id, date) VALUES (?, ?)", attendance)
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {
+        "teachers": scale.teachers,
+        "students": scale.students,
+        "sessions": len(dates),
+        "attendance_rows": len(attendance),
+        "first_date": dates[0],
+        "last_date": dates[-1],
+    }
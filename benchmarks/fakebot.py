@@ -0,0 +1,171 @@
+"""In-process stand-in for the Telegram Bot API, plus a synthetic Update factory.
+
+``FakeBotAPI`` plugs into ``ApplicationBuilder.request`` in place of the HTTP
+transport. It answers every Bot API method the handlers use, records each
+call per chat, and remembers the last message and inline keyboard it sent to
+each chat so a simulated user can "tap" buttons that really exist.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from telegram import Bot, Update
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Attendance", "username": "attendance_bot"}
+
+
+@dataclass
+class RecordedCall:
+    method: str
+    chat_id: int | None
+    params: dict
+    at: float
+
+
+class FakeBotAPI(BaseRequest):
+    """A ``BaseRequest`` that never leaves the process."""
+
+    def __init__(self, latency_ms: float = 0.0, keep_log: bool = False):
+        self.latency = latency_ms / 1000
+        self.keep_log = keep_log
+        self.log: list[RecordedCall] = []
+        self.calls: Counter = Counter()
+        self.calls_by_chat: dict[int, Counter] = defaultdict(Counter)
+        self.last_message_id: dict[int, int] = {}
+        self.last_markup: dict[int, dict] = {}
+        self.documents: dict[int, int] = Counter()
+        self._message_ids = itertools.count(1000)
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: RequestData | None = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        chat_id = params.get("chat_id")
+        chat_id = int(chat_id) if chat_id is not None else None
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        self.calls[api_method] += 1
+        if chat_id is not None:
+            self.calls_by_chat[chat_id][api_method] += 1
+        if self.keep_log:
+            self.log.append(RecordedCall(api_method, chat_id, params, time.perf_counter()))
+
+        result = self._respond(api_method, chat_id, params)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    def _respond(self, api_method: str, chat_id: int | None, params: dict):
+        if api_method == "getMe":
+            return BOT_USER
+        if api_method in ("sendMessage", "sendDocument"):
+            message_id = next(self._message_ids)
+            self.last_message_id[chat_id] = message_id
+            self.last_markup[chat_id] = _markup(params)
+            message = self._message(chat_id, message_id, params.get("text", ""))
+            if api_method == "sendDocument":
+                self.documents[chat_id] += 1
+                message["document"] = {"file_id": f"doc{message_id}", "file_unique_id": f"u{message_id}"}
+            return message
+        if api_method == "editMessageText":
+            message_id = int(params.get("message_id", 0))
+            if message_id == self.last_message_id.get(chat_id):
+                self.last_markup[chat_id] = _markup(params)
+            return self._message(chat_id, message_id, params.get("text", ""))
+        if api_method == "getUpdates":
+            return []
+        return True
+
+    @staticmethod
+    def _message(chat_id: int, message_id: int, text: str) -> dict:
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text,
+        }
+
+    def buttons(self, chat_id: int, prefix: str = "") -> list[str]:
+        """Return callback_data of the buttons currently shown in a chat."""
+        markup = self.last_markup.get(chat_id) or {}
+        return [
+            button["callback_data"]
+            for row in markup.get("inline_keyboard", [])
+            for button in row
+            if button.get("callback_data", "").startswith(prefix)
+        ]
+
+
+def _markup(params: dict) -> dict:
+    markup = params.get("reply_markup")
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    return markup or {}
+
+
+class UpdateFactory:
+    """Builds synthetic Updates as Telegram would deliver them for a private chat."""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._query_ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def command(self, user_id: int, text: str) -> Update:
+        """A text message; a leading ``/word`` is tagged as a bot command."""
+        command = text.split()[0] if text.startswith("/") else ""
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if command:
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return Update.de_json({"update_id": next(self._update_ids), "message": message}, self.bot)
+
+    def callback(self, user_id: int, message_id: int, data: str) -> Update:
+        """A tap on an inline button attached to the bot's message ``message_id``."""
+        query = {
+            "id": str(next(self._query_ids)),
+            "from": self._user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "",
+            },
+        }
+        return Update.de_json({"update_id": next(self._update_ids), "callback_query": query}, self.bot)
@@ -0,0 +1,79 @@
+"""Roll-call writes with and without group commit.
+
+Simulated teachers toggle attendance as fast as they can. The run is repeated
+with every write committed on its own (batch size 1, as before the shard writer
+task) and with group commit at each of the given batch windows, and reports
+toggle throughput and latency, commits per second and the average batch size.
+
+Usage:
+    python -m benchmarks.group_commit --seconds 5
+    python -m benchmarks.group_commit --togglers 50 --windows 0,2,5 --batch-size 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.contention import _toggler
+from benchmarks.datagen import Scale, generate_database
+from benchmarks.loadtest import _percentile
+
+import shards
+import tenancy
+from storage.sqlite import SQLiteRepository
+
+
+async def run_mode(window_ms: float, batch_size: int, args) -> dict:
+    repo = SQLiteRepository(batch_window_ms=window_ms, batch_size=batch_size)
+    try:
+        teachers = (await repo.get_all_teachers())[: args.togglers]
+        classes = {t["id"]: [s["id"] for s in await repo.get_students_by_teacher(t["id"])] for t in teachers}
+        shards.write_stats.reset()
+        deadline = time.perf_counter() + args.seconds
+        latencies: list[float] = []
+        await asyncio.gather(*(
+            _toggler(repo, student_ids, deadline, random.Random(teacher_id), latencies)
+            for teacher_id, student_ids in classes.items()
+        ))
+        stats = shards.write_stats.summary()
+    finally:
+        await repo.close()
+    return {
+        "mode": "no batching" if batch_size == 1 else f"window {window_ms:g} ms",
+        "toggles_per_s": round(len(latencies) / args.seconds, 1),
+        "toggle_p50_ms": round(statistics.median(latencies), 3),
+        "toggle_p99_ms": round(_percentile(latencies, 0.99), 3),
+        "commits_per_s": stats["commits_per_s"],
+        "avg_batch": stats["avg_batch"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure roll-call writes with and without group commit.")
+    parser.add_argument("--togglers", type=int, default=20, help="teachers toggling at the same time")
+    parser.add_argument("--students", type=int, default=30, help="students per teacher")
+    parser.add_argument("--windows", default="0,2", help="comma-separated batch windows in ms")
+    parser.add_argument("--batch-size", type=int, default=64, help="most writes per commit")
+    parser.add_argument("--seconds", type=float, default=5.0, help="length of each run")
+    args = parser.parse_args()
+
+    modes = [(0.0, 1)] + [(float(w), args.batch_size) for w in args.windows.split(",")]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "group_commit.db")
+        generate_database(path, Scale("group_commit", args.togglers, args.students, 1), admins=0)
+        tenancy.DB_PATH = path
+        results = [asyncio.run(run_mode(window, size, args)) for window, size in modes]
+
+    print(f"{'mode':>14s}{'toggles/s':>11s}{'p50 ms':>9s}{'p99 ms':>9s}{'commits/s':>11s}{'avg batch':>11s}")
+    for r in results:
+        print(
+            f"{r['mode']:>14s}{r['toggles_per_s']:11.1f}{r['toggle_p50_ms']:9.2f}"
+            f"{r['toggle_p99_ms']:9.2f}{r['commits_per_s']:11.1f}{r['avg_batch']:11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
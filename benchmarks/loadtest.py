@@ -0,0 +1,230 @@
+"""End-to-end load test of the real Application against a fake Bot API.
+
+Simulated teachers run /start → attendance → toggles → done while simulated
+admins download monthly reports, all at the same time. Updates go through the
+Application's update queue exactly as polled updates would.
+
+Usage:
+    python -m benchmarks.loadtest --teachers 20 --admins 3 --rounds 3
+    python -m benchmarks.loadtest --teachers 50 --api-latency-ms 40 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from benchmarks.datagen import TELEGRAM_ID_BASE, Scale, generate_database
+from benchmarks.fakebot import FakeBotAPI, UpdateFactory
+
+import bot
+import shards
+import tenancy
+from handlers import report_jobs
+
+# Handler groups used to time each update; far outside the groups the bot uses.
+_START_GROUP = -1000
+_DONE_GROUP = 1000
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+class LoadDriver:
+    """Feeds synthetic updates to an Application and measures how long each takes."""
+
+    def __init__(self, application: Application, api: FakeBotAPI, think_ms: float = 0.0):
+        self.app = application
+        self.api = api
+        self.factory = UpdateFactory(application.bot)
+        self.think = think_ms / 1000
+        self._started: dict[int, float] = {}
+        self._pending: dict[int, asyncio.Future] = {}
+        # Per flow kind: handler latency and end-to-end latency per update, in ms.
+        self.handler_ms: dict[str, list[float]] = defaultdict(list)
+        self.e2e_ms: dict[str, list[float]] = defaultdict(list)
+        self.flow_calls: dict[str, Counter] = defaultdict(Counter)
+        self.flows: Counter = Counter()
+        self.updates = 0
+
+        application.add_handler(TypeHandler(Update, self._on_start), group=_START_GROUP)
+        application.add_handler(TypeHandler(Update, self._on_done), group=_DONE_GROUP)
+
+    async def _on_start(self, update: Update, context) -> None:
+        self._started[update.update_id] = time.perf_counter()
+
+    async def _on_done(self, update: Update, context) -> None:
+        future = self._pending.pop(update.update_id, None)
+        if future and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def send(self, kind: str, update: Update) -> None:
+        """Enqueue an update and wait until every handler group has run for it."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending[update.update_id] = future
+        enqueued = time.perf_counter()
+        await self.app.update_queue.put(update)
+        finished = await future
+        started = self._started.pop(update.update_id, enqueued)
+        self.handler_ms[kind].append((finished - started) * 1000)
+        self.e2e_ms[kind].append((finished - enqueued) * 1000)
+        self.updates += 1
+        if self.think:
+            await asyncio.sleep(self.think)
+
+    async def tap(self, kind: str, user_id: int, data: str) -> None:
+        message_id = self.api.last_message_id[user_id]
+        await self.send(kind, self.factory.callback(user_id, message_id, data))
+
+    async def _flow(self, kind: str, user_id: int, steps) -> None:
+        before = Counter(self.api.calls_by_chat[user_id])
+        await steps()
+        self.flow_calls[kind].update(self.api.calls_by_chat[user_id] - before)
+        self.flows[kind] += 1
+
+    async def teacher_flow(self, user_id: int, toggles: int, rng: random.Random) -> None:
+        """/start → take attendance → ``toggles`` taps → done."""
+        async def steps():
+            await self.send("teacher", self.factory.command(user_id, "/start"))
+            await self.tap("teacher", user_id, "att")
+            for _ in range(toggles):
+                choices = self.api.buttons(user_id, "toggle_")
+                if not choices:
+                    break
+                await self.tap("teacher", user_id, rng.choice(choices))
+            await self.tap("teacher", user_id, "done")
+
+        await self._flow("teacher", user_id, steps)
+
+    async def admin_flow(self, user_id: int, rng: random.Random) -> None:
+        """/start → admin menu → download report → pick teacher → pick current month."""
+        async def steps():
+            await self.send("admin", self.factory.command(user_id, "/start"))
+            await self.tap("admin", user_id, "admin")
+            await self.tap("admin", user_id, "dlrpt")
+            await self.tap("admin", user_id, rng.choice(self.api.buttons(user_id, "rptteacher_")))
+            await self.tap("admin", user_id, self.api.buttons(user_id, "rptmonth_")[0])
+            # The report is sent in the background; the next flow starts from the menu sent with it.
+            await report_jobs.queue.drain()
+
+        await self._flow("admin", user_id, steps)
+
+    def summary(self, wall_s: float) -> dict:
+        result = {
+            "wall_s": round(wall_s, 3),
+            "updates": self.updates,
+            "updates_per_s": round(self.updates / wall_s, 1) if wall_s else 0.0,
+            "telegram_calls": dict(self.api.calls),
+            "flows": {},
+        }
+        for kind, count in self.flows.items():
+            handler, e2e = self.handler_ms[kind], self.e2e_ms[kind]
+            result["flows"][kind] = {
+                "flows": count,
+                "flows_per_s": round(count / wall_s, 2) if wall_s else 0.0,
+                "updates": len(handler),
+                "handler_p50_ms": round(statistics.median(handler), 3),
+                "handler_p99_ms": round(_percentile(handler, 0.99), 3),
+                "e2e_p50_ms": round(statistics.median(e2e), 3),
+                "e2e_p99_ms": round(_percentile(e2e, 0.99), 3),
+                "telegram_calls_per_flow": {
+                    method: round(n / count, 2) for method, n in sorted(self.flow_calls[kind].items())
+                },
+            }
+        return result
+
+
+async def run_load(args, db_path: str) -> dict:
+    api = FakeBotAPI(latency_ms=args.api_latency_ms)
+    application = bot.build_application(request=api)
+    driver = LoadDriver(application, api, think_ms=args.think_ms)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    # Teachers 1..admins are admins; the rest take attendance.
+    admin_ids = [TELEGRAM_ID_BASE + t for t in range(1, args.admins + 1)]
+    teacher_ids = [TELEGRAM_ID_BASE + t for t in range(args.admins + 1, args.admins + args.teachers + 1)]
+
+    async def teacher(user_id: int):
+        rng = random.Random(user_id)
+        for _ in range(args.rounds):
+            await driver.teacher_flow(user_id, args.toggles, rng)
+
+    async def admin(user_id: int):
+        rng = random.Random(user_id)
+        for _ in range(args.rounds):
+            await driver.admin_flow(user_id, rng)
+
+    shards.write_stats.reset()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(teacher(u) for u in teacher_ids), *(admin(u) for u in admin_ids))
+        # Reports are built in the background after the admin's conversation ends.
+        await report_jobs.queue.drain()
+    finally:
+        wall = time.perf_counter() - started
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+    summary = driver.summary(wall)
+    summary["group_commit"] = shards.write_stats.summary()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the bot against a fake Bot API.")
+    parser.add_argument("--teachers", type=int, default=20, help="concurrent simulated teachers")
+    parser.add_argument("--admins", type=int, default=2, help="concurrent simulated admins pulling reports")
+    parser.add_argument("--rounds", type=int, default=3, help="flows per simulated user")
+    parser.add_argument("--toggles", type=int, default=10, help="attendance taps per teacher flow")
+    parser.add_argument("--students", type=int, default=30, help="students per teacher")
+    parser.add_argument("--years", type=int, default=2, help="years of attendance history")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated Bot API round-trip")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's taps")
+    parser.add_argument("--output", help="write the summary as JSON to this path")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "loadtest.db")
+        scale = Scale("load", args.admins + args.teachers, args.students, args.years)
+        generate_database(path, scale, admins=args.admins)
+        tenancy.DB_PATH = path
+        tenancy.TENANT_DIRECTORY_PATH = os.path.join(tmp, "schools.db")
+        summary = asyncio.run(run_load(args, path))
+
+    summary["config"] = vars(args)
+    print(f"{summary['updates']} updates in {summary['wall_s']} s → {summary['updates_per_s']} updates/s")
+    for kind, flow in summary["flows"].items():
+        print(
+            f"  {kind:8s} {flow['flows']:4d} flows  handler p50 {flow['handler_p50_ms']:7.2f} ms"
+            f"  p99 {flow['handler_p99_ms']:7.2f} ms  e2e p99 {flow['e2e_p99_ms']:7.2f} ms"
+        )
+        print(f"           Telegram calls per flow: {flow['telegram_calls_per_flow']}")
+    writes = summary["group_commit"]
+    print(
+        f"  writes {writes['writes']} in {writes['commits']} commits → {writes['commits_per_s']} commits/s,"
+        f" avg batch {writes['avg_batch']} (largest {writes['largest_batch']})"
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
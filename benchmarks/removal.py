@@ -0,0 +1,108 @@
+"""Roll-call writes while a teacher with years of attendance is removed.
+
+Simulated teachers toggle attendance while the first teacher is removed, once
+with the single cascading DELETE used before and once in batches
+(``handlers.removals``). Reports how long the removal took and the toggle
+latency while it ran; the slowest toggle is the longest any teacher waited for
+the write lock.
+
+Usage:
+    python -m benchmarks.removal
+    python -m benchmarks.removal --students 1500 --years 5 --togglers 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.datagen import Scale, generate_database
+from benchmarks.loadtest import _percentile
+
+import db
+import tenancy
+from handlers import removals
+
+
+async def run_mode(chunked: bool, args) -> dict:
+    await tenancy.init_directory()
+    try:
+        teachers = await db.get_all_teachers()
+        victim, others = teachers[0], teachers[1 : args.togglers + 1]
+        classes = {t["id"]: [s["id"] for s in await db.get_students_by_teacher(t["id"])] for t in others}
+        rows = await db.start_removal(removals.TEACHER, victim["id"])
+
+        stop = asyncio.Event()
+        latencies: list[float] = []
+
+        async def remove():
+            await asyncio.sleep(0.5)
+            started = time.perf_counter()
+            if chunked:
+                await removals._delete_attendance(removals.TEACHER, victim["id"])
+            await db.remove_teacher(victim["id"])
+            elapsed = time.perf_counter() - started
+            await asyncio.sleep(0.5)
+            stop.set()
+            return elapsed
+
+        async def toggle(teacher_id: int, student_ids: list[int]):
+            rng, today, present = random.Random(teacher_id), date.today().isoformat(), set()
+            while not stop.is_set():
+                student_id = rng.choice(student_ids)
+                started = time.perf_counter()
+                if student_id in present:
+                    await db.remove_attendance(student_id, today)
+                    present.discard(student_id)
+                else:
+                    await db.mark_attendance(student_id, today)
+                    present.add(student_id)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        removal_s, *_ = await asyncio.gather(remove(), *(toggle(t, s) for t, s in classes.items()))
+    finally:
+        await db.close()
+    return {
+        "mode": "batched" if chunked else "one statement",
+        "rows": rows,
+        "removal_s": round(removal_s, 3),
+        "toggles": len(latencies),
+        "toggle_p50_ms": round(statistics.median(latencies), 3),
+        "toggle_p99_ms": round(_percentile(latencies, 0.99), 3),
+        "toggle_max_ms": round(max(latencies), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure roll-call writes while a large class is removed.")
+    parser.add_argument("--teachers", type=int, default=6)
+    parser.add_argument("--students", type=int, default=1000, help="students per teacher")
+    parser.add_argument("--years", type=int, default=5, help="years of attendance history")
+    parser.add_argument("--togglers", type=int, default=5, help="teachers toggling meanwhile")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, "template.db")
+        generate_database(template, Scale("removal", args.teachers, args.students, args.years), admins=0)
+        results = []
+        for chunked in (False, True):
+            path = os.path.join(tmp, f"removal_{chunked}.db")
+            shutil.copy(template, path)
+            tenancy.DB_PATH = path
+            tenancy.TENANT_DIRECTORY_PATH = os.path.join(tmp, f"schools_{chunked}.db")
+            results.append(asyncio.run(run_mode(chunked, args)))
+
+    print(f"{'mode':>14s}{'rows':>9s}{'removal s':>11s}{'toggles':>9s}{'p50 ms':>9s}{'p99 ms':>9s}{'max ms':>9s}")
+    for r in results:
+        print(
+            f"{r['mode']:>14s}{r['rows']:9d}{r['removal_s']:11.2f}{r['toggles']:9d}"
+            f"{r['toggle_p50_ms']:9.2f}{r['toggle_p99_ms']:9.2f}{r['toggle_max_ms']:9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""Time the database, report and attendance paths on synthetic databases.
+
+Usage:
+    python -m benchmarks.run                          # small + medium scales
+    python -m benchmarks.run --scales small,medium,large --repeat 50
+    python -m benchmarks.run --teachers 10 --students 40 --years 2
+
+Results are written as JSON (by default to benchmarks/results/<commit>.json)
+so that runs can be compared with ``python -m benchmarks.compare``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime
+
+from benchmarks.datagen import SCALES, TELEGRAM_ID_BASE, Scale, generate_database
+
+import archive
+import audit
+import db
+import tenancy
+from handlers.attendance import _build_attendance_keyboard, attendance_start, attendance_toggle, render_summary
+from handlers.session import Session
+from report import generate_attendance_report
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+# ── Fake Telegram objects for handler round-trips ────────────────────────────
+
+class _FakeQuery:
+    """Just enough of a CallbackQuery for the attendance handlers."""
+
+    def __init__(self, data: str):
+        self.data = data
+
+    async def answer(self, *args, **kwargs):
+        return True
+
+    async def edit_message_text(self, *args, **kwargs):
+        return True
+
+
+class _FakeUpdate:
+    def __init__(self, data: str):
+        self.callback_query = _FakeQuery(data)
+
+
+class _FakeContext:
+    def __init__(self, user_data: Session):
+        self.user_data = user_data
+
+
+# ── Timing helpers ───────────────────────────────────────────────────────────
+
+def _summarize(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "median_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "min_ms": ordered[0],
+        "max_ms": ordered[-1],
+    }
+
+
+async def _time_async(fn, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return _summarize(samples)
+
+
+def _time_sync(fn, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return _summarize(samples)
+
+
+# ── Benchmarks ───────────────────────────────────────────────────────────────
+
+async def _run_scale(scale: Scale, summary: dict, repeat: int) -> dict:
+    """Run every benchmark against the default school's database."""
+    await tenancy.init_directory()
+    try:
+        return await _run_benchmarks(scale, summary, repeat)
+    finally:
+        await db.close()
+
+
+async def _run_benchmarks(scale: Scale, summary: dict, repeat: int) -> dict:
+    # A teacher in the middle of the range, so the class is neither first nor last.
+    teacher_id = scale.teachers // 2 + 1
+    telegram_id = TELEGRAM_ID_BASE + teacher_id
+    other_teacher_id = 1 if teacher_id != 1 else 2
+    students = await db.get_students_by_teacher(teacher_id)
+    student_id = students[0]["id"]
+    last = date.fromisoformat(summary["last_date"])
+    session_date = summary["last_date"]
+    scratch_date = "2099-12-31"
+    teacher = await db.get_teacher_by_telegram_id(telegram_id)
+
+    results = {}
+
+    async def bench(name, fn, n=repeat):
+        results[name] = await _time_async(fn, n)
+
+    # Reads
+    await bench("db.get_teacher_by_telegram_id", lambda: db.get_teacher_by_telegram_id(telegram_id))
+    await bench("db.get_all_teachers", db.get_all_teachers)
+    await bench("db.get_students_by_teacher", lambda: db.get_students_by_teacher(teacher_id))
+    await bench("db.get_student_by_id", lambda: db.get_student_by_id(student_id))
+    await bench("db.get_attendance_for_date", lambda: db.get_attendance_for_date(teacher_id, session_date))
+    await bench(
+        "db.get_attendance_for_month",
+        lambda: db.get_attendance_for_month(teacher_id, last.year, last.month),
+    )
+    await bench(
+        "db.get_attendance_dates_for_month",
+        lambda: db.get_attendance_dates_for_month(teacher_id, last.year, last.month),
+    )
+
+    # Name search — two leading letters of a common first name, so many students match.
+    prefix = students[0]["name"].split()[0][:2]
+    await bench("db.search_students (school)", lambda: db.search_students(prefix))
+    await bench("db.search_students (class)", lambda: db.search_students(prefix, teacher_id))
+
+    # Writes — each pair restores the original state.
+    async def mark_then_remove():
+        await db.mark_attendance(student_id, scratch_date)
+        await db.remove_attendance(student_id, scratch_date)
+
+    async def add_then_remove_student():
+        new_id = await db.add_student("طالب مؤقت", teacher_id)
+        await db.remove_student(new_id)
+
+    async def rename_student():
+        await db.update_student_name(student_id, students[0]["name"])
+
+    async def move_and_back():
+        await db.move_student(student_id, other_teacher_id)
+        await db.move_student(student_id, teacher_id)
+
+    async def add_then_remove_teacher():
+        new_id = await db.add_teacher(TELEGRAM_ID_BASE - 1, "معلم مؤقت")
+        await db.remove_teacher(new_id)
+
+    await bench("db.mark_attendance+remove_attendance", mark_then_remove)
+    await bench("db.add_student+remove_student", add_then_remove_student)
+    await bench("db.update_student_name", rename_student)
+    await bench("db.move_student (x2)", move_and_back)
+    await bench("db.add_teacher+remove_teacher", add_then_remove_teacher)
+
+    # Report
+    await bench(
+        "report.generate_attendance_report",
+        lambda: generate_attendance_report(teacher_id, last.year, last.month),
+        n=max(3, repeat // 5),
+    )
+
+    # Keyboard
+    present_ids = await db.get_attendance_for_date(teacher_id, session_date)
+    results["attendance._build_attendance_keyboard"] = _time_sync(
+        lambda: _build_attendance_keyboard(students, present_ids), repeat
+    )
+    results["attendance.render_summary"] = _time_sync(
+        lambda: render_summary(session_date, students, present_ids), repeat
+    )
+
+    # Handler round-trips
+    today = date.today().isoformat()
+    session = Session()
+    session.teacher = teacher
+
+    async def start_round_trip():
+        await attendance_start(_FakeUpdate("att"), _FakeContext(session))
+
+    async def toggle_round_trip():
+        context = _FakeContext(session)
+        await attendance_toggle(_FakeUpdate(f"toggle_{student_id}"), context)
+        await attendance_toggle(_FakeUpdate(f"toggle_{student_id}"), context)
+
+    await bench("handlers.attendance_start", start_round_trip)
+    await bench("handlers.attendance_toggle (x2)", toggle_round_trip)
+    # Leave today's attendance as it was before the benchmark.
+    await db.remove_attendance(student_id, today)
+
+    # Audit log — the toggles above buffered their entries; time writing batches and reading them back.
+    async def flush_audit_batch():
+        for _ in range(100):
+            audit.record(teacher_id, student_id, scratch_date, audit.MARKED)
+        await audit.flush()
+
+    await audit.flush()
+    await bench("audit.flush (100 entries)", flush_audit_batch, n=max(3, repeat // 5))
+    await bench("db.get_attendance_history", lambda: db.get_attendance_history(student_id))
+
+    # Archival — run last, since it moves the oldest academic year out of the live table.
+    first = date.fromisoformat(summary["first_date"])
+    academic_year = archive.academic_year_of(first.year, first.month)
+    if archive.is_closed(academic_year):
+        before = (
+            await db.get_attendance_for_month(teacher_id, first.year, first.month),
+            await db.get_attendance_dates_for_month(teacher_id, first.year, first.month),
+        )
+        await bench(
+            "db.get_attendance_for_month (live, oldest)",
+            lambda: db.get_attendance_for_month(teacher_id, first.year, first.month),
+        )
+        await archive.archive_year(academic_year)
+        after = (
+            await db.get_attendance_for_month(teacher_id, first.year, first.month),
+            await db.get_attendance_dates_for_month(teacher_id, first.year, first.month),
+        )
+        if after != before:
+            raise AssertionError(f"Archived month {first:%Y-%m} does not match its live results")
+        await bench(
+            "db.get_attendance_for_month (archived)",
+            lambda: db.get_attendance_for_month(teacher_id, first.year, first.month),
+        )
+        await bench(
+            "db.get_attendance_for_month (live, after archival)",
+            lambda: db.get_attendance_for_month(teacher_id, last.year, last.month),
+        )
+
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DB, report and attendance paths.")
+    parser.add_argument("--scales", default="small,medium", help=f"comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument("--teachers", type=int, help="custom scale: number of teachers")
+    parser.add_argument("--students", type=int, default=30, help="custom scale: students per teacher")
+    parser.add_argument("--years", type=int, default=2, help="custom scale: years of attendance")
+    parser.add_argument("--repeat", type=int, default=30, help="timed iterations per benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", help="where to keep generated databases (default: temp dir)")
+    parser.add_argument("--output", help="JSON output path (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    scales = [SCALES[name] for name in args.scales.split(",") if name]
+    if args.teachers:
+        scales = [Scale("custom", args.teachers, args.students, args.years)]
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "scales": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        for scale in scales:
+            path = os.path.join(data_dir, f"bench_{scale.name}_{args.seed}.db")
+            started = time.perf_counter()
+            summary = generate_database(path, scale, seed=args.seed)
+            summary["generate_s"] = round(time.perf_counter() - started, 3)
+            print(f"[{scale.name}] {summary}")
+            tenancy.DB_PATH = path
+            tenancy.TENANT_DIRECTORY_PATH = os.path.join(data_dir, "schools.db")
+            archive.ARCHIVE_DIR = os.path.join(data_dir, f"archive_{scale.name}_{args.seed}")
+            results = asyncio.run(_run_scale(scale, summary, args.repeat))
+            report["scales"][scale.name] = {"data": summary, "results": results}
+            for name, r in results.items():
+                print(f"  {name:45s} median {r['median_ms']:8.3f} ms   p95 {r['p95_ms']:8.3f} ms")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
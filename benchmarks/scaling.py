@@ -0,0 +1,124 @@
+"""Throughput of worker mode (``workers.py``) as the number of workers grows.
+
+Simulated teachers post /start → attendance → toggles → done to the webhook
+front as Telegram would, all at once. Workers run the real Application against
+one shared generated database and a fake Bot API. For each worker count the
+benchmark reports updates per second from the first POST until every update
+has been processed, and the speedup over a single worker.
+
+Usage:
+    python -m benchmarks.scaling --workers 1,2,4 --teachers 40
+    python -m benchmarks.scaling --api-latency-ms 0      # CPU-bound: scales with cores only
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from functools import partial
+
+import httpx
+from telegram import Bot
+
+from benchmarks.backends import _free_port
+from benchmarks.datagen import TELEGRAM_ID_BASE, Scale, generate_database
+from benchmarks.fakebot import FakeBotAPI, UpdateFactory
+
+from workers import Front
+
+SECRET = "scaling-bench"
+
+
+def _script(factory: UpdateFactory, teacher: int, students_per_teacher: int, toggles: int, rng) -> list[bytes]:
+    """The raw updates one teacher sends, in order."""
+    user_id = TELEGRAM_ID_BASE + teacher
+    first_student = (teacher - 1) * students_per_teacher + 1
+    updates = [factory.command(user_id, "/start"), factory.callback(user_id, 1, "att")]
+    for _ in range(toggles):
+        student_id = rng.randrange(first_student, first_student + students_per_teacher)
+        updates.append(factory.callback(user_id, 1, f"toggle_{student_id}"))
+    updates.append(factory.callback(user_id, 1, "done"))
+    return [json.dumps(update.to_dict()).encode() for update in updates]
+
+
+async def run_workers(workers: int, scripts: list[list[bytes]], api_latency_ms: float) -> dict:
+    front = Front(
+        workers, request_factory=partial(FakeBotAPI, latency_ms=api_latency_ms), log_level=logging.WARNING
+    )
+    await front.start()
+    port = _free_port()
+    server = await front.listen("127.0.0.1", port, SECRET)
+    url = f"http://127.0.0.1:{port}/"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET, "Content-Type": "application/json"}
+    total = sum(len(script) for script in scripts)
+
+    async def teacher(client: httpx.AsyncClient, script: list[bytes]):
+        for body in script:
+            response = await client.post(url, content=body, headers=headers)
+            response.raise_for_status()
+
+    try:
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=64)) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(teacher(client, script) for script in scripts))
+            posted = time.perf_counter() - started
+            await front.wait_processed(total)
+            wall = time.perf_counter() - started
+    finally:
+        server.close()
+        await server.wait_closed()
+        await front.stop()
+    return {
+        "workers": workers,
+        "updates": total,
+        "post_s": round(posted, 3),
+        "wall_s": round(wall, 3),
+        "updates_per_s": round(total / wall, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure worker-mode throughput per worker count.")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--teachers", type=int, default=40, help="concurrent simulated teachers")
+    parser.add_argument("--students", type=int, default=30, help="students per teacher")
+    parser.add_argument("--toggles", type=int, default=10, help="attendance taps per teacher")
+    parser.add_argument("--api-latency-ms", type=float, default=20.0, help="simulated Bot API round-trip")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scaling.db")
+        generate_database(path, Scale("scaling", args.teachers, args.students, 1), admins=0)
+        # Workers are spawned and read their configuration from the environment.
+        os.environ.update(
+            DB_PATH=path,
+            TENANT_DIRECTORY_PATH=os.path.join(tmp, "schools.db"),
+            REPORT_STORE_DIR=os.path.join(tmp, "reports"),
+        )
+
+        factory = UpdateFactory(Bot("1:scaling"))
+        rng = random.Random(1)
+        scripts = [
+            _script(factory, t, args.students, args.toggles, rng) for t in range(1, args.teachers + 1)
+        ]
+
+        results = [
+            asyncio.run(run_workers(int(n), scripts, args.api_latency_ms)) for n in args.workers.split(",")
+        ]
+
+    base = results[0]["updates_per_s"]
+    print(f"cores: {os.cpu_count()}, api latency: {args.api_latency_ms:g} ms")
+    print(f"{'workers':>8s}{'updates':>9s}{'wall s':>9s}{'updates/s':>11s}{'speedup':>9s}")
+    for r in results:
+        print(
+            f"{r['workers']:8d}{r['updates']:9d}{r['wall_s']:9.3f}"
+            f"{r['updates_per_s']:11.1f}{r['updates_per_s'] / base:8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
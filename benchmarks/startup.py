@@ -0,0 +1,127 @@
+"""Cold-start profile: import time per module and time to first poll.
+
+Each measurement runs in a fresh interpreter so nothing is already imported.
+
+Usage:
+    python -m benchmarks.startup              # 5 cold starts
+    python -m benchmarks.startup --runs 10 --top 30 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules reported individually even when they are not among the slowest.
+WATCHED = ("bot", "config", "db", "querylog", "report", "openpyxl", "aiosqlite", "telegram", "telegram.ext", "httpx")
+
+
+def _child_env(db_path: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("BOT_TOKEN", "0:startup-profile")
+    env["DB_PATH"] = db_path
+    env["TENANT_DIRECTORY_PATH"] = os.path.join(os.path.dirname(db_path), "schools.db")
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def import_times(env: dict) -> dict[str, dict]:
+    """Run ``python -X importtime -c 'import bot'`` and parse the per-module table (µs)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"],
+        capture_output=True, text=True, cwd=ROOT, env=env, check=True,
+    )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us)}
+    return modules
+
+
+def cold_start(env: dict) -> dict:
+    """Spawn a child that starts polling against the fake Bot API and reports its timings."""
+    spawned = time.time()
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child", repr(spawned)],
+        capture_output=True, text=True, cwd=ROOT, env=env, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _child(spawned: float) -> None:
+    """Import the bot, build it, start polling and exit at the first getUpdates."""
+    started = time.time()
+    import bot
+    from benchmarks.fakebot import FakeBotAPI
+    imported = time.time()
+
+    built = {}
+
+    class FirstPoll(FakeBotAPI):
+        async def do_request(self, url, method, request_data=None, *args, **kwargs):
+            if url.endswith("/getUpdates"):
+                print(json.dumps({
+                    "interpreter_s": started - spawned,
+                    "import_s": imported - started,
+                    "build_s": built["at"] - imported,
+                    "first_poll_s": time.time() - spawned,
+                    "openpyxl_loaded": "openpyxl" in sys.modules,
+                }), flush=True)
+                # Graceful shutdown waits on polling timeouts; the measurement is done.
+                os._exit(0)
+            return await super().do_request(url, method, request_data, *args, **kwargs)
+
+    application = bot.build_application(request=FirstPoll())
+    built["at"] = time.time()
+    application.run_polling()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile bot cold start.")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to average")
+    parser.add_argument("--top", type=int, default=20, help="slowest modules to list")
+    parser.add_argument("--output", help="write the profile as JSON to this path")
+    parser.add_argument("--child", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        _child(args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = _child_env(os.path.join(tmp, "startup.db"))
+        modules = import_times(env)
+        starts = [cold_start(env) for _ in range(args.runs)]
+
+    slowest = sorted(modules.items(), key=lambda kv: kv[1]["cumulative_us"], reverse=True)[: args.top]
+    print(f"Slowest imports (cumulative, of {len(modules)} modules):")
+    for name, t in slowest:
+        print(f"  {t['cumulative_us'] / 1000:8.1f} ms  (self {t['self_us'] / 1000:6.1f} ms)  {name}")
+    print("Watched modules:")
+    for name in WATCHED:
+        t = modules.get(name)
+        print(f"  {name:14s} " + (f"{t['cumulative_us'] / 1000:8.1f} ms" if t else "  not imported at startup"))
+
+    profile = {
+        key: statistics.median(s[key] for s in starts)
+        for key in ("interpreter_s", "import_s", "build_s", "first_poll_s")
+    }
+    profile["openpyxl_loaded"] = any(s["openpyxl_loaded"] for s in starts)
+    print(f"Cold start over {args.runs} runs (median):")
+    for key, value in profile.items():
+        print(f"  {key:16s} {value * 1000:8.1f} ms" if key != "openpyxl_loaded" else f"  {key:16s} {value}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"modules": modules, "cold_start": profile, "runs": starts}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,59 @@
 """Telegram CM Attendance Bot — entry point."""
 import logging
+from datetime import time
+from functools import partial
 
-from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler
+from telegram import Update
+from telegram.ext import (
+    Application,
+    ApplicationBuilder,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+    InlineQueryHandler,
+    TypeHandler,
+)
+from telegram.request import BaseRequest, HTTPXRequest
 
+import audit
 import db
-from config import BOT_TOKEN
+import invalidation
+import logs
+import shards
+import tenancy
+import tracing
+from config import (
+    AUDIT_FLUSH_INTERVAL,
+    BOT_TOKEN,
+    CONCURRENT_UPDATES,
+    MAINTENANCE_TIME,
+    REPORT_PREGEN_TIME,
+    SESSION_EVICT_INTERVAL,
+)
+from handlers import removals, report_jobs
 from handlers.admin import (
     download_report_conversation,
+    history_command,
+    maintenance_command,
+    maintenance_job,
+    pregenerate_month_end_reports,
+    profile_command,
     register_teacher_conversation,
     remove_teacher_conversation,
+    search_command,
+    slow_queries_command,
 )
 from handlers.attendance import attendance_done, attendance_start, attendance_toggle
 from handlers.common import CB_ADMIN_MENU, CB_ATTENDANCE, CB_DONE, CB_MAIN_MENU, CB_MANAGE_STUDENTS
+from handlers.session import Session, evict_idle_sessions, forget_roster, forget_teacher, touch_session
+from handlers.inline import (
+    CB_INLINE_STATS,
+    CB_INLINE_TOGGLE,
+    forget_class,
+    inline_lookup,
+    inline_stats,
+    inline_toggle,
+)
 from handlers.start import main_menu_callback, start_command
 from handlers.students import (
     add_student_conversation,
@@ -19,26 +61,89 @@ from handlers.students import (
     move_student_conversation,
     remove_student_conversation,
 )
+from handlers.updates import PerUserUpdateProcessor
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-)
 logger = logging.getLogger(__name__)
 
 
 async def post_init(application):
-    """Initialize the database on startup."""
+    """Initialize the school directory and the default school's database on startup."""
+    await tenancy.init_directory()
     await db.init_db()
     logger.info("Database initialized.")
 
 
-def main():
-    """Build and run the bot."""
-    application = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).build()
+async def post_shutdown(application):
+    """Stop the report workers and removals, write the buffered audit entries and close the shards."""
+    await report_jobs.queue.stop()
+    await removals.stop()
+    await audit.flush()
+    await db.close()
+    if db.backend() == "sqlite":
+        stats = shards.write_stats.summary()
+        logger.info(
+            "Group commit: %d writes in %d commits (%.1f commits/s, avg batch %.2f).",
+            stats["writes"], stats["commits"], stats["commits_per_s"], stats["avg_batch"],
+        )
+
+
+def build_application(request: BaseRequest | None = None, global_jobs: bool = True) -> Application:
+    """Build the Application with every handler registered.
+
+    ``request`` replaces the HTTP transport to the Bot API, e.g. with the
+    in-process fake used by the load-test harness. With ``global_jobs`` false
+    the once-per-deployment jobs (report pre-generation, maintenance) are not
+    scheduled; worker mode runs them on the first worker only.
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .context_types(ContextTypes(user_data=Session))
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if request is not None:
+        builder = builder.get_updates_request(request)
+    if request is not None or tracing.enabled:
+        # Bot API calls, timed when tracing is on (256 connections, as the builder's default)
+        builder = builder.request(tracing.request(request or HTTPXRequest(connection_pool_size=256)))
+    application = builder.build()
+
+    # Session bookkeeping runs before every other handler
+    application.add_handler(TypeHandler(Update, touch_session), group=-1)
+    application.job_queue.run_repeating(
+        evict_idle_sessions, interval=SESSION_EVICT_INTERVAL, first=SESSION_EVICT_INTERVAL
+    )
+    invalidation.subscribe(invalidation.TEACHER, partial(forget_teacher, application))
+    invalidation.subscribe(invalidation.ROSTER, partial(forget_roster, application))
+    invalidation.subscribe(invalidation.ROSTER, forget_class)
+
+    # Buffered attendance audit entries are written in batches
+    application.job_queue.run_repeating(
+        audit.flush_job, interval=AUDIT_FLUSH_INTERVAL, first=AUDIT_FLUSH_INTERVAL
+    )
+
+    if global_jobs:
+        # Removals interrupted by the last shutdown
+        application.job_queue.run_once(removals.resume_job, when=0)
+
+        # Month-end report pre-generation (off-peak on the 1st)
+        application.job_queue.run_monthly(
+            pregenerate_month_end_reports, when=time.fromisoformat(REPORT_PREGEN_TIME), day=1
+        )
+
+        # Daily backup, ANALYZE and incremental vacuum (PostgreSQL handles its own)
+        if db.backend() == "sqlite":
+            application.job_queue.run_daily(maintenance_job, time=time.fromisoformat(MAINTENANCE_TIME))
 
     # /start command
     application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("slowqueries", slow_queries_command))
+    application.add_handler(CommandHandler("maintenance", maintenance_command))
+    application.add_handler(CommandHandler("history", history_command))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("profile", profile_command))
 
     # Conversation handlers (must be added before generic callback handlers)
     application.add_handler(add_student_conversation())
@@ -54,6 +159,11 @@ def main():
     application.add_handler(CallbackQueryHandler(attendance_toggle, pattern=r"^toggle_\d+$"))
     application.add_handler(CallbackQueryHandler(attendance_done, pattern=f"^{CB_DONE}$"))
 
+    # Inline mode: student lookup and the buttons on the cards it posts
+    application.add_handler(InlineQueryHandler(inline_lookup))
+    application.add_handler(CallbackQueryHandler(inline_toggle, pattern=f"^{CB_INLINE_TOGGLE}(?:[a-z0-9_-]+_)?\\d+$"))
+    application.add_handler(CallbackQueryHandler(inline_stats, pattern=f"^{CB_INLINE_STATS}(?:[a-z0-9_-]+_)?\\d+$"))
+
     # Main menu navigation (generic — added last)
     application.add_handler(
         CallbackQueryHandler(
@@ -62,6 +172,18 @@ def main():
         )
     )
 
+    # Structured per-update logging and sampled tracing around every handler above
+    logs.instrument(application)
+    tracing.instrument(application)
+
+    return application
+
+
+def main():
+    """Build and run the bot."""
+    logs.setup()
+    tracing.setup()
+    application = build_application()
     logger.info("Bot starting...")
     application.run_polling()
 
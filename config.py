@@ -9,3 +9,139 @@ if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN environment variable is not set. Please create a .env file with BOT_TOKEN=your_token")
 
 DB_PATH = os.getenv("DB_PATH", "attendance.db")
+
+# Storage: "sqlite" (default, one file per school) or "postgres", which connects to
+# DATABASE_URL through a pool of PG_POOL_MIN_SIZE..PG_POOL_MAX_SIZE connections.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "2"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+
+# Schools: the directory maps teachers' Telegram ids to schools. Each school's data lives
+# in SHARD_DIR/<school>.db (the default school keeps DB_PATH), and at most
+# SHARD_CACHE_SIZE shards are kept open at once.
+TENANT_DIRECTORY_PATH = os.getenv("TENANT_DIRECTORY_PATH", "schools.db")
+SHARD_DIR = os.getenv("SHARD_DIR", "shards")
+SHARD_CACHE_SIZE = int(os.getenv("SHARD_CACHE_SIZE", "16"))
+
+# SQLite shards run in WAL mode. Reports and statistics read through up to SQLITE_READERS
+# read-only connections per shard (0 = through the writer), each in its own snapshot.
+# Writers wait up to SQLITE_BUSY_TIMEOUT_MS for another process's write lock. The WAL
+# is checkpointed every SQLITE_WAL_AUTOCHECKPOINT pages and truncated to
+# SQLITE_JOURNAL_SIZE_LIMIT bytes after that; maintenance truncates it completely.
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "2"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_WAL_AUTOCHECKPOINT = int(os.getenv("SQLITE_WAL_AUTOCHECKPOINT", "1000"))
+SQLITE_JOURNAL_SIZE_LIMIT = int(os.getenv("SQLITE_JOURNAL_SIZE_LIMIT", str(64 * 1024 * 1024)))
+
+# Group commit: each shard's writes are queued for one writer task, which commits up to
+# WRITE_BATCH_SIZE of them in one transaction, waiting at most WRITE_BATCH_WINDOW_MS
+# milliseconds for a batch to fill (0 = only what queued while the last batch committed).
+# WRITE_BATCH_SIZE=1 commits every write on its own.
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WRITE_BATCH_WINDOW_MS", "0"))
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "64"))
+
+# Removing a teacher or student deletes their attendance REMOVAL_BATCH_ROWS rows per
+# transaction, pausing REMOVAL_BATCH_PAUSE seconds between batches for other writes.
+REMOVAL_BATCH_ROWS = int(os.getenv("REMOVAL_BATCH_ROWS", "2000"))
+REMOVAL_BATCH_PAUSE = float(os.getenv("REMOVAL_BATCH_PAUSE", "0.02"))
+
+# Slow-query log: statements slower than SLOW_QUERY_MS milliseconds are logged with
+# their parameters and query plan. Leave unset to disable the wrapper entirely.
+_slow_query_ms = os.getenv("SLOW_QUERY_MS", "")
+SLOW_QUERY_MS = float(_slow_query_ms) if _slow_query_ms else None
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "100"))
+
+# Logging: records go through a queue to a background thread, formatted as one JSON
+# object per line (LOG_FORMAT=json) or as plain text (LOG_FORMAT=text), at LOG_LEVEL.
+# Every handled update is logged by "updates.<handler>" with its duration. Records
+# below WARNING of the loggers in LOG_SAMPLE_RATES ("logger=rate,...", a logger
+# covering its children) are kept at that rate; the rest are all kept.
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, rate in (
+        entry.split("=") for entry in
+        os.getenv("LOG_SAMPLE_RATES", "updates.attendance_toggle=0.1,updates.inline_toggle=0.1").split(",")
+        if entry.strip()
+    )
+}
+
+# Tracing: a sampled update is traced as a span for its handler, with a child span for
+# each db call and Bot API request. Updates are sampled at TRACE_SAMPLE_RATE, or at the
+# rate their handler has in TRACE_SAMPLE_RATES ("handler=rate,..."); with all rates 0
+# (the default) nothing is wrapped. Traces are appended to TRACE_FILE as OTLP/JSON
+# lines, rotated at TRACE_FILE_MAX_BYTES keeping TRACE_FILE_BACKUPS old files.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, rate in (entry.split("=") for entry in os.getenv("TRACE_SAMPLE_RATES", "").split(",") if entry.strip())
+}
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "5"))
+
+# Profiling: /profile samples every thread's stack every PROFILE_INTERVAL_MS milliseconds
+# for up to PROFILE_MAX_SECONDS seconds.
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
+# Up to CONCURRENT_UPDATES updates are handled at once, each user's in arrival order
+# (1 = one update at a time).
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+
+# Sessions: conversations end after CONVERSATION_TIMEOUT seconds without input, and
+# a job evicts users' session state after SESSION_IDLE_TIMEOUT seconds of inactivity.
+CONVERSATION_TIMEOUT = int(os.getenv("CONVERSATION_TIMEOUT", "900"))
+SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", "3600"))
+SESSION_EVICT_INTERVAL = int(os.getenv("SESSION_EVICT_INTERVAL", "600"))
+
+# Month-end report pre-generation: on the 1st at REPORT_PREGEN_TIME (HH:MM, UTC) every
+# teacher's report for the month that just closed is rendered into REPORT_STORE_DIR,
+# at most REPORT_PREGEN_CONCURRENCY at a time, and optionally pushed to every admin.
+REPORT_STORE_DIR = os.getenv("REPORT_STORE_DIR", "reports")
+REPORT_PREGEN_TIME = os.getenv("REPORT_PREGEN_TIME", "03:00")
+REPORT_PREGEN_CONCURRENCY = int(os.getenv("REPORT_PREGEN_CONCURRENCY", "1"))
+REPORT_PREGEN_PUSH = os.getenv("REPORT_PREGEN_PUSH", "false").lower() in ("1", "true", "yes")
+
+# Reports downloaded by admins are built in the background by REPORT_WORKERS tasks;
+# at most REPORT_QUEUE_SIZE distinct reports wait at a time.
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "20"))
+
+# Report layout (see report_templates.LAYOUTS): "classic", or "detailed" with an
+# attendance-rate column and shaded absences.
+REPORT_LAYOUT = os.getenv("REPORT_LAYOUT", "classic")
+
+# Maintenance: a daily job at MAINTENANCE_TIME (HH:MM, UTC) takes an online backup into
+# BACKUP_DIR (keeping the newest BACKUP_KEEP), refreshes planner statistics and runs an
+# incremental vacuum. Backup and vacuum work in steps of MAINTENANCE_STEP_PAGES pages
+# with MAINTENANCE_STEP_SLEEP seconds between steps so writers are never held up.
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+MAINTENANCE_TIME = os.getenv("MAINTENANCE_TIME", "02:30")
+MAINTENANCE_STEP_PAGES = int(os.getenv("MAINTENANCE_STEP_PAGES", "64"))
+MAINTENANCE_STEP_SLEEP = float(os.getenv("MAINTENANCE_STEP_SLEEP", "0.01"))
+
+# Archival: attendance of closed academic years (starting in ACADEMIC_YEAR_START_MONTH)
+# can be moved into per-year SQLite files in ARCHIVE_DIR; see archive.py.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ACADEMIC_YEAR_START_MONTH = int(os.getenv("ACADEMIC_YEAR_START_MONTH", "9"))
+
+# Audit log: attendance changes are buffered in memory and appended to the shard's
+# attendance_audit table every AUDIT_FLUSH_INTERVAL seconds; see audit.py.
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "5"))
+
+# Inline mode: Telegram caches each user's inline-query answers for INLINE_CACHE_TIME
+# seconds, and the bot keeps its own search results for as long.
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "30"))
+
+# Worker mode (workers.py): a webhook receiver on WEBHOOK_LISTEN:WEBHOOK_PORT routes
+# updates to WORKERS processes by user id. WEBHOOK_URL is the public URL registered
+# with Telegram, and WEBHOOK_SECRET is checked on every incoming request.
+WORKERS = int(os.getenv("WORKERS", "4"))
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
@@ -1,210 +1,210 @@
-"""Database layer — async CRUD operations for teachers, students, and attendance."""
-import aiosqlite
-from config import DB_PATH
+"""Database layer — async CRUD operations for teachers, students, and attendance.
+
+Every function works on the current school (see ``tenancy``) through the storage
+backend chosen by STORAGE_BACKEND (see ``storage``), and keeps the report store
+the school directory and other processes' caches in step with the changes it makes.
+"""
+import invalidation
+import report_store
+import storage
+import tenancy
+
+_repo = storage.create_repository()
+
+
+def _rosters_changed(*teacher_ids: int | None) -> None:
+    """Drop stored reports and cached class lists of these teachers of the current school."""
+    report_store.invalidate(*teacher_ids)
+    school = tenancy.current()
+    for teacher_id in set(teacher_ids) - {None}:
+        invalidation.publish(invalidation.ROSTER, (school, teacher_id))
+
+
+def backend() -> str:
+    """Return the name of the active storage backend."""
+    return _repo.name
 
 
 async def init_db():
-    """Create tables if they don't exist."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS teachers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_user_id INTEGER UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                is_admin INTEGER NOT NULL DEFAULT 0
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS students (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                teacher_id INTEGER NOT NULL,
-                FOREIGN KEY (teacher_id) REFERENCES teachers(id) ON DELETE CASCADE
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
-                UNIQUE(student_id, date)
-            )
-        """)
-        await db.commit()
+    """Create the current school's tables if they don't exist."""
+    await _repo.init()
+
+
+async def close():
+    """Close every open connection of the storage backend."""
+    await _repo.close()
+
+
+def snapshot(year: int | None = None, month: int | None = None):
+    """``async with db.snapshot():`` — run the block's reads against one consistent,
+    read-only view of the current school, without holding up writers.
+
+    Pass the month the block reports on, in case its attendance is archived.
+    """
+    return _repo.snapshot(year, month)
 
 
 # ── Teacher queries ──────────────────────────────────────────────────────────
 
 async def get_teacher_by_telegram_id(telegram_user_id: int) -> dict | None:
     """Return teacher dict or None."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM teachers WHERE telegram_user_id = ?", (telegram_user_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            return dict(row) if row else None
+    return await _repo.get_teacher_by_telegram_id(telegram_user_id)
 
 
 async def get_all_teachers() -> list[dict]:
     """Return list of all teachers."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM teachers ORDER BY name") as cursor:
-            rows = await cursor.fetchall()
-            return [dict(r) for r in rows]
+    return await _repo.get_all_teachers()
 
 
 async def add_teacher(telegram_user_id: int, name: str, is_admin: bool = False) -> int:
-    """Insert a new teacher. Returns the new teacher id."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "INSERT INTO teachers (telegram_user_id, name, is_admin) VALUES (?, ?, ?)",
-            (telegram_user_id, name, 1 if is_admin else 0),
-        )
-        await db.commit()
-        return cursor.lastrowid
+    """Insert a new teacher into the current school. Returns the new teacher id."""
+    teacher_id = await _repo.add_teacher(telegram_user_id, name, is_admin)
+    await tenancy.assign(telegram_user_id, tenancy.current())
+    invalidation.publish(invalidation.TEACHER, telegram_user_id)
+    return teacher_id
 
 
 async def remove_teacher(teacher_id: int):
     """Delete a teacher and cascade-delete their students and attendance."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        await db.execute("DELETE FROM teachers WHERE id = ?", (teacher_id,))
-        await db.commit()
+    telegram_user_id = await _repo.remove_teacher(teacher_id)
+    if telegram_user_id is not None:
+        await tenancy.unassign(telegram_user_id)
+        invalidation.publish(invalidation.TEACHER, telegram_user_id)
+    _rosters_changed(teacher_id)
+
+
+async def import_roster(
+    teachers: list[tuple[int, str, bool]], students: list[tuple[int, str]]
+) -> dict[int, int]:
+    """Upsert teachers and add students to the current school in one transaction.
+
+    ``teachers`` are (telegram_user_id, name, is_admin) and ``students`` are
+    (teacher's telegram_user_id, name); pass only what changes, since every teacher
+    named loses their stored reports. Returns teacher ids by Telegram id.
+    """
+    teacher_ids = await _repo.import_roster(teachers, students)
+    telegram_ids = [telegram_user_id for telegram_user_id, _, _ in teachers]
+    await tenancy.assign_many(telegram_ids, tenancy.current())
+    for telegram_user_id in telegram_ids:
+        invalidation.publish(invalidation.TEACHER, telegram_user_id)
+    changed = set(telegram_ids) | {telegram_user_id for telegram_user_id, _ in students}
+    _rosters_changed(*(teacher_ids[telegram_user_id] for telegram_user_id in changed))
+    return teacher_ids
 
 
 # ── Student queries ──────────────────────────────────────────────────────────
 
 async def get_students_by_teacher(teacher_id: int) -> list[dict]:
     """Return students belonging to a teacher."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM students WHERE teacher_id = ? ORDER BY name", (teacher_id,)
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [dict(r) for r in rows]
+    return await _repo.get_students_by_teacher(teacher_id)
 
 
 async def get_student_by_id(student_id: int) -> dict | None:
     """Return a single student or None."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM students WHERE id = ?", (student_id,)) as cursor:
-            row = await cursor.fetchone()
-            return dict(row) if row else None
+    return await _repo.get_student_by_id(student_id)
 
 
 async def add_student(name: str, teacher_id: int) -> int:
     """Add a student to a teacher's class. Returns student id."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "INSERT INTO students (name, teacher_id) VALUES (?, ?)", (name, teacher_id)
-        )
-        await db.commit()
-        return cursor.lastrowid
+    student_id = await _repo.add_student(name, teacher_id)
+    _rosters_changed(teacher_id)
+    return student_id
 
 
 async def remove_student(student_id: int):
     """Delete a student and their attendance records."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        await db.execute("DELETE FROM students WHERE id = ?", (student_id,))
-        await db.commit()
+    _rosters_changed(await _repo.remove_student(student_id))
 
 
 async def update_student_name(student_id: int, new_name: str):
     """Rename a student."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE students SET name = ? WHERE id = ?", (new_name, student_id))
-        await db.commit()
+    _rosters_changed(await _repo.update_student_name(student_id, new_name))
 
 
 async def move_student(student_id: int, new_teacher_id: int):
     """Move a student to a different teacher's class."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE students SET teacher_id = ? WHERE id = ?", (new_teacher_id, student_id)
-        )
-        await db.commit()
+    old_teacher_id = await _repo.move_student(student_id, new_teacher_id)
+    _rosters_changed(old_teacher_id, new_teacher_id)
+
+
+async def move_students(student_ids: list[int], new_teacher_id: int) -> dict[int, int]:
+    """Move students to a different teacher's class in one transaction.
+
+    Returns the teacher id each moved student had, by student id; students that
+    no longer exist are left out.
+    """
+    old_teacher_ids = await _repo.move_students(student_ids, new_teacher_id)
+    if old_teacher_ids:
+        _rosters_changed(*old_teacher_ids.values(), new_teacher_id)
+    return old_teacher_ids
+
+
+async def search_students(text: str, teacher_id: int | None = None, limit: int = 20) -> list[dict]:
+    """Find students by typed name words (Arabic-normalized prefix match), in one class
+    or, with no ``teacher_id``, the whole school. Dicts also carry ``teacher_name``.
+    """
+    return await _repo.search_students(text, teacher_id, limit)
 
 
 # ── Attendance queries ───────────────────────────────────────────────────────
 
 async def mark_attendance(student_id: int, date: str):
     """Mark a student as present for a given date (YYYY-MM-DD). Ignores duplicates."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO attendance (student_id, date) VALUES (?, ?)",
-            (student_id, date),
-        )
-        await db.commit()
+    await _repo.mark_attendance(student_id, date)
 
 
 async def remove_attendance(student_id: int, date: str):
     """Remove attendance record for a student on a given date."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "DELETE FROM attendance WHERE student_id = ? AND date = ?",
-            (student_id, date),
-        )
-        await db.commit()
+    await _repo.remove_attendance(student_id, date)
 
 
 async def get_attendance_for_date(teacher_id: int, date: str) -> set[int]:
     """Return set of student_ids that are marked present for a teacher's class on a date."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            """
-            SELECT a.student_id FROM attendance a
-            JOIN students s ON a.student_id = s.id
-            WHERE s.teacher_id = ? AND a.date = ?
-            """,
-            (teacher_id, date),
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return {row[0] for row in rows}
+    return await _repo.get_attendance_for_date(teacher_id, date)
 
 
 async def get_attendance_for_month(teacher_id: int, year: int, month: int) -> list[dict]:
     """Return attendance records for a teacher's class for a given month.
     Returns list of dicts with keys: student_id, student_name, date.
     """
-    month_str = f"{year}-{month:02d}"
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            """
-            SELECT s.id as student_id, s.name as student_name, a.date
-            FROM students s
-            LEFT JOIN attendance a ON s.id = a.student_id AND a.date LIKE ?
-            WHERE s.teacher_id = ?
-            ORDER BY s.name, a.date
-            """,
-            (f"{month_str}%", teacher_id),
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [dict(r) for r in rows]
+    return await _repo.get_attendance_for_month(teacher_id, year, month)
 
 
 async def get_attendance_dates_for_month(teacher_id: int, year: int, month: int) -> list[str]:
     """Return sorted distinct dates (YYYY-MM-DD) where at least one attendance record exists
     for the given teacher's class in the given month.
     """
-    month_str = f"{year}-{month:02d}"
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            """
-            SELECT DISTINCT a.date
-            FROM attendance a
-            JOIN students s ON a.student_id = s.id
-            WHERE s.teacher_id = ? AND a.date LIKE ?
-            ORDER BY a.date ASC
-            """,
-            (teacher_id, f"{month_str}%"),
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
+    return await _repo.get_attendance_dates_for_month(teacher_id, year, month)
+
+
+# ── Audit log ────────────────────────────────────────────────────────────────
+
+async def add_audit_entries(entries: list[tuple[int, int, str, str, str]]):
+    """Append (teacher_id, student_id, date, action, changed_at) rows to the audit log."""
+    await _repo.add_audit_entries(entries)
+
+
+async def get_attendance_history(student_id: int, limit: int = 30) -> list[dict]:
+    """Return a student's latest attendance changes, newest first.
+    Returns list of dicts with keys: date, action, changed_at, teacher_id, teacher_name.
+    """
+    return await _repo.get_attendance_history(student_id, limit)
+
+
+# ── Removals ─────────────────────────────────────────────────────────────────
+
+async def start_removal(kind: str, target_id: int, chat_id: int | None = None, message_id: int | None = None) -> int:
+    """Record that a teacher or student is being removed (see ``handlers.removals``).
+    Returns how many attendance rows are left to delete.
+    """
+    return await _repo.start_removal(kind, target_id, chat_id, message_id)
+
+
+async def delete_attendance_batch(kind: str, target_id: int, limit: int) -> int:
+    """Delete up to ``limit`` attendance rows of a teacher's class or a student. Returns how many."""
+    return await _repo.delete_attendance_batch(kind, target_id, limit)
+
+
+async def pending_removals() -> list[dict]:
+    """Return unfinished removals as dicts with keys: kind, target_id, chat_id, message_id."""
+    return await _repo.pending_removals()
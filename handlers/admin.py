@@ -1,18 +1,31 @@
 """Admin features — register/remove teachers, download attendance reports."""
+import asyncio
+import calendar
+import io
+import logging
+import time
 import warnings
-from datetime import date
+from datetime import date, datetime
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import TelegramError
 from telegram.ext import (
     CallbackQueryHandler,
     CommandHandler,
-    ContextTypes,
     ConversationHandler,
     MessageHandler,
     filters,
 )
 
+import audit
 import db
+import maintenance
+import profiling
+import querylog
+import report_store
+import tenancy
+from config import CONVERSATION_TIMEOUT, PROFILE_MAX_SECONDS, REPORT_PREGEN_CONCURRENCY, REPORT_PREGEN_PUSH
+from handlers import removals, report_jobs
 from handlers.common import (
     CB_CONFIRM_NO,
     CB_CONFIRM_YES,
@@ -34,17 +47,19 @@ from handlers.common import (
     send_and_track,
     track_bot_message,
 )
-from report import generate_attendance_report
+from handlers.session import SessionContext
+
+logger = logging.getLogger(__name__)
 
 
 # ── Download Report ──────────────────────────────────────────────────────────
 
-async def download_report_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def download_report_start(update: Update, context: SessionContext) -> int:
     """Show list of teachers to generate a report for."""
     query = update.callback_query
     await query.answer()
 
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     if not teacher or not teacher["is_admin"]:
         await query.edit_message_text("⛔ مطلوب صلاحيات المشرف.")
         return ConversationHandler.END
@@ -67,13 +82,13 @@ async def download_report_start(update: Update, context: ContextTypes.DEFAULT_TY
     return STATE_SELECT_TEACHER_FOR_REPORT
 
 
-async def report_teacher_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def report_teacher_selected(update: Update, context: SessionContext) -> int:
     """Show month selection after teacher is chosen."""
     query = update.callback_query
     await query.answer()
 
     teacher_id = int(query.data.replace("rptteacher_", ""))
-    context.user_data["report_teacher_id"] = teacher_id
+    context.user_data.report_teacher_id = teacher_id
 
     today = date.today()
     # Offer current month and previous 5 months
@@ -84,7 +99,6 @@ async def report_teacher_selected(update: Update, context: ContextTypes.DEFAULT_
         if m <= 0:
             m += 12
             y -= 1
-        import calendar
         month_name = calendar.month_name[m]
         months.append((y, m, f"{month_name} {y}"))
 
@@ -101,38 +115,43 @@ async def report_teacher_selected(update: Update, context: ContextTypes.DEFAULT_
     return STATE_SELECT_MONTH_FOR_REPORT
 
 
-async def report_month_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Generate and send the Excel report."""
+async def report_month_selected(update: Update, context: SessionContext) -> int:
+    """Send a stored report, or queue it and end the conversation at once."""
     query = update.callback_query
     await query.answer()
 
     parts = query.data.replace("rptmonth_", "").split("_")
     year, month = int(parts[0]), int(parts[1])
-    teacher_id = context.user_data.get("report_teacher_id")
+    teacher_id = context.user_data.report_teacher_id
+    context.user_data.report_teacher_id = None
 
     if not teacher_id:
         await query.edit_message_text("خطأ: فُقدت بيانات المعلم.", reply_markup=admin_menu_keyboard())
         return ConversationHandler.END
 
-    await query.edit_message_text("⏳ جاري إنشاء التقرير، يرجى الانتظار...")
-
-    import calendar
-    month_name = calendar.month_name[month]
-
     all_teachers = await db.get_all_teachers()
     target_teacher = next((t for t in all_teachers if t["id"] == teacher_id), None)
     teacher_name = target_teacher["name"] if target_teacher else "Unknown"
 
-    buffer = await generate_attendance_report(teacher_id, year, month)
-    filename = f"حضور_{teacher_name}_{month_name}_{year}.xlsx"
-
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     is_admin = bool(teacher["is_admin"]) if teacher else False
 
+    # Closed months are usually pre-generated by the month-end job.
+    buffer = report_store.get(teacher_id, year, month)
+    if buffer is None:
+        waiter = report_jobs.Waiter(query.message.chat_id, query.message.message_id, context.user_data, is_admin)
+        try:
+            await report_jobs.queue.submit(context.bot, teacher_id, teacher_name, year, month, waiter)
+        except report_jobs.QueueFull:
+            await query.edit_message_text(
+                "⚠️ قائمة انتظار التقارير ممتلئة. حاول مرة أخرى بعد قليل.", reply_markup=admin_menu_keyboard()
+            )
+        return ConversationHandler.END
+
     doc_msg = await query.message.reply_document(
         document=buffer,
-        filename=filename,
-        caption=f"📊 تقرير الحضور لـ {teacher_name} — {month_name} {year}",
+        filename=report_store.report_filename(teacher_name, year, month),
+        caption=report_store.report_caption(teacher_name, year, month),
     )
     track_bot_message(context, doc_msg.message_id)
     menu_msg = await query.message.reply_text(
@@ -140,11 +159,72 @@ async def report_month_selected(update: Update, context: ContextTypes.DEFAULT_TY
         reply_markup=main_menu_keyboard(is_admin),
     )
     track_bot_message(context, menu_msg.message_id)
-
-    context.user_data.pop("report_teacher_id", None)
     return ConversationHandler.END
 
 
+async def pregenerate_month_end_reports(context: SessionContext) -> None:
+    """Job: render every teacher's report for the month that just closed, school by school.
+
+    Runs off-peak on the 1st. At most REPORT_PREGEN_CONCURRENCY reports are in
+    flight at once and each workbook renders in a worker thread, so live updates
+    keep flowing. With REPORT_PREGEN_PUSH set, admins also receive the reports.
+    """
+    for school in await tenancy.all_schools():
+        with tenancy.use(school):
+            await _pregenerate_school_reports(context)
+
+
+async def _pregenerate_school_reports(context: SessionContext) -> None:
+    from report import generate_attendance_report
+
+    year, month = report_store.previous_month()
+    teachers = await db.get_all_teachers()
+    semaphore = asyncio.Semaphore(REPORT_PREGEN_CONCURRENCY)
+    started = time.perf_counter()
+
+    async def render(teacher: dict) -> io.BytesIO:
+        async with semaphore:
+            buffer = report_store.get(teacher["id"], year, month)
+            if buffer is None:
+                buffer = await generate_attendance_report(teacher["id"], year, month)
+                report_store.put(teacher["id"], year, month, buffer)
+            return buffer
+
+    results = await asyncio.gather(*(render(t) for t in teachers), return_exceptions=True)
+    rendered = []
+    for teacher, result in zip(teachers, results):
+        if isinstance(result, Exception):
+            logger.error("Pre-generating report for teacher %s failed", teacher["id"], exc_info=result)
+        else:
+            rendered.append((teacher, result))
+    logger.info(
+        "Pre-generated %d/%d reports of school %s for %d-%02d in %.1f s.",
+        len(rendered), len(teachers), tenancy.current(), year, month, time.perf_counter() - started,
+    )
+
+    if REPORT_PREGEN_PUSH:
+        admins = [t for t in teachers if t["is_admin"]]
+        await _push_reports(context.bot, admins, rendered, year, month)
+
+
+async def _push_reports(bot, admins: list[dict], rendered: list[tuple[dict, io.BytesIO]], year: int, month: int):
+    """Send each pre-generated report to every admin, uploading each file only once."""
+    for teacher, buffer in rendered:
+        file_id = None
+        for admin in admins:
+            try:
+                msg = await bot.send_document(
+                    chat_id=admin["telegram_user_id"],
+                    document=file_id or io.BytesIO(buffer.getvalue()),
+                    filename=report_store.report_filename(teacher["name"], year, month),
+                    caption=report_store.report_caption(teacher["name"], year, month),
+                )
+            except TelegramError as e:
+                logger.warning("Could not push report to admin %s: %s", admin["telegram_user_id"], e)
+                continue
+            file_id = file_id or msg.document.file_id
+
+
 def download_report_conversation() -> ConversationHandler:
     """Build ConversationHandler for downloading a report."""
     return ConversationHandler(
@@ -162,17 +242,18 @@ def download_report_conversation() -> ConversationHandler:
             CallbackQueryHandler(cancel_handler, pattern=f"^{CB_MAIN_MENU}$"),
         ],
         per_message=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
     )
 
 
 # ── Register Teacher ─────────────────────────────────────────────────────────
 
-async def register_teacher_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def register_teacher_start(update: Update, context: SessionContext) -> int:
     """Prompt admin to type the new teacher's name."""
     query = update.callback_query
     await query.answer()
 
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     if not teacher or not teacher["is_admin"]:
         await query.edit_message_text("⛔ مطلوب صلاحيات المشرف.")
         return ConversationHandler.END
@@ -183,14 +264,14 @@ async def register_teacher_start(update: Update, context: ContextTypes.DEFAULT_T
     return STATE_WAITING_TEACHER_NAME
 
 
-async def register_teacher_name_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def register_teacher_name_received(update: Update, context: SessionContext) -> int:
     """Save name and ask for Telegram user ID."""
     name = update.message.text.strip()
     if not name:
         await send_and_track(update, context, "الاسم لا يمكن أن يكون فارغاً. اكتب اسماً صحيحاً:")
         return STATE_WAITING_TEACHER_NAME
 
-    context.user_data["new_teacher_name"] = name
+    context.user_data.new_teacher_name = name
     await send_and_track(
         update, context,
         f"اسم المعلم: {name}\n\n"
@@ -200,7 +281,7 @@ async def register_teacher_name_received(update: Update, context: ContextTypes.D
     return STATE_WAITING_TEACHER_ID
 
 
-async def register_teacher_id_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def register_teacher_id_received(update: Update, context: SessionContext) -> int:
     """Save Telegram ID and ask if admin."""
     text = update.message.text.strip()
     try:
@@ -218,8 +299,15 @@ async def register_teacher_id_received(update: Update, context: ContextTypes.DEF
             reply_markup=admin_menu_keyboard(),
         )
         return ConversationHandler.END
+    if await tenancy.school_of(telegram_id) not in (None, tenancy.current()):
+        await send_and_track(
+            update, context,
+            f"المعلم بمعرّف تيليجرام {telegram_id} مسجّل مسبقاً في مدرسة أخرى.",
+            reply_markup=admin_menu_keyboard(),
+        )
+        return ConversationHandler.END
 
-    context.user_data["new_teacher_telegram_id"] = telegram_id
+    context.user_data.new_teacher_telegram_id = telegram_id
 
     buttons = [
         [
@@ -235,14 +323,16 @@ async def register_teacher_id_received(update: Update, context: ContextTypes.DEF
     return STATE_WAITING_TEACHER_ADMIN
 
 
-async def register_teacher_admin_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def register_teacher_admin_selected(update: Update, context: SessionContext) -> int:
     """Finalize teacher registration."""
     query = update.callback_query
     await query.answer()
 
     is_admin = query.data == "admin_yes"
-    name = context.user_data.pop("new_teacher_name", "Unknown")
-    telegram_id = context.user_data.pop("new_teacher_telegram_id", 0)
+    name = context.user_data.new_teacher_name or "Unknown"
+    context.user_data.new_teacher_name = None
+    telegram_id = context.user_data.new_teacher_telegram_id or 0
+    context.user_data.new_teacher_telegram_id = None
 
     await db.add_teacher(telegram_id, name, is_admin)
     role = "معلم مشرف" if is_admin else "معلم"
@@ -275,17 +365,18 @@ def register_teacher_conversation() -> ConversationHandler:
                 CallbackQueryHandler(cancel_handler, pattern=f"^{CB_MAIN_MENU}$"),
             ],
             per_message=False,
+            conversation_timeout=CONVERSATION_TIMEOUT,
         )
 
 
 # ── Remove Teacher ───────────────────────────────────────────────────────────
 
-async def remove_teacher_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def remove_teacher_start(update: Update, context: SessionContext) -> int:
     """Show list of teachers for removal."""
     query = update.callback_query
     await query.answer()
 
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     if not teacher or not teacher["is_admin"]:
         await query.edit_message_text("⛔ مطلوب صلاحيات المشرف.")
         return ConversationHandler.END
@@ -314,7 +405,7 @@ async def remove_teacher_start(update: Update, context: ContextTypes.DEFAULT_TYP
     return STATE_SELECT_TEACHER_TO_REMOVE
 
 
-async def remove_teacher_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def remove_teacher_selected(update: Update, context: SessionContext) -> int:
     """Ask for confirmation."""
     query = update.callback_query
     await query.answer()
@@ -327,7 +418,7 @@ async def remove_teacher_selected(update: Update, context: ContextTypes.DEFAULT_
         await query.edit_message_text("المعلم غير موجود.", reply_markup=admin_menu_keyboard())
         return ConversationHandler.END
 
-    context.user_data["pending_remove_teacher"] = target
+    context.user_data.pending_remove_teacher = target
 
     buttons = [
         [
@@ -343,23 +434,26 @@ async def remove_teacher_selected(update: Update, context: ContextTypes.DEFAULT_
     return STATE_CONFIRM_REMOVE_TEACHER
 
 
-async def remove_teacher_confirmed(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def remove_teacher_confirmed(update: Update, context: SessionContext) -> int:
     """Process teacher removal."""
     query = update.callback_query
     await query.answer()
 
     if query.data == CB_CONFIRM_YES:
-        target = context.user_data.pop("pending_remove_teacher", None)
-        if target:
-            await db.remove_teacher(target["id"])
+        target = context.user_data.pending_remove_teacher
+        context.user_data.pending_remove_teacher = None
+        if target and removals.is_removing(target["id"]):
             await query.edit_message_text(
-                f"✅ تم حذف المعلم '{target['name']}'.",
-                reply_markup=admin_menu_keyboard(),
+                f"⏳ حذف المعلم '{target['name']}' جارٍ بالفعل.", reply_markup=admin_menu_keyboard()
             )
+        elif target:
+            # Attendance is deleted in batches in the background; the message shows the progress.
+            await query.edit_message_text(f"⏳ جاري حذف المعلم '{target['name']}'...")
+            removals.start_teacher_removal(context.bot, target, query.message.chat_id, query.message.message_id)
         else:
             await query.edit_message_text("خطأ: فُقدت بيانات المعلم.", reply_markup=admin_menu_keyboard())
     else:
-        context.user_data.pop("pending_remove_teacher", None)
+        context.user_data.pending_remove_teacher = None
         await query.edit_message_text(
             "تم إلغاء الحذف.",
             reply_markup=admin_menu_keyboard(),
@@ -384,4 +478,224 @@ def remove_teacher_conversation() -> ConversationHandler:
             CallbackQueryHandler(cancel_handler, pattern=f"^{CB_MAIN_MENU}$"),
         ],
         per_message=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
     )
+
+
+# ── Slow Queries ─────────────────────────────────────────────────────────────
+
+async def slow_queries_command(update: Update, context: SessionContext):
+    """Handle /slowqueries [n] — send the n slowest SQL statements since startup."""
+    teacher = context.user_data.teacher
+    if not teacher:
+        teacher = await db.get_teacher_by_telegram_id(update.effective_user.id)
+    if not teacher or not teacher["is_admin"]:
+        await update.message.reply_text("⛔ مطلوب صلاحيات المشرف.")
+        return
+
+    if not querylog.enabled:
+        await update.message.reply_text(
+            "سجل الاستعلامات البطيئة غير مفعّل.\n"
+            "اضبط المتغير SLOW_QUERY_MS ثم أعد تشغيل البوت."
+        )
+        return
+
+    limit = int(context.args[0]) if context.args and context.args[0].isdigit() else 10
+    entries = querylog.slowest(limit)
+    if not entries:
+        await update.message.reply_text("لم يُسجَّل أي استعلام بطيء منذ بدء التشغيل.")
+        return
+
+    lines = []
+    for i, entry in enumerate(entries, start=1):
+        lines.append(f"{i}. {entry.duration_ms:.1f} ms @ {entry.at:%Y-%m-%d %H:%M:%S}")
+        lines.append(f"   SQL: {entry.sql}")
+        lines.append(f"   params: {entry.params!r}")
+        for detail in entry.plan:
+            lines.append(f"   plan: {detail}")
+    buffer = io.BytesIO("\n".join(lines).encode("utf-8"))
+    await update.message.reply_document(
+        document=buffer,
+        filename="slow_queries.txt",
+        caption=f"🐢 أبطأ {len(entries)} استعلامات منذ بدء التشغيل",
+    )
+
+
+# ── Student Search ───────────────────────────────────────────────────────────
+
+async def search_command(update: Update, context: SessionContext):
+    """Handle /search <name> — find students across every class of the school."""
+    teacher = context.user_data.teacher
+    if not teacher:
+        teacher = await db.get_teacher_by_telegram_id(update.effective_user.id)
+    if not teacher or not teacher["is_admin"]:
+        await update.message.reply_text("⛔ مطلوب صلاحيات المشرف.")
+        return
+
+    text = " ".join(context.args or ())
+    if not text.strip():
+        await update.message.reply_text("الاستخدام: /search <جزء من اسم الطالب>")
+        return
+
+    limit = 30
+    matches = await db.search_students(text, limit=limit + 1)
+    if not matches:
+        await update.message.reply_text(f"لا يوجد طالب يطابق '{text}'.")
+        return
+
+    lines = [f"🔍 نتائج البحث عن '{text}':", ""]
+    lines.extend(f"#{m['id']} {m['name']} — صف {m['teacher_name']}" for m in matches[:limit])
+    if len(matches) > limit:
+        lines.append("\n… والمزيد. أضف كلمة أخرى لتضييق البحث.")
+    await update.message.reply_text("\n".join(lines))
+
+
+# ── Attendance History ───────────────────────────────────────────────────────
+
+async def history_command(update: Update, context: SessionContext):
+    """Handle /history <student_id> [n] — show the n latest attendance changes of a student."""
+    teacher = context.user_data.teacher
+    if not teacher:
+        teacher = await db.get_teacher_by_telegram_id(update.effective_user.id)
+    if not teacher or not teacher["is_admin"]:
+        await update.message.reply_text("⛔ مطلوب صلاحيات المشرف.")
+        return
+
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("الاستخدام: /history <رقم الطالب> [عدد السجلات]")
+        return
+    student_id = int(context.args[0])
+    limit = int(context.args[1]) if len(context.args) > 1 and context.args[1].isdigit() else 30
+
+    # Include changes still waiting in the write buffer.
+    await audit.flush()
+    entries = await db.get_attendance_history(student_id, min(limit, 100))
+    if not entries:
+        await update.message.reply_text("لا توجد تغييرات مسجلة لهذا الطالب.")
+        return
+
+    student = await db.get_student_by_id(student_id)
+    title = student["name"] if student else f"طالب محذوف #{student_id}"
+    lines = [f"🕓 سجل حضور {title} (الأحدث أولاً):", ""]
+    for entry in entries:
+        action = "✅ حضور" if entry["action"] == audit.MARKED else "❌ إلغاء الحضور"
+        by = entry["teacher_name"] or f"معلم محذوف #{entry['teacher_id']}"
+        lines.append(f"{entry['date']} — {action} — {by} — {entry['changed_at'].replace('T', ' ')}")
+    await update.message.reply_text("\n".join(lines))
+
+
+# ── Profiling ────────────────────────────────────────────────────────────────
+
+async def profile_command(update: Update, context: SessionContext):
+    """Handle /profile <seconds> — sample the bot's stacks for a while and send the hot
+    functions and the collapsed stacks."""
+    teacher = context.user_data.teacher
+    if not teacher:
+        teacher = await db.get_teacher_by_telegram_id(update.effective_user.id)
+    if not teacher or not teacher["is_admin"]:
+        await update.message.reply_text("⛔ مطلوب صلاحيات المشرف.")
+        return
+
+    if not context.args or not context.args[0].isdigit() or int(context.args[0]) < 1:
+        await update.message.reply_text(f"الاستخدام: /profile <عدد الثواني> (حتى {PROFILE_MAX_SECONDS})")
+        return
+    if profiling.is_running():
+        await update.message.reply_text("⏳ تحليل الأداء قيد التشغيل بالفعل.")
+        return
+    seconds = min(int(context.args[0]), PROFILE_MAX_SECONDS)
+
+    chat_id = update.effective_chat.id
+    # Started before the reply is awaited, so a second /profile meanwhile finds it running.
+    profiling.start()
+    try:
+        await update.message.reply_text(f"⏱️ بدأ تحليل الأداء لمدة {seconds} ث، سيتم إرسال النتيجة عند الانتهاء...")
+    except BaseException:
+        # Nothing will collect it now; don't leave the sampler and its short switch interval behind.
+        profiling.cancel()
+        raise
+
+    async def run_and_report():
+        try:
+            result = await profiling.collect(seconds)
+        except Exception:
+            logger.exception("Profiling failed")
+            await context.bot.send_message(chat_id=chat_id, text="❌ فشل تحليل الأداء. راجع السجلات.")
+            return
+        if not result.samples:
+            await context.bot.send_message(chat_id=chat_id, text="لم يُلتقط أي نشاط خلال فترة التحليل.")
+            return
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        await context.bot.send_document(
+            chat_id=chat_id,
+            document=io.BytesIO(result.hot_functions().encode("utf-8")),
+            filename=f"profile_{stamp}.txt",
+            caption=f"🔥 أكثر الدوال استهلاكاً — {result.samples} عينة خلال {seconds} ث",
+        )
+        await context.bot.send_document(
+            chat_id=chat_id,
+            document=io.BytesIO(result.collapsed().encode("utf-8")),
+            filename=f"profile_{stamp}.collapsed",
+            caption="🧯 المكدسات المطوية (flamegraph.pl أو speedscope)",
+        )
+
+    # Runs as its own task so the profiled window sees the other users' updates.
+    context.application.create_task(run_and_report(), update=update)
+
+
+# ── Maintenance ──────────────────────────────────────────────────────────────
+
+def _maintenance_summary(report: maintenance.MaintenanceReport) -> str:
+    lines = [
+        f"🧰 اكتملت الصيانة في {report.total_s:.2f} ث",
+        f"• النسخة الاحتياطية: {report.backup_s:.2f} ث ({report.backup_bytes / 1024:.0f} KB، {report.backup_steps} خطوة)",
+        f"• تحديث الإحصاءات (ANALYZE): {report.analyze_s:.2f} ث",
+        f"• التفريغ التدريجي: {report.vacuum_s:.2f} ث ({report.vacuum_pages} صفحة)",
+        f"• دمج سجل WAL: {report.checkpoint_s:.2f} ث ({report.checkpoint_pages} صفحة)",
+        f"• نسخ قديمة محذوفة: {len(report.removed_backups)}",
+    ]
+    lines.extend(f"⚠️ {note}" for note in report.notes)
+    return "\n".join(lines)
+
+
+async def maintenance_command(update: Update, context: SessionContext):
+    """Handle /maintenance — run backup, ANALYZE and vacuum in the background."""
+    teacher = context.user_data.teacher
+    if not teacher:
+        teacher = await db.get_teacher_by_telegram_id(update.effective_user.id)
+    if not teacher or not teacher["is_admin"]:
+        await update.message.reply_text("⛔ مطلوب صلاحيات المشرف.")
+        return
+
+    if db.backend() != "sqlite":
+        await update.message.reply_text("ℹ️ الصيانة تخص قواعد SQLite فقط؛ PostgreSQL يتولاها بنفسه.")
+        return
+    if maintenance.is_running():
+        await update.message.reply_text("⏳ الصيانة قيد التشغيل بالفعل.")
+        return
+
+    chat_id = update.effective_chat.id
+    await update.message.reply_text("⏳ بدأت الصيانة، سيتم إرسال النتيجة عند الانتهاء...")
+
+    async def run_and_report():
+        try:
+            report = await maintenance.run_maintenance()
+        except Exception:
+            logger.exception("Maintenance failed")
+            await context.bot.send_message(chat_id=chat_id, text="❌ فشلت الصيانة. راجع السجلات.")
+            return
+        await context.bot.send_message(chat_id=chat_id, text=_maintenance_summary(report))
+
+    # Runs as its own task so other users' updates keep being processed meanwhile.
+    context.application.create_task(run_and_report(), update=update)
+
+
+async def maintenance_job(context: SessionContext) -> None:
+    """Job: daily maintenance run for every school, one after another."""
+    for school in await tenancy.all_schools():
+        with tenancy.use(school):
+            if maintenance.is_running():
+                continue
+            try:
+                await maintenance.run_maintenance()
+            except Exception:
+                logger.exception("Scheduled maintenance of school %s failed", school)
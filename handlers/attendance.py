@@ -1,25 +1,28 @@
 """Take attendance flow — toggle students present/absent for today."""
+import html
+import io
+from collections.abc import Container
 from datetime import date
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import ContextTypes
 
+import audit
 import db
-from handlers.common import CB_ATTENDANCE, CB_DONE, CB_MAIN_MENU, main_menu_keyboard
+from handlers.common import CB_ATTENDANCE, CB_DONE, CB_MAIN_MENU, main_menu_keyboard, track_bot_message
+from handlers.session import SessionContext
 
 
-async def attendance_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def attendance_start(update: Update, context: SessionContext):
     """Show the student list with attendance toggles for today."""
     query = update.callback_query
     await query.answer()
 
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     if not teacher:
         await query.edit_message_text("⛔ انتهت الجلسة. يرجى كتابة /start من جديد.")
         return
 
     today = date.today().isoformat()
-    context.user_data["attendance_date"] = today
 
     students = await db.get_students_by_teacher(teacher["id"])
     if not students:
@@ -33,7 +36,7 @@ async def attendance_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     present_ids = await db.get_attendance_for_date(teacher["id"], today)
-    context.user_data["present_ids"] = present_ids
+    context.user_data.start_attendance(today, present_ids, students)
 
     keyboard = _build_attendance_keyboard(students, present_ids)
     await query.edit_message_text(
@@ -43,7 +46,7 @@ async def attendance_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 def _build_attendance_keyboard(
-    students: list[dict], present_ids: set[int]
+    students: list[dict], present_ids: Container[int]
 ) -> InlineKeyboardMarkup:
     """Build inline keyboard with student names and ✓/✗ indicators."""
     buttons = []
@@ -62,31 +65,42 @@ def _build_attendance_keyboard(
     return InlineKeyboardMarkup(buttons)
 
 
-async def attendance_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def attendance_toggle(update: Update, context: SessionContext):
     """Toggle a student's attendance for today."""
     query = update.callback_query
     await query.answer()
 
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     if not teacher:
         await query.edit_message_text("⛔ انتهت الجلسة. يرجى كتابة /start من جديد.")
         return
 
     student_id = int(query.data.replace("toggle_", ""))
-    today = context.user_data.get("attendance_date", date.today().isoformat())
-    present_ids: set = context.user_data.get("present_ids", set())
+    session = context.user_data
+    if session.present_ids is None:
+        # Session was evicted mid-roll; reload today's state before toggling.
+        today = date.today().isoformat()
+        session.start_attendance(
+            today,
+            await db.get_attendance_for_date(teacher["id"], today),
+            await db.get_students_by_teacher(teacher["id"]),
+        )
+    elif session.roster is None:
+        # The class changed since the round started (see ``forget_roster``); show it as it is now.
+        session.roster = await db.get_students_by_teacher(teacher["id"])
+    today = session.attendance_date
+    present_ids = session.present_ids
 
     if student_id in present_ids:
         await db.remove_attendance(student_id, today)
         present_ids.discard(student_id)
+        audit.record(teacher["id"], student_id, today, audit.REMOVED)
     else:
         await db.mark_attendance(student_id, today)
         present_ids.add(student_id)
+        audit.record(teacher["id"], student_id, today, audit.MARKED)
 
-    context.user_data["present_ids"] = present_ids
-
-    students = await db.get_students_by_teacher(teacher["id"])
-    keyboard = _build_attendance_keyboard(students, present_ids)
+    keyboard = _build_attendance_keyboard(session.roster, present_ids)
 
     await query.edit_message_text(
         f"📋 الحضور ليوم {today}\n\nاضغط على اسم الطالب لتسجيل حضوره أو غيابه:",
@@ -94,35 +108,108 @@ async def attendance_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-async def attendance_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Finish taking attendance and show summary."""
+# Telegram rejects messages longer than this many characters.
+MESSAGE_LIMIT = 4096
+# Summaries needing more follow-up messages than this are sent as one text document.
+MAX_SUMMARY_MESSAGES = 3
+
+
+def _pack(lines: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Join lines into as few messages of at most ``limit`` characters as possible."""
+    chunks, current = [], ""
+    for line in lines:
+        line = line[:limit]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            candidate = line
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def render_summary(
+    today: str, students: list[dict], present_ids: Container[int]
+) -> tuple[str, list[str], str | None]:
+    """Render the end-of-roll summary as HTML.
+
+    Returns the headline with the counts, the name lists packed into messages
+    (the first may be appended to the headline), and — when the lists would
+    take more than MAX_SUMMARY_MESSAGES messages — a plain-text document to
+    send instead of them.
+    """
+    present = [s["name"] for s in students if s["id"] in present_ids]
+    absent = [s["name"] for s in students if s["id"] not in present_ids]
+    headline = (
+        f"✅ تم حفظ الحضور ليوم {today}\n\n"
+        f"الحاضرون: {len(present)} — الغائبون: {len(absent)}"
+    )
+
+    lines = []
+    for title, names in ((f"الحاضرون ({len(present)})", present), (f"الغائبون ({len(absent)})", absent)):
+        if lines:
+            lines.append("")
+        lines.append(f"<b>{title}:</b>")
+        if names:
+            lines.extend(f"  • {html.escape(n)}" for n in names)
+        else:
+            lines.append("  لا يوجد")
+    chunks = _pack(lines)
+
+    if len(chunks) > MAX_SUMMARY_MESSAGES:
+        document = [f"الحضور ليوم {today}", "", f"الحاضرون ({len(present)}):", *present,
+                    "", f"الغائبون ({len(absent)}):", *absent]
+        return headline, [], "\n".join(document)
+    return headline, chunks, None
+
+
+async def attendance_done(update: Update, context: SessionContext):
+    """Finish taking attendance and show the summary, split over several messages if needed."""
     query = update.callback_query
     await query.answer()
 
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     if not teacher:
         await query.edit_message_text("⛔ انتهت الجلسة. يرجى كتابة /start من جديد.")
         return
 
-    today = context.user_data.get("attendance_date", date.today().isoformat())
-    present_ids: set = context.user_data.get("present_ids", set())
-    students = await db.get_students_by_teacher(teacher["id"])
-
-    present_names = [s["name"] for s in students if s["id"] in present_ids]
-    absent_names = [s["name"] for s in students if s["id"] not in present_ids]
-
-    summary = f"✅ تم حفظ الحضور ليوم {today}\n\n"
-    summary += f"**الحاضرون ({len(present_names)}):**\n"
-    summary += "\n".join(f"  • {n}" for n in present_names) if present_names else "  لا يوجد"
-    summary += f"\n\n**الغائبون ({len(absent_names)}):**\n"
-    summary += "\n".join(f"  • {n}" for n in absent_names) if absent_names else "  لا يوجد"
-
-    is_admin = bool(teacher["is_admin"])
+    session = context.user_data
+    today = session.attendance_date or date.today().isoformat()
+    present_ids = session.present_ids
+    if present_ids is None:
+        # Session was evicted mid-roll; the marks are in the database.
+        present_ids = await db.get_attendance_for_date(teacher["id"], today)
+    students = session.roster
+    if students is None:
+        students = await db.get_students_by_teacher(teacher["id"])
+
+    headline, chunks, document = render_summary(today, students, present_ids)
+    keyboard = main_menu_keyboard(bool(teacher["is_admin"]))
+    session.end_attendance()
+
+    # The counts always go into the roll's own message; lists follow if they don't fit there.
+    if chunks and len(headline) + 2 + len(chunks[0]) <= MESSAGE_LIMIT:
+        headline = f"{headline}\n\n{chunks.pop(0)}"
     await query.edit_message_text(
-        summary,
-        reply_markup=main_menu_keyboard(is_admin),
-        parse_mode="Markdown",
+        headline, reply_markup=None if chunks or document else keyboard, parse_mode="HTML"
     )
 
-    context.user_data.pop("present_ids", None)
-    context.user_data.pop("attendance_date", None)
+    chat_id = query.message.chat_id
+    if document is not None:
+        msg = await context.bot.send_document(
+            chat_id=chat_id,
+            document=io.BytesIO(document.encode("utf-8")),
+            filename=f"attendance_{today}.txt",
+            caption="📄 قوائم الحضور والغياب",
+            reply_markup=keyboard,
+        )
+        track_bot_message(context, msg.message_id)
+    for i, chunk in enumerate(chunks):
+        msg = await context.bot.send_message(
+            chat_id=chat_id,
+            text=chunk,
+            parse_mode="HTML",
+            reply_markup=keyboard if i == len(chunks) - 1 else None,
+        )
+        track_bot_message(context, msg.message_id)
@@ -3,7 +3,9 @@ import logging
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.error import BadRequest
-from telegram.ext import ContextTypes, ConversationHandler
+from telegram.ext import ConversationHandler
+
+from handlers.session import SessionContext
 
 logger = logging.getLogger(__name__)
 
@@ -61,7 +63,7 @@ def manage_students_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton("➕ إضافة طالب", callback_data=CB_ADD_STUDENT)],
         [InlineKeyboardButton("❌ حذف طالب", callback_data=CB_REMOVE_STUDENT)],
         [InlineKeyboardButton("✏️ تعديل اسم طالب", callback_data=CB_EDIT_STUDENT)],
-        [InlineKeyboardButton("🔄 نقل طالب", callback_data=CB_MOVE_STUDENT)],
+        [InlineKeyboardButton("🔄 نقل طلاب", callback_data=CB_MOVE_STUDENT)],
         [InlineKeyboardButton("🔙 العودة للقائمة الرئيسية", callback_data=CB_MAIN_MENU)],
     ]
     return InlineKeyboardMarkup(buttons)
@@ -78,9 +80,10 @@ def admin_menu_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(buttons)
 
 
-async def delete_previous_bot_messages(chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def delete_previous_bot_messages(chat_id: int, context: SessionContext) -> None:
     """Delete all tracked bot messages from the chat."""
-    msg_ids = context.user_data.pop("bot_message_ids", [])
+    msg_ids = context.user_data.bot_message_ids
+    context.user_data.bot_message_ids = []
     for msg_id in msg_ids:
         try:
             await context.bot.delete_message(chat_id=chat_id, message_id=msg_id)
@@ -88,13 +91,12 @@ async def delete_previous_bot_messages(chat_id: int, context: ContextTypes.DEFAU
             pass
 
 
-def track_bot_message(context: ContextTypes.DEFAULT_TYPE, message_id: int) -> None:
+def track_bot_message(context: SessionContext, message_id: int) -> None:
     """Add a bot message ID to the tracking list."""
-    ids = context.user_data.setdefault("bot_message_ids", [])
-    ids.append(message_id)
+    context.user_data.bot_message_ids.append(message_id)
 
 
-async def send_and_track(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, **kwargs):
+async def send_and_track(update: Update, context: SessionContext, text: str, **kwargs):
     """Delete previous bot messages, delete the user's message, send a new reply_text, and track it."""
     chat_id = update.effective_chat.id
     await delete_previous_bot_messages(chat_id, context)
@@ -108,10 +110,10 @@ async def send_and_track(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
     return msg
 
 
-async def cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def cancel_handler(update: Update, context: SessionContext) -> int:
     """Cancel any conversation and return to main menu."""
     query = update.callback_query
-    teacher = context.user_data.get("teacher", {})
+    teacher = context.user_data.teacher or {}
     is_admin = teacher.get("is_admin", False)
     if query:
         await query.answer()
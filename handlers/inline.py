@@ -0,0 +1,251 @@
+"""Inline mode — ``@bot name`` looks up a student from any chat.
+
+Teachers search their own class, admins the whole school. The picked result
+posts a card with buttons to toggle today's attendance and to show the
+month's attendance. Answers are paginated with ``next_offset`` and cached by
+Telegram for INLINE_CACHE_TIME seconds per user. Searches are also cached in
+process for that long, and a longer prefix of a query whose results were all
+fetched is answered by filtering those results, with no database round-trip.
+A change to a class's students drops the cached searches that may list them.
+"""
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import lru_cache
+
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InlineQueryResultsButton,
+    InputTextMessageContent,
+    Update,
+)
+
+import audit
+import db
+import search
+import tenancy
+from config import INLINE_CACHE_TIME
+from handlers.session import SessionContext
+
+PAGE_SIZE = 20  # Telegram allows at most 50 results per answer
+MAX_RESULTS = 200  # fetched per query; pagination stops here
+CACHE_ENTRIES = 256
+
+CB_INLINE_TOGGLE = "itoggle_"
+CB_INLINE_STATS = "istats_"
+
+# (school, teacher id or None for school-wide, normalized query) → (expires, results, complete)
+_cache: OrderedDict[tuple, tuple[float, list[dict], bool]] = OrderedDict()
+
+
+def _cache_get(key: tuple) -> tuple[list[dict], bool] | None:
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    expires, results, complete = entry
+    if expires < time.monotonic():
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return results, complete
+
+
+def _cache_put(key: tuple, results: list[dict], complete: bool) -> None:
+    _cache[key] = (time.monotonic() + INLINE_CACHE_TIME, results, complete)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_ENTRIES:
+        _cache.popitem(last=False)
+
+
+def forget_class(key: tuple[str, int]) -> None:
+    """Drop cached searches that may list students of a class that changed."""
+    school, teacher_id = key
+    for cached in [k for k in _cache if k[0] == school and k[1] in (teacher_id, None)]:
+        del _cache[cached]
+
+
+@lru_cache(maxsize=4096)
+def _name_words(name: str) -> tuple[str, ...]:
+    return tuple(search.tokens(name))
+
+
+def _matches(name: str, words: list[str]) -> bool:
+    """Whether every typed word starts a word of ``name``, as the search index decides."""
+    name_words = _name_words(name)
+    return all(any(w.startswith(word) for w in name_words) for word in words)
+
+
+async def _lookup(text: str, teacher_id: int | None) -> list[dict]:
+    """Return up to MAX_RESULTS students matching ``text``, from the cache when possible."""
+    words = search.tokens(text)
+    scope = (tenancy.current(), teacher_id)
+    key = (*scope, " ".join(words))
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached[0]
+
+    # A shorter query (the user is still typing) whose results were all fetched holds every match.
+    for shorter in _shorter_queries(words):
+        cached = _cache_get((*scope, " ".join(shorter)))
+        if cached is not None and cached[1]:
+            results = [s for s in cached[0] if _matches(s["name"], words)]
+            _cache_put(key, results, True)
+            return results
+
+    if words:
+        results = await db.search_students(text, teacher_id, MAX_RESULTS + 1)
+    elif teacher_id is not None:
+        results = await db.get_students_by_teacher(teacher_id)
+    else:
+        results = []
+    complete = len(results) <= MAX_RESULTS
+    results = results[:MAX_RESULTS]
+    _cache_put(key, results, complete)
+    return results
+
+
+def _shorter_queries(words: list[str]):
+    """Queries typed on the way to ``words``, longest first: the last word cut short, then without it."""
+    if not words:
+        return
+    last = words[-1]
+    for length in range(len(last) - 1, 0, -1):
+        yield words[:-1] + [last[:length]]
+    if len(words) > 1:
+        yield words[:-1]
+
+
+def _card_keyboard(student_id: int) -> InlineKeyboardMarkup:
+    # Student ids are per school shard, so the buttons name the school the card was made in.
+    card = f"{tenancy.current()}_{student_id}"
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("✅/⬜ حضور اليوم", callback_data=f"{CB_INLINE_TOGGLE}{card}"),
+        InlineKeyboardButton("📊 حضور الشهر", callback_data=f"{CB_INLINE_STATS}{card}"),
+    ]])
+
+
+def _result(student: dict, show_class: bool) -> InlineQueryResultArticle:
+    class_line = f"صف {student['teacher_name']}" if show_class and "teacher_name" in student else None
+    return InlineQueryResultArticle(
+        id=str(student["id"]),
+        title=student["name"],
+        description=class_line or "اضغط لعرض بطاقة الطالب",
+        input_message_content=InputTextMessageContent(
+            f"👤 {student['name']}" + (f"\n🏫 {class_line}" if class_line else "")
+        ),
+        reply_markup=_card_keyboard(student["id"]),
+    )
+
+
+async def inline_lookup(update: Update, context: SessionContext):
+    """Answer an inline query with matching students, one page per offset."""
+    inline_query = update.inline_query
+    teacher = context.user_data.teacher
+    if not teacher:
+        teacher = await db.get_teacher_by_telegram_id(update.effective_user.id)
+        context.user_data.teacher = teacher
+    if not teacher:
+        await inline_query.answer(
+            [],
+            cache_time=INLINE_CACHE_TIME,
+            is_personal=True,
+            button=InlineQueryResultsButton("⛔ أنت غير مسجّل كمعلم", start_parameter="register"),
+        )
+        return
+
+    is_admin = bool(teacher["is_admin"])
+    # Admins search every class once they type something; an empty query lists the own class.
+    scope = None if is_admin and inline_query.query.strip() else teacher["id"]
+    results = await _lookup(inline_query.query, scope)
+
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    page = results[offset:offset + PAGE_SIZE]
+    next_offset = str(offset + PAGE_SIZE) if offset + PAGE_SIZE < len(results) else ""
+    await inline_query.answer(
+        [_result(s, show_class=scope is None) for s in page],
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=True,
+        next_offset=next_offset,
+    )
+
+
+async def _card_student(update: Update, context: SessionContext, prefix: str) -> tuple[dict, dict] | None:
+    """Return (teacher, student) for a card button, answering the query if it may not be used."""
+    query = update.callback_query
+    teacher = context.user_data.teacher
+    if not teacher:
+        teacher = await db.get_teacher_by_telegram_id(update.effective_user.id)
+        context.user_data.teacher = teacher
+    # A card made in another school names a student of that school's shard, not of the presser's.
+    # Cards posted before the school was in the data have none and are refused too.
+    school, _, student_id = query.data.removeprefix(prefix).rpartition("_")
+    student = await db.get_student_by_id(int(student_id)) if teacher and school == tenancy.current() else None
+    if not student:
+        await query.answer("⛔ هذا الطالب غير متاح لك.", show_alert=True)
+        return None
+    return teacher, student
+
+
+async def inline_toggle(update: Update, context: SessionContext):
+    """Toggle today's attendance of the student on a card; only their own teacher may."""
+    query = update.callback_query
+    found = await _card_student(update, context, CB_INLINE_TOGGLE)
+    if not found:
+        return
+    teacher, student = found
+    if student["teacher_id"] != teacher["id"]:
+        await query.answer("⛔ يمكن لمعلم الصف فقط تسجيل حضور هذا الطالب.", show_alert=True)
+        return
+
+    today = date.today().isoformat()
+    session = context.user_data
+    if session.attendance_date == today and session.present_ids is not None:
+        present = student["id"] in session.present_ids
+    else:
+        present = student["id"] in await db.get_attendance_for_date(teacher["id"], today)
+
+    if present:
+        await db.remove_attendance(student["id"], today)
+        audit.record(teacher["id"], student["id"], today, audit.REMOVED)
+    else:
+        await db.mark_attendance(student["id"], today)
+        audit.record(teacher["id"], student["id"], today, audit.MARKED)
+    # Keep an attendance round open in the private chat in step.
+    if session.attendance_date == today and session.present_ids is not None:
+        (session.present_ids.discard if present else session.present_ids.add)(student["id"])
+
+    status = "⬜ غائب" if present else "✅ حاضر"
+    await query.answer(f"{student['name']}: {status}")
+    await query.edit_message_text(
+        f"👤 {student['name']}\n📅 {today}: {status}",
+        reply_markup=_card_keyboard(student["id"]),
+    )
+
+
+async def inline_stats(update: Update, context: SessionContext):
+    """Show the student's attendance for the current month on the card."""
+    query = update.callback_query
+    found = await _card_student(update, context, CB_INLINE_STATS)
+    if not found:
+        return
+    teacher, student = found
+    if student["teacher_id"] != teacher["id"] and not teacher["is_admin"]:
+        await query.answer("⛔ هذا الطالب ليس في صفك.", show_alert=True)
+        return
+
+    today = date.today()
+    async with db.snapshot(today.year, today.month):
+        rows = await db.get_attendance_for_month(student["teacher_id"], today.year, today.month)
+        sessions = await db.get_attendance_dates_for_month(student["teacher_id"], today.year, today.month)
+    attended = [r["date"] for r in rows if r["student_id"] == student["id"] and r["date"]]
+
+    lines = [
+        f"👤 {student['name']}",
+        f"📊 حضور شهر {today:%Y-%m}: {len(attended)} من {len(sessions)} جلسة",
+    ]
+    if attended:
+        lines.append("الأيام: " + "، ".join(d[8:] for d in attended))
+    await query.answer()
+    await query.edit_message_text("\n".join(lines), reply_markup=_card_keyboard(student["id"]))
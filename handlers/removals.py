@@ -0,0 +1,135 @@
+"""Removing teachers and students in short transactions.
+
+A teacher's row cascades to their students and every attendance row of their
+class; deleted in one statement, years of history hold the write lock long
+enough to stall everyone's roll call. Instead the attendance is deleted
+REMOVAL_BATCH_ROWS rows at a time, each batch its own transaction, with a
+REMOVAL_BATCH_PAUSE pause in between so other writes get their turn. The
+teacher or student row goes last and cascades only what is left.
+
+A removal is recorded (``db.start_removal``) before its first batch, with the
+admin's status message, and the record is dropped with the row itself. When the
+bot starts, ``resume_job`` finishes every recorded removal, so a restart
+mid-way still deletes everything and the admin still hears the result.
+"""
+import asyncio
+import logging
+import time
+
+from telegram import Bot
+from telegram.error import TelegramError
+
+import db
+import tenancy
+from config import REMOVAL_BATCH_PAUSE, REMOVAL_BATCH_ROWS
+from handlers.common import admin_menu_keyboard
+from handlers.session import SessionContext
+
+logger = logging.getLogger(__name__)
+
+TEACHER = "teacher"
+STUDENT = "student"
+
+# Seconds between two progress edits of an admin's status message.
+_PROGRESS_INTERVAL = 2.0
+
+# Running teacher removals by (school, teacher id).
+_tasks: dict[tuple[str, int], asyncio.Task] = {}
+
+
+async def _delete_attendance(kind: str, target_id: int, on_batch=None) -> int:
+    """Delete the attendance of a removal batch by batch; return how many rows were deleted."""
+    deleted = 0
+    while True:
+        batch = await db.delete_attendance_batch(kind, target_id, REMOVAL_BATCH_ROWS)
+        deleted += batch
+        if on_batch is not None:
+            await on_batch(deleted)
+        if batch < REMOVAL_BATCH_ROWS:
+            return deleted
+        await asyncio.sleep(REMOVAL_BATCH_PAUSE)
+
+
+async def remove_student(student_id: int) -> None:
+    """Delete a student and their attendance of the current school."""
+    await db.start_removal(STUDENT, student_id)
+    await _delete_attendance(STUDENT, student_id)
+    await db.remove_student(student_id)
+
+
+def is_removing(teacher_id: int) -> bool:
+    """Return whether a teacher of the current school is being removed by this process."""
+    return (tenancy.current(), teacher_id) in _tasks
+
+
+def start_teacher_removal(bot: Bot, teacher: dict, chat_id: int, message_id: int) -> asyncio.Task:
+    """Remove ``teacher`` of the current school in the background, reporting progress
+    by editing the message ``message_id`` of ``chat_id``."""
+    key = (tenancy.current(), teacher["id"])
+    task = asyncio.create_task(_remove_teacher(bot, teacher, chat_id, message_id))
+    _tasks[key] = task
+    task.add_done_callback(lambda _: _tasks.pop(key, None))
+    return task
+
+
+async def _remove_teacher(bot: Bot, teacher: dict, chat_id: int, message_id: int) -> None:
+    name = teacher["name"]
+    last_edit = time.monotonic()
+
+    async def edit(text: str, reply_markup=None) -> None:
+        try:
+            await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, reply_markup=reply_markup)
+        except TelegramError as e:
+            logger.debug("Could not update removal status in chat %s: %s", chat_id, e)
+
+    try:
+        total = await db.start_removal(TEACHER, teacher["id"], chat_id, message_id)
+
+        async def on_batch(deleted: int) -> None:
+            nonlocal last_edit
+            if time.monotonic() - last_edit >= _PROGRESS_INTERVAL:
+                last_edit = time.monotonic()
+                await edit(f"⏳ جاري حذف المعلم '{name}'... {deleted}/{total} سجل حضور")
+
+        started = time.perf_counter()
+        deleted = await _delete_attendance(TEACHER, teacher["id"], on_batch)
+        await db.remove_teacher(teacher["id"])
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Removing teacher %s failed", teacher["id"])
+        await edit(
+            f"❌ تعذّر إكمال حذف المعلم '{name}'. سيُستأنف الحذف عند إعادة تشغيل البوت.",
+            admin_menu_keyboard(),
+        )
+        return
+    logger.info(
+        "Removed teacher %s with %d attendance rows in %.2f s", teacher["id"], deleted, time.perf_counter() - started
+    )
+    await edit(f"✅ تم حذف المعلم '{name}'.", admin_menu_keyboard())
+
+
+async def resume_job(context: SessionContext) -> None:
+    """Job: finish the removals a previous run left unfinished, in every school."""
+    for school in await tenancy.all_schools():
+        with tenancy.use(school):
+            pending = await db.pending_removals()
+            if not pending:
+                continue
+            teachers = {t["id"]: t for t in await db.get_all_teachers()}
+            for removal in pending:
+                logger.info("Resuming removal of %s %s in school %s", removal["kind"], removal["target_id"], school)
+                if removal["kind"] == STUDENT:
+                    await remove_student(removal["target_id"])
+                elif removal["target_id"] in teachers and not is_removing(removal["target_id"]):
+                    start_teacher_removal(
+                        context.bot, teachers[removal["target_id"]], removal["chat_id"], removal["message_id"]
+                    )
+
+
+async def stop() -> None:
+    """Cancel running teacher removals; they are resumed on the next start."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,242 @@
+"""Background report jobs: a bounded queue drained by REPORT_WORKERS tasks.
+
+An admin's report request is queued and the conversation ends at once. The
+request's status message is edited with its place in the queue and the job's
+progress, and the document is sent when it is ready. A request for a report
+that is already queued or being built (same school, teacher and month) joins
+that job instead of adding another, and the file is uploaded only once however
+many admins wait for it.
+
+Jobs live in this process's memory: queued jobs are lost on restart, and in
+worker mode each worker has its own queue.
+"""
+import asyncio
+import io
+import logging
+from dataclasses import dataclass, field
+
+from telegram import Bot
+from telegram.error import TelegramError
+
+import report_store
+import tenancy
+from config import REPORT_QUEUE_SIZE, REPORT_WORKERS
+from handlers.common import admin_menu_keyboard, main_menu_keyboard
+from handlers.session import Session
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two progress edits of a report's status messages.
+_PROGRESS_INTERVAL = 2.0
+
+
+class QueueFull(Exception):
+    """Raised when REPORT_QUEUE_SIZE jobs are already waiting."""
+
+
+@dataclass(frozen=True)
+class Waiter:
+    """An admin waiting for a report, and the message showing them its status."""
+
+    chat_id: int
+    message_id: int
+    session: Session
+    is_admin: bool = True
+
+
+@dataclass(eq=False)
+class ReportJob:
+    school: str
+    teacher_id: int
+    teacher_name: str
+    year: int
+    month: int
+    bot: Bot
+    waiters: list[Waiter] = field(default_factory=list)
+
+    @property
+    def key(self) -> tuple:
+        return self.school, self.teacher_id, self.year, self.month
+
+
+class ReportQueue:
+    """Runs report jobs in the background, ``workers`` at a time."""
+
+    def __init__(self, workers: int = REPORT_WORKERS, maxsize: int = REPORT_QUEUE_SIZE):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.completed = 0
+        self.failed = 0
+        self.joined = 0
+        self._jobs: dict[tuple, ReportJob] = {}  # queued or running, by key
+        self._waiting: list[ReportJob] = []  # queued, in order
+        self._running: set[ReportJob] = set()
+        self._queue: asyncio.Queue[ReportJob] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    def position(self, job: ReportJob) -> int:
+        """Return the job's place in the queue (1 = next), or 0 once it is being built."""
+        if job in self._running:
+            return 0
+        if job in self._waiting:
+            return self._waiting.index(job) + 1
+        return len(self._waiting) + 1
+
+    async def submit(
+        self, bot: Bot, teacher_id: int, teacher_name: str, year: int, month: int, waiter: Waiter
+    ) -> ReportJob:
+        """Queue a report for the current school, or join the same report's job."""
+        key = (tenancy.current(), teacher_id, year, month)
+        job = self._jobs.get(key)
+        if job is not None:
+            job.waiters.append(waiter)
+            self.joined += 1
+            await self._edit(job.bot, waiter, _status_text(self.position(job)))
+            return job
+
+        if len(self._waiting) >= self.maxsize:
+            raise QueueFull
+        job = ReportJob(key[0], teacher_id, teacher_name, year, month, bot, [waiter])
+        self._jobs[key] = job
+        # Takes the slot now: other submits may run while the status is edited.
+        self._waiting.append(job)
+        # Shown before the job can start, so a worker's progress edit is never overwritten.
+        await self._edit(bot, waiter, _status_text(self.position(job)))
+        self._start_workers()
+        self._queue.put_nowait(job)
+        return job
+
+    def _start_workers(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self._waiting.remove(job)
+            self._running.add(job)
+            try:
+                await self._announce_positions()
+                await self._run(job)
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                logger.exception("Report job for teacher %s (%d-%02d) failed", job.teacher_id, job.year, job.month)
+                for waiter in job.waiters:
+                    await self._edit(
+                        job.bot, waiter, "❌ تعذّر إنشاء التقرير. حاول مرة أخرى لاحقاً.", admin_menu_keyboard()
+                    )
+            finally:
+                self._running.discard(job)
+                del self._jobs[job.key]
+                self._queue.task_done()
+
+    async def _announce_positions(self) -> None:
+        """Tell the admins of every still-queued job that it moved up."""
+        for job in list(self._waiting):
+            text = _status_text(self.position(job))
+            for waiter in list(job.waiters):
+                await self._edit(job.bot, waiter, text)
+
+    async def _run(self, job: ReportJob) -> None:
+        for waiter in list(job.waiters):
+            await self._edit(job.bot, waiter, _status_text(0))
+        with tenancy.use(job.school):
+            buffer = report_store.get(job.teacher_id, job.year, job.month)
+            if buffer is None:
+                # Imported on first use: report pulls in openpyxl, which most runs never need.
+                from report import generate_attendance_report
+
+                buffer = await self._build(job, generate_attendance_report)
+                report_store.put(job.teacher_id, job.year, job.month, buffer)
+
+        # Admins who join while the file is being sent are served too.
+        file_id = None
+        delivered = 0
+        while delivered < len(job.waiters):
+            waiter = job.waiters[delivered]
+            delivered += 1
+            await self._edit(job.bot, waiter, "📤 جاري إرسال التقرير...")
+            file_id = await self._deliver(job, waiter, file_id or io.BytesIO(buffer.getvalue())) or file_id
+
+    async def _build(self, job: ReportJob, generate) -> io.BytesIO:
+        """Build the report, showing its waiters how many student rows are written."""
+        rows = (0, 0)
+
+        def on_row(done: int, total: int) -> None:
+            nonlocal rows
+            rows = done, total  # from the rendering thread; read here between waits
+
+        build = asyncio.ensure_future(generate(job.teacher_id, job.year, job.month, on_row=on_row))
+        shown = rows
+        try:
+            while not (await asyncio.wait({build}, timeout=_PROGRESS_INTERVAL))[0]:
+                if rows != shown:
+                    shown = rows
+                    for waiter in list(job.waiters):
+                        await self._edit(job.bot, waiter, _status_text(0, *shown))
+        finally:
+            build.cancel()
+        return build.result()
+
+    async def _deliver(self, job: ReportJob, waiter: Waiter, document) -> str | None:
+        """Send the report and a fresh menu in place of the status message; return the file id."""
+        try:
+            doc_msg = await job.bot.send_document(
+                chat_id=waiter.chat_id,
+                document=document,
+                filename=report_store.report_filename(job.teacher_name, job.year, job.month),
+                caption=report_store.report_caption(job.teacher_name, job.year, job.month),
+            )
+            menu_msg = await job.bot.send_message(
+                chat_id=waiter.chat_id,
+                text="تم إرسال التقرير! اختر من الخيارات:",
+                reply_markup=main_menu_keyboard(waiter.is_admin),
+            )
+        except TelegramError as e:
+            logger.warning("Could not send report to chat %s: %s", waiter.chat_id, e)
+            return None
+        waiter.session.bot_message_ids.extend((doc_msg.message_id, menu_msg.message_id))
+        try:
+            await job.bot.delete_message(chat_id=waiter.chat_id, message_id=waiter.message_id)
+        except TelegramError:
+            pass
+        return doc_msg.document.file_id
+
+    @staticmethod
+    async def _edit(bot: Bot, waiter: Waiter, text: str, reply_markup=None) -> None:
+        try:
+            await bot.edit_message_text(
+                text, chat_id=waiter.chat_id, message_id=waiter.message_id, reply_markup=reply_markup
+            )
+        except TelegramError as e:
+            # "Message is not modified" and deleted messages are expected here.
+            logger.debug("Could not update report status in chat %s: %s", waiter.chat_id, e)
+
+    async def drain(self) -> None:
+        """Wait until every queued job has finished."""
+        await self._queue.join()
+
+    async def stop(self) -> None:
+        """Cancel the workers; queued jobs are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._jobs.clear()
+        self._waiting.clear()
+        self._running.clear()
+        self._queue = asyncio.Queue()
+
+
+def _status_text(position: int, rows_done: int = 0, rows: int = 0) -> str:
+    if position == 0:
+        if rows:
+            return f"⚙️ جاري إنشاء التقرير... {rows_done}/{rows} طالب"
+        return "⚙️ جاري إنشاء التقرير..."
+    return f"⏳ التقرير في قائمة الانتظار — الترتيب {position}.\nسيتم إرساله فور جاهزيته."
+
+
+queue = ReportQueue()
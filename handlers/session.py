@@ -0,0 +1,157 @@
+"""Per-user session state stored in ``context.user_data``, and idle-session eviction."""
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from typing import Iterable
+
+from telegram import Update
+from telegram.ext import Application, CallbackContext, ExtBot
+
+import tenancy
+from config import SESSION_IDLE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class IdSet:
+    """A set of integer ids kept as a sorted array — 8 bytes per member."""
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self._ids = array("q", sorted(set(ids)))
+
+    def __contains__(self, item: int) -> bool:
+        i = bisect_left(self._ids, item)
+        return i < len(self._ids) and self._ids[i] == item
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, item: int) -> None:
+        i = bisect_left(self._ids, item)
+        if i == len(self._ids) or self._ids[i] != item:
+            self._ids.insert(i, item)
+
+    def discard(self, item: int) -> None:
+        i = bisect_left(self._ids, item)
+        if i < len(self._ids) and self._ids[i] == item:
+            del self._ids[i]
+
+
+class StudentMove:
+    """A batch student move in progress: the class picked from, the students
+    ticked so far and the teachers they can go to, loaded once for the whole flow."""
+
+    __slots__ = ("source_id", "roster", "teachers", "selected", "page", "matches")
+
+    def __init__(self, source_id: int, roster: list[dict], teachers: list[dict]):
+        self.source_id = source_id
+        self.roster = roster
+        self.teachers = teachers
+        self.selected = IdSet()
+        self.page = 0
+        # Search results being shown instead of the roster page, if any.
+        self.matches: list[dict] | None = None
+
+
+class Session:
+    """Everything the bot remembers about one user between updates."""
+
+    __slots__ = (
+        "school",
+        "teacher",
+        "bot_message_ids",
+        "attendance_date",
+        "present_ids",
+        "roster",
+        "report_teacher_id",
+        "new_teacher_name",
+        "new_teacher_telegram_id",
+        "pending_remove_teacher",
+        "pending_remove_student",
+        "pending_edit_student",
+        "pending_move",
+        "last_active",
+    )
+
+    def __init__(self):
+        self.school: str | None = None
+        self.teacher: dict | None = None
+        self.bot_message_ids: list[int] = []
+        self.attendance_date: str | None = None
+        self.present_ids: IdSet | None = None
+        self.roster: list[dict] | None = None
+        self.report_teacher_id: int | None = None
+        self.new_teacher_name: str | None = None
+        self.new_teacher_telegram_id: int | None = None
+        self.pending_remove_teacher: dict | None = None
+        self.pending_remove_student: dict | None = None
+        self.pending_edit_student: dict | None = None
+        self.pending_move: StudentMove | None = None
+        self.last_active = time.monotonic()
+
+    def start_attendance(
+        self, attendance_date: str, present_ids: Iterable[int], roster: list[dict] | None = None
+    ) -> None:
+        """Open an attendance round; ``roster`` is the class as loaded when it started."""
+        self.attendance_date = attendance_date
+        self.present_ids = IdSet(present_ids)
+        self.roster = roster
+
+    def end_attendance(self) -> None:
+        self.attendance_date = None
+        self.present_ids = None
+        self.roster = None
+
+
+SessionContext = CallbackContext[ExtBot, Session, dict, dict]
+
+
+async def touch_session(update: Update, context: SessionContext) -> None:
+    """Record activity and bind the school of the user behind every incoming update."""
+    user = update.effective_user
+    if not user:
+        tenancy.activate(tenancy.DEFAULT_SCHOOL)
+        return
+    session = context.user_data
+    session.last_active = time.monotonic()
+    if session.school is None:
+        session.school = await tenancy.school_of(user.id) or tenancy.DEFAULT_SCHOOL
+    tenancy.activate(session.school)
+
+
+async def evict_idle_sessions(context: SessionContext) -> None:
+    """Job: drop sessions idle for longer than SESSION_IDLE_TIMEOUT seconds."""
+    cutoff = time.monotonic() - SESSION_IDLE_TIMEOUT
+    idle = [
+        user_id for user_id, session in context.application.user_data.items()
+        if session.last_active < cutoff
+    ]
+    for user_id in idle:
+        context.application.drop_user_data(user_id)
+    if idle:
+        logger.info("Evicted %d idle sessions; %d remain.", len(idle), len(context.application.user_data))
+
+
+def forget_teacher(application: Application, telegram_user_id: int) -> None:
+    """Drop what a user's session cached about them as a teacher; the next lookup reloads it."""
+    session = application.user_data.get(telegram_user_id)
+    if session is not None:
+        session.teacher = None
+        session.school = None
+
+
+def forget_roster(application: Application, key: tuple[str, int]) -> None:
+    """Drop the class list a teacher's open attendance round holds after the class changed.
+
+    The round itself, with the marks made so far, stays open; the next tap reloads the list.
+    """
+    school, teacher_id = key
+    for session in application.user_data.values():
+        if session.school == school and session.teacher and session.teacher["id"] == teacher_id:
+            session.roster = None
@@ -1,7 +1,6 @@
 """Start command and main menu handler."""
 from telegram import Update
 from telegram.error import BadRequest
-from telegram.ext import ContextTypes
 
 import db
 from handlers.common import (
@@ -15,9 +14,10 @@ from handlers.common import (
     manage_students_keyboard,
     track_bot_message,
 )
+from handlers.session import SessionContext
 
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def start_command(update: Update, context: SessionContext):
     """Handle /start — authenticate teacher and show main menu."""
     telegram_user_id = update.effective_user.id
     teacher = await db.get_teacher_by_telegram_id(telegram_user_id)
@@ -39,7 +39,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         track_bot_message(context, msg.message_id)
         return
 
-    context.user_data["teacher"] = teacher
+    context.user_data.teacher = teacher
     is_admin = bool(teacher["is_admin"])
 
     msg = await context.bot.send_message(
@@ -50,7 +50,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     track_bot_message(context, msg.message_id)
 
 
-async def main_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def main_menu_callback(update: Update, context: SessionContext):
     """Handle main menu button presses."""
     query = update.callback_query
     try:
@@ -59,13 +59,13 @@ async def main_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         pass
     data = query.data
 
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     if not teacher:
         teacher = await db.get_teacher_by_telegram_id(update.effective_user.id)
         if not teacher:
             await query.edit_message_text("⛔ أنت غير مسجّل كمعلم.")
             return
-        context.user_data["teacher"] = teacher
+        context.user_data.teacher = teacher
 
     is_admin = bool(teacher["is_admin"])
 
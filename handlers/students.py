@@ -5,13 +5,14 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     CallbackQueryHandler,
     CommandHandler,
-    ContextTypes,
     ConversationHandler,
     MessageHandler,
     filters,
 )
 
 import db
+from config import CONVERSATION_TIMEOUT
+from handlers import removals
 from handlers.common import (
     CB_ADD_STUDENT,
     CB_CONFIRM_NO,
@@ -32,11 +33,63 @@ from handlers.common import (
     manage_students_keyboard,
     send_and_track,
 )
+from handlers.session import SessionContext, StudentMove
+
+# Classes larger than this are searched by typing a name instead of listed in full.
+MAX_LISTED_STUDENTS = 20
+SEARCH_RESULTS = 10
+
+
+def _student_buttons(students: list[dict], prefix: str) -> InlineKeyboardMarkup:
+    buttons = [
+        [InlineKeyboardButton(s["name"], callback_data=f"{prefix}{s['id']}")]
+        for s in students
+    ]
+    buttons.append([InlineKeyboardButton("🔙 إلغاء", callback_data=CB_MAIN_MENU)])
+    return InlineKeyboardMarkup(buttons)
+
+
+async def _show_student_picker(query, students: list[dict], prefix: str, title: str, prompt: str):
+    """List the class to pick from, or ask for a name to search when it is too long to list."""
+    if len(students) > MAX_LISTED_STUDENTS:
+        await query.edit_message_text(
+            f"{title}\n\nفي صفك {len(students)} طالباً. اكتب جزءاً من اسم الطالب للبحث:",
+            reply_markup=_student_buttons([], prefix),
+        )
+    else:
+        await query.edit_message_text(
+            f"{title}\n\n{prompt}\nأو اكتب جزءاً من اسمه للبحث:",
+            reply_markup=_student_buttons(students, prefix),
+        )
+
+
+async def _search_step(update: Update, context: SessionContext, prefix: str, state: int) -> int:
+    """Search the teacher's class for a typed name and list the matches to pick from."""
+    teacher = context.user_data.teacher
+    if not teacher:
+        await send_and_track(update, context, "⛔ انتهت الجلسة. يرجى كتابة /start من جديد.")
+        return ConversationHandler.END
+
+    text = update.message.text.strip()
+    matches = await db.search_students(text, teacher["id"], SEARCH_RESULTS)
+    if not matches:
+        await send_and_track(
+            update, context,
+            f"لا يوجد طالب في صفك يطابق '{text}'. اكتب اسماً آخر (أو /cancel للعودة):",
+            reply_markup=_student_buttons([], prefix),
+        )
+    else:
+        await send_and_track(
+            update, context,
+            f"🔍 نتائج البحث عن '{text}':",
+            reply_markup=_student_buttons(matches, prefix),
+        )
+    return state
 
 
 # ── Add Student ──────────────────────────────────────────────────────────────
 
-async def add_student_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def add_student_start(update: Update, context: SessionContext) -> int:
     """Prompt teacher to type the student's name."""
     query = update.callback_query
     await query.answer()
@@ -46,9 +99,9 @@ async def add_student_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return STATE_WAITING_STUDENT_NAME
 
 
-async def add_student_name_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def add_student_name_received(update: Update, context: SessionContext) -> int:
     """Save the new student."""
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     if not teacher:
         await send_and_track(update, context, "⛔ انتهت الجلسة. يرجى كتابة /start من جديد.")
         return ConversationHandler.END
@@ -84,17 +137,18 @@ def add_student_conversation() -> ConversationHandler:
                 CallbackQueryHandler(cancel_handler, pattern=f"^{CB_MAIN_MENU}$"),
             ],
             per_message=False,
+            conversation_timeout=CONVERSATION_TIMEOUT,
         )
 
 
 # ── Remove Student ───────────────────────────────────────────────────────────
 
-async def remove_student_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def remove_student_start(update: Update, context: SessionContext) -> int:
     """Show student list for removal."""
     query = update.callback_query
     await query.answer()
 
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     students = await db.get_students_by_teacher(teacher["id"])
 
     if not students:
@@ -104,20 +158,16 @@ async def remove_student_start(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return ConversationHandler.END
 
-    buttons = [
-        [InlineKeyboardButton(s["name"], callback_data=f"rmsel_{s['id']}")]
-        for s in students
-    ]
-    buttons.append([InlineKeyboardButton("🔙 إلغاء", callback_data=CB_MAIN_MENU)])
-
-    await query.edit_message_text(
-        "❌ حذف طالب\n\nاختر الطالب المراد حذفه:",
-        reply_markup=InlineKeyboardMarkup(buttons),
-    )
+    await _show_student_picker(query, students, "rmsel_", "❌ حذف طالب", "اختر الطالب المراد حذفه")
     return STATE_SELECT_STUDENT_TO_REMOVE
 
 
-async def remove_student_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def remove_student_search(update: Update, context: SessionContext) -> int:
+    """Search the class for the student to remove."""
+    return await _search_step(update, context, "rmsel_", STATE_SELECT_STUDENT_TO_REMOVE)
+
+
+async def remove_student_selected(update: Update, context: SessionContext) -> int:
     """Ask for confirmation before removing."""
     query = update.callback_query
     await query.answer()
@@ -128,7 +178,7 @@ async def remove_student_selected(update: Update, context: ContextTypes.DEFAULT_
         await query.edit_message_text("الطالب غير موجود.", reply_markup=manage_students_keyboard())
         return ConversationHandler.END
 
-    context.user_data["pending_remove_student"] = student
+    context.user_data.pending_remove_student = student
 
     buttons = [
         [
@@ -144,15 +194,16 @@ async def remove_student_selected(update: Update, context: ContextTypes.DEFAULT_
     return STATE_CONFIRM_REMOVE_STUDENT
 
 
-async def remove_student_confirmed(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def remove_student_confirmed(update: Update, context: SessionContext) -> int:
     """Process removal confirmation."""
     query = update.callback_query
     await query.answer()
 
     if query.data == CB_CONFIRM_YES:
-        student = context.user_data.pop("pending_remove_student", None)
+        student = context.user_data.pending_remove_student
+        context.user_data.pending_remove_student = None
         if student:
-            await db.remove_student(student["id"])
+            await removals.remove_student(student["id"])
             await query.edit_message_text(
                 f"✅ تم حذف الطالب '{student['name']}'.",
                 reply_markup=manage_students_keyboard(),
@@ -160,7 +211,7 @@ async def remove_student_confirmed(update: Update, context: ContextTypes.DEFAULT
         else:
             await query.edit_message_text("خطأ: فُقدت بيانات الطالب.", reply_markup=manage_students_keyboard())
     else:
-        context.user_data.pop("pending_remove_student", None)
+        context.user_data.pending_remove_student = None
         await query.edit_message_text(
             "تم إلغاء الحذف.",
             reply_markup=manage_students_keyboard(),
@@ -170,32 +221,36 @@ async def remove_student_confirmed(update: Update, context: ContextTypes.DEFAULT
 
 def remove_student_conversation() -> ConversationHandler:
     """Build ConversationHandler for removing a student."""
-    return ConversationHandler(
-        entry_points=[CallbackQueryHandler(remove_student_start, pattern=f"^{CB_REMOVE_STUDENT}$")],
-        states={
-            STATE_SELECT_STUDENT_TO_REMOVE: [
-                CallbackQueryHandler(remove_student_selected, pattern=r"^rmsel_\d+$"),
-            ],
-            STATE_CONFIRM_REMOVE_STUDENT: [
-                CallbackQueryHandler(remove_student_confirmed, pattern=f"^({CB_CONFIRM_YES}|{CB_CONFIRM_NO})$"),
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*per_message.*", category=UserWarning)
+        return ConversationHandler(
+            entry_points=[CallbackQueryHandler(remove_student_start, pattern=f"^{CB_REMOVE_STUDENT}$")],
+            states={
+                STATE_SELECT_STUDENT_TO_REMOVE: [
+                    CallbackQueryHandler(remove_student_selected, pattern=r"^rmsel_\d+$"),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, remove_student_search),
+                ],
+                STATE_CONFIRM_REMOVE_STUDENT: [
+                    CallbackQueryHandler(remove_student_confirmed, pattern=f"^({CB_CONFIRM_YES}|{CB_CONFIRM_NO})$"),
+                ],
+            },
+            fallbacks=[
+                CommandHandler("cancel", cancel_handler),
+                CallbackQueryHandler(cancel_handler, pattern=f"^{CB_MAIN_MENU}$"),
             ],
-        },
-        fallbacks=[
-            CommandHandler("cancel", cancel_handler),
-            CallbackQueryHandler(cancel_handler, pattern=f"^{CB_MAIN_MENU}$"),
-        ],
-        per_message=True,
-    )
+            per_message=False,
+            conversation_timeout=CONVERSATION_TIMEOUT,
+        )
 
 
 # ── Edit Student Name ────────────────────────────────────────────────────────
 
-async def edit_student_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def edit_student_start(update: Update, context: SessionContext) -> int:
     """Show student list for editing."""
     query = update.callback_query
     await query.answer()
 
-    teacher = context.user_data.get("teacher")
+    teacher = context.user_data.teacher
     students = await db.get_students_by_teacher(teacher["id"])
 
     if not students:
@@ -205,20 +260,16 @@ async def edit_student_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return ConversationHandler.END
 
-    buttons = [
-        [InlineKeyboardButton(s["name"], callback_data=f"edsel_{s['id']}")]
-        for s in students
-    ]
-    buttons.append([InlineKeyboardButton("🔙 إلغاء", callback_data=CB_MAIN_MENU)])
-
-    await query.edit_message_text(
-        "✏️ تعديل اسم طالب\n\nاختر الطالب لتغيير اسمه:",
-        reply_markup=InlineKeyboardMarkup(buttons),
-    )
+    await _show_student_picker(query, students, "edsel_", "✏️ تعديل اسم طالب", "اختر الطالب لتغيير اسمه")
     return STATE_SELECT_STUDENT_TO_EDIT
 
 
-async def edit_student_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def edit_student_search(update: Update, context: SessionContext) -> int:
+    """Search the class for the student to rename."""
+    return await _search_step(update, context, "edsel_", STATE_SELECT_STUDENT_TO_EDIT)
+
+
+async def edit_student_selected(update: Update, context: SessionContext) -> int:
     """Prompt for the new name."""
     query = update.callback_query
     await query.answer()
@@ -229,21 +280,22 @@ async def edit_student_selected(update: Update, context: ContextTypes.DEFAULT_TY
         await query.edit_message_text("الطالب غير موجود.", reply_markup=manage_students_keyboard())
         return ConversationHandler.END
 
-    context.user_data["pending_edit_student"] = student
+    context.user_data.pending_edit_student = student
     await query.edit_message_text(
         f"الاسم الحالي: {student['name']}\n\nاكتب الاسم الجديد (أو /cancel للإلغاء):"
     )
     return STATE_WAITING_NEW_NAME
 
 
-async def edit_student_new_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def edit_student_new_name(update: Update, context: SessionContext) -> int:
     """Save the new name."""
     new_name = update.message.text.strip()
     if not new_name:
         await send_and_track(update, context, "الاسم لا يمكن أن يكون فارغاً. اكتب اسماً صحيحاً:")
         return STATE_WAITING_NEW_NAME
 
-    student = context.user_data.pop("pending_edit_student", None)
+    student = context.user_data.pending_edit_student
+    context.user_data.pending_edit_student = None
     if not student:
         await send_and_track(update, context, "خطأ: فُقدت بيانات الطالب.", reply_markup=manage_students_keyboard())
         return ConversationHandler.END
@@ -266,6 +318,7 @@ def edit_student_conversation() -> ConversationHandler:
             states={
                 STATE_SELECT_STUDENT_TO_EDIT: [
                     CallbackQueryHandler(edit_student_selected, pattern=r"^edsel_\d+$"),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, edit_student_search),
                 ],
                 STATE_WAITING_NEW_NAME: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, edit_student_new_name),
@@ -276,115 +329,271 @@ def edit_student_conversation() -> ConversationHandler:
                 CallbackQueryHandler(cancel_handler, pattern=f"^{CB_MAIN_MENU}$"),
             ],
             per_message=False,
+            conversation_timeout=CONVERSATION_TIMEOUT,
         )
 
 
-# ── Move Student ─────────────────────────────────────────────────────────────
+# ── Move Students ────────────────────────────────────────────────────────────
+#
+# Students are ticked on a keyboard, a page of the class at a time (or from
+# search results), and moved together once the target class is picked. The
+# class and the teacher list are loaded once when the flow starts and kept in
+# ``Session.pending_move``; ticking and paging only redraw the keyboard.
 
-async def move_student_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show student list for moving."""
-    query = update.callback_query
-    await query.answer()
+def _move_view(move: StudentMove) -> list[dict]:
+    """The students the keyboard shows: the search results, or the current page of the class."""
+    if move.matches is not None:
+        return move.matches
+    start = move.page * MAX_LISTED_STUDENTS
+    return move.roster[start : start + MAX_LISTED_STUDENTS]
 
-    teacher = context.user_data.get("teacher")
-    students = await db.get_students_by_teacher(teacher["id"])
 
-    if not students:
+def _move_keyboard(move: StudentMove) -> InlineKeyboardMarkup:
+    shown = _move_view(move)
+    buttons = [
+        [InlineKeyboardButton(f"{'✅' if s['id'] in move.selected else '⬜'} {s['name']}", callback_data=f"mvsel_{s['id']}")]
+        for s in shown
+    ]
+    if shown:
+        all_selected = all(s["id"] in move.selected for s in shown)
+        buttons.append([InlineKeyboardButton(
+            "⬜ إلغاء تحديد الكل" if all_selected else "☑️ تحديد الكل", callback_data="mvall"
+        )])
+    pages = -(-len(move.roster) // MAX_LISTED_STUDENTS)
+    if move.matches is not None:
+        buttons.append([InlineKeyboardButton("📋 كل الطلاب", callback_data=f"mvpg_{move.page}")])
+    elif pages > 1:
+        row = []
+        if move.page > 0:
+            row.append(InlineKeyboardButton("◀️ السابق", callback_data=f"mvpg_{move.page - 1}"))
+        if move.page < pages - 1:
+            row.append(InlineKeyboardButton("التالي ▶️", callback_data=f"mvpg_{move.page + 1}"))
+        buttons.append(row)
+    buttons.append([InlineKeyboardButton(f"➡️ متابعة ({len(move.selected)})", callback_data="mvnext")])
+    buttons.append([InlineKeyboardButton("🔙 إلغاء", callback_data=CB_MAIN_MENU)])
+    return InlineKeyboardMarkup(buttons)
+
+
+def _move_text(move: StudentMove) -> str:
+    source = next((t["name"] for t in move.teachers if t["id"] == move.source_id), "")
+    text = (
+        f"🔄 نقل طلاب من صف {source}\n\n"
+        f"اختر الطلاب المراد نقلهم ثم اضغط «متابعة»، أو اكتب جزءاً من اسم طالب للبحث.\n"
+        f"المحدَّدون: {len(move.selected)} من {len(move.roster)}"
+    )
+    pages = -(-len(move.roster) // MAX_LISTED_STUDENTS)
+    if move.matches is None and pages > 1:
+        text += f" — الصفحة {move.page + 1}/{pages}"
+    return text
+
+
+async def _begin_move(query, context: SessionContext, source_id: int, teachers: list[dict]) -> int:
+    roster = await db.get_students_by_teacher(source_id)
+    if not roster:
+        await query.edit_message_text("لا يوجد طلاب لنقلهم.", reply_markup=manage_students_keyboard())
+        return ConversationHandler.END
+    if not any(t["id"] != source_id for t in teachers):
         await query.edit_message_text(
-            "لا يوجد طلاب لنقلهم.",
+            "لا يوجد معلمون آخرون لنقل الطلاب إليهم.",
             reply_markup=manage_students_keyboard(),
         )
         return ConversationHandler.END
 
+    move = context.user_data.pending_move = StudentMove(source_id, roster, teachers)
+    await query.edit_message_text(_move_text(move), reply_markup=_move_keyboard(move))
+    return STATE_SELECT_STUDENT_TO_MOVE
+
+
+async def _lost_move(query) -> int:
+    await query.edit_message_text("خطأ: فُقدت بيانات النقل.", reply_markup=manage_students_keyboard())
+    return ConversationHandler.END
+
+
+async def move_student_start(update: Update, context: SessionContext) -> int:
+    """Start a move: admins pick the class to move from, teachers move from their own."""
+    query = update.callback_query
+    await query.answer()
+
+    teacher = context.user_data.teacher
+    teachers = await db.get_all_teachers()
+    if not teacher["is_admin"]:
+        return await _begin_move(query, context, teacher["id"], teachers)
+
     buttons = [
-        [InlineKeyboardButton(s["name"], callback_data=f"mvsel_{s['id']}")]
-        for s in students
+        [InlineKeyboardButton(
+            f"{t['name']} {'(صفك)' if t['id'] == teacher['id'] else ''}", callback_data=f"mvfrom_{t['id']}"
+        )]
+        for t in teachers
     ]
     buttons.append([InlineKeyboardButton("🔙 إلغاء", callback_data=CB_MAIN_MENU)])
-
+    context.user_data.pending_move = StudentMove(teacher["id"], [], teachers)
     await query.edit_message_text(
-        "🔄 نقل طالب\n\nاختر الطالب لنقله إلى صف آخر:",
+        "🔄 نقل طلاب\n\nاختر الصف المراد النقل منه:",
         reply_markup=InlineKeyboardMarkup(buttons),
     )
     return STATE_SELECT_STUDENT_TO_MOVE
 
 
-async def move_student_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show list of other teachers to move the student to."""
+async def move_source_selected(update: Update, context: SessionContext) -> int:
+    """Admin picked the class to move students from."""
     query = update.callback_query
     await query.answer()
 
-    student_id = int(query.data.replace("mvsel_", ""))
-    student = await db.get_student_by_id(student_id)
-    if not student:
-        await query.edit_message_text("الطالب غير موجود.", reply_markup=manage_students_keyboard())
-        return ConversationHandler.END
+    move = context.user_data.pending_move
+    if move is None:
+        return await _lost_move(query)
+    return await _begin_move(query, context, int(query.data.replace("mvfrom_", "")), move.teachers)
 
-    context.user_data["pending_move_student"] = student
 
-    teacher = context.user_data.get("teacher")
-    all_teachers = await db.get_all_teachers()
-    other_teachers = [t for t in all_teachers if t["id"] != teacher["id"]]
+async def move_student_search(update: Update, context: SessionContext) -> int:
+    """Search the class for students to tick."""
+    move = context.user_data.pending_move
+    if move is None:
+        await send_and_track(update, context, "⛔ انتهت الجلسة. يرجى كتابة /start من جديد.")
+        return ConversationHandler.END
 
-    if not other_teachers:
-        await query.edit_message_text(
-            "لا يوجد معلمون آخرون لنقل هذا الطالب إليهم.",
-            reply_markup=manage_students_keyboard(),
+    text = update.message.text.strip()
+    matches = await db.search_students(text, move.source_id, SEARCH_RESULTS)
+    if not matches:
+        await send_and_track(
+            update, context,
+            f"لا يوجد طالب في الصف يطابق '{text}'. اكتب اسماً آخر (أو /cancel للعودة):",
+            reply_markup=_move_keyboard(move),
         )
-        return ConversationHandler.END
+    else:
+        move.matches = matches
+        await send_and_track(
+            update, context,
+            f"🔍 نتائج البحث عن '{text}':\n\n{_move_text(move)}",
+            reply_markup=_move_keyboard(move),
+        )
+    return STATE_SELECT_STUDENT_TO_MOVE
+
+
+async def move_student_toggled(update: Update, context: SessionContext) -> int:
+    """Tick or untick one student."""
+    query = update.callback_query
+    await query.answer()
+
+    move = context.user_data.pending_move
+    if move is None:
+        return await _lost_move(query)
+    student_id = int(query.data.replace("mvsel_", ""))
+    if student_id in move.selected:
+        move.selected.discard(student_id)
+    else:
+        move.selected.add(student_id)
+    await query.edit_message_text(_move_text(move), reply_markup=_move_keyboard(move))
+    return STATE_SELECT_STUDENT_TO_MOVE
+
+
+async def move_page_toggled(update: Update, context: SessionContext) -> int:
+    """Tick every student shown, or untick them all when they already are."""
+    query = update.callback_query
+    await query.answer()
+
+    move = context.user_data.pending_move
+    if move is None:
+        return await _lost_move(query)
+    shown = [s["id"] for s in _move_view(move)]
+    if all(student_id in move.selected for student_id in shown):
+        for student_id in shown:
+            move.selected.discard(student_id)
+    else:
+        for student_id in shown:
+            move.selected.add(student_id)
+    await query.edit_message_text(_move_text(move), reply_markup=_move_keyboard(move))
+    return STATE_SELECT_STUDENT_TO_MOVE
+
+
+async def move_page_selected(update: Update, context: SessionContext) -> int:
+    """Show a page of the class, leaving search results or the target list."""
+    query = update.callback_query
+    await query.answer()
+
+    move = context.user_data.pending_move
+    if move is None:
+        return await _lost_move(query)
+    move.page = int(query.data.replace("mvpg_", ""))
+    move.matches = None
+    await query.edit_message_text(_move_text(move), reply_markup=_move_keyboard(move))
+    return STATE_SELECT_STUDENT_TO_MOVE
+
+
+async def move_students_chosen(update: Update, context: SessionContext) -> int:
+    """Show the other teachers to move the ticked students to."""
+    query = update.callback_query
+    move = context.user_data.pending_move
+    if move is None:
+        await query.answer()
+        return await _lost_move(query)
+    if not move.selected:
+        await query.answer("اختر طالباً واحداً على الأقل.", show_alert=True)
+        return STATE_SELECT_STUDENT_TO_MOVE
+    await query.answer()
 
     buttons = [
         [InlineKeyboardButton(t["name"], callback_data=f"mvto_{t['id']}")]
-        for t in other_teachers
+        for t in move.teachers
+        if t["id"] != move.source_id
     ]
+    buttons.append([InlineKeyboardButton("🔙 تعديل الاختيار", callback_data=f"mvpg_{move.page}")])
     buttons.append([InlineKeyboardButton("🔙 إلغاء", callback_data=CB_MAIN_MENU)])
-
     await query.edit_message_text(
-        f"نقل '{student['name']}'\n\nاختر صف المعلم المراد النقل إليه:",
+        f"نقل {len(move.selected)} طالباً\n\nاختر صف المعلم المراد النقل إليه:",
         reply_markup=InlineKeyboardMarkup(buttons),
     )
     return STATE_SELECT_TARGET_TEACHER
 
 
-async def move_student_target_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Move the student to the selected teacher."""
+async def move_student_target_selected(update: Update, context: SessionContext) -> int:
+    """Move the ticked students to the selected teacher in one transaction."""
     query = update.callback_query
     await query.answer()
 
-    target_teacher_id = int(query.data.replace("mvto_", ""))
-    student = context.user_data.pop("pending_move_student", None)
+    move = context.user_data.pending_move
+    context.user_data.pending_move = None
+    if move is None:
+        return await _lost_move(query)
 
-    if not student:
-        await query.edit_message_text("خطأ: فُقدت بيانات الطالب.", reply_markup=manage_students_keyboard())
-        return ConversationHandler.END
-
-    all_teachers = await db.get_all_teachers()
-    target_teacher = next((t for t in all_teachers if t["id"] == target_teacher_id), None)
+    target_teacher_id = int(query.data.replace("mvto_", ""))
+    target_teacher = next((t for t in move.teachers if t["id"] == target_teacher_id), None)
     target_name = target_teacher["name"] if target_teacher else "Unknown"
 
-    await db.move_student(student["id"], target_teacher_id)
-    await query.edit_message_text(
-        f"✅ تم نقل الطالب '{student['name']}' إلى صف {target_name}.",
-        reply_markup=manage_students_keyboard(),
-    )
+    moved = await db.move_students(list(move.selected), target_teacher_id)
+    if len(moved) == 1:
+        name = next((s["name"] for s in move.roster if s["id"] in moved), "")
+        text = f"✅ تم نقل الطالب '{name}' إلى صف {target_name}."
+    else:
+        text = f"✅ تم نقل {len(moved)} طالباً إلى صف {target_name}."
+    await query.edit_message_text(text, reply_markup=manage_students_keyboard())
     return ConversationHandler.END
 
 
 def move_student_conversation() -> ConversationHandler:
-    """Build ConversationHandler for moving a student."""
-    return ConversationHandler(
-        entry_points=[CallbackQueryHandler(move_student_start, pattern=f"^{CB_MOVE_STUDENT}$")],
-        states={
-            STATE_SELECT_STUDENT_TO_MOVE: [
-                CallbackQueryHandler(move_student_selected, pattern=r"^mvsel_\d+$"),
-            ],
-            STATE_SELECT_TARGET_TEACHER: [
-                CallbackQueryHandler(move_student_target_selected, pattern=r"^mvto_\d+$"),
+    """Build ConversationHandler for moving students."""
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*per_message.*", category=UserWarning)
+        return ConversationHandler(
+            entry_points=[CallbackQueryHandler(move_student_start, pattern=f"^{CB_MOVE_STUDENT}$")],
+            states={
+                STATE_SELECT_STUDENT_TO_MOVE: [
+                    CallbackQueryHandler(move_source_selected, pattern=r"^mvfrom_\d+$"),
+                    CallbackQueryHandler(move_student_toggled, pattern=r"^mvsel_\d+$"),
+                    CallbackQueryHandler(move_page_toggled, pattern=r"^mvall$"),
+                    CallbackQueryHandler(move_page_selected, pattern=r"^mvpg_\d+$"),
+                    CallbackQueryHandler(move_students_chosen, pattern=r"^mvnext$"),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, move_student_search),
+                ],
+                STATE_SELECT_TARGET_TEACHER: [
+                    CallbackQueryHandler(move_student_target_selected, pattern=r"^mvto_\d+$"),
+                    CallbackQueryHandler(move_page_selected, pattern=r"^mvpg_\d+$"),
+                ],
+            },
+            fallbacks=[
+                CommandHandler("cancel", cancel_handler),
+                CallbackQueryHandler(cancel_handler, pattern=f"^{CB_MAIN_MENU}$"),
             ],
-        },
-        fallbacks=[
-            CommandHandler("cancel", cancel_handler),
-            CallbackQueryHandler(cancel_handler, pattern=f"^{CB_MAIN_MENU}$"),
-        ],
-        per_message=True,
-    )
+            per_message=False,
+            conversation_timeout=CONVERSATION_TIMEOUT,
+        )
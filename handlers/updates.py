@@ -0,0 +1,72 @@
+"""Update processing: different users' updates run concurrently, each user's in order.
+
+ConversationHandler relies on a user's updates being handled one by one, so
+they are serialized per user; updates of other users do not wait for them. This
+lets the database writes of many teachers meet in one group commit (see
+``shards``) instead of queuing behind each other's whole handler.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import Application, BaseHandler, BaseUpdateProcessor, ConversationHandler
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process up to ``max_concurrent_updates`` updates at once, one per user at a time."""
+
+    __slots__ = ("_locks",)
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # User id → (lock, number of updates holding or waiting for it).
+        self._locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            await coroutine
+            return
+        lock, users = self._locks.get(user.id, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._locks[user.id] = (lock, users + 1)
+        try:
+            async with lock:
+                await coroutine
+        finally:
+            lock, users = self._locks[user.id]
+            if users == 1:
+                del self._locks[user.id]
+            else:
+                self._locks[user.id] = (lock, users - 1)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+def _handlers(handler: BaseHandler):
+    """Yield ``handler``, or for a conversation every handler it dispatches to."""
+    if isinstance(handler, ConversationHandler):
+        for child in handler.entry_points:
+            yield from _handlers(child)
+        for state in handler.states.values():
+            for child in state:
+                yield from _handlers(child)
+        for child in handler.fallbacks:
+            yield from _handlers(child)
+    else:
+        yield handler
+
+
+def wrap_callbacks(application: Application, wrap: Callable[[Callable], Callable]) -> None:
+    """Replace every handler callback in groups 0 and up (after session bookkeeping),
+    including those inside conversations, with ``wrap(callback)``."""
+    for group, handlers in application.handlers.items():
+        if group < 0:
+            continue
+        for handler in handlers:
+            for child in _handlers(handler):
+                child.callback = wrap(child.callback)
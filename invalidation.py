@@ -0,0 +1,47 @@
+"""Cache-invalidation events shared between bot processes.
+
+Code that changes data other users may have cached calls ``publish(kind, key)``.
+Handlers subscribed to ``kind`` run in this process right away, and, in worker
+mode (see ``workers.py``), the event is relayed to every other worker, where
+``deliver`` runs their handlers. In a single process publishing is just a call.
+"""
+import logging
+from collections import defaultdict
+from typing import Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+# A teacher was added, removed or changed; the key is their Telegram user id.
+TEACHER = "teacher"
+# Students were added to, removed from or renamed in a class; the key is
+# (school, teacher id), since teacher ids are per school shard.
+ROSTER = "roster"
+
+_handlers: dict[str, list[Callable[[Hashable], None]]] = defaultdict(list)
+_relay: Callable[[str, Hashable], None] | None = None
+
+
+def subscribe(kind: str, handler: Callable[[Hashable], None]) -> None:
+    _handlers[kind].append(handler)
+
+
+def set_relay(relay: Callable[[str, Hashable], None] | None) -> None:
+    """Forward every published event to ``relay`` as well (set by worker processes)."""
+    global _relay
+    _relay = relay
+
+
+def deliver(kind: str, key: Hashable) -> None:
+    """Run this process's handlers for an event."""
+    for handler in _handlers.get(kind, ()):
+        try:
+            handler(key)
+        except Exception:
+            logger.exception("Invalidation handler for %s %r failed", kind, key)
+
+
+def publish(kind: str, key: Hashable) -> None:
+    """Invalidate ``key`` of ``kind`` here and in every other worker."""
+    deliver(kind, key)
+    if _relay is not None:
+        _relay(kind, key)
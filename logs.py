@@ -0,0 +1,217 @@
+"""Structured logging through a queue, so log I/O never runs on the event loop.
+
+``setup`` puts a single ``QueueHandler`` on the root logger. It only stamps each
+record with the fields bound to the current update and enqueues it. A
+``QueueListener`` thread formats the records, as JSON lines or plain text
+(LOG_FORMAT), and writes them to stderr. Records below WARNING from the loggers
+in LOG_SAMPLE_RATES are kept at that rate before they are queued, so a burst of
+toggles costs a random draw per update rather than a line each.
+
+``instrument`` wraps every handler callback of an application. The wrapper binds
+``update_id``, ``user_id``, ``teacher_id``, ``school`` and ``handler`` for
+everything logged while the callback runs. When the callback returns, it logs the
+handled update by the logger ``updates.<handler>`` with its ``duration_ms``.
+"""
+import atexit
+import copy
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATES
+from handlers.updates import wrap_callbacks
+
+# Fields bound to what is being handled, added to every record logged meanwhile.
+_fields: ContextVar[dict] = ContextVar("log_fields", default={})
+
+# Attributes every LogRecord has; anything else on a record is a structured field.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+@contextmanager
+def bind(**fields):
+    """Add ``fields`` to every record logged inside the block (and the tasks it starts)."""
+    token = _fields.set({**_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _fields.reset(token)
+
+
+def _extra(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_extra(record),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The usual one-line format, with structured fields appended as key=value."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in _extra(record).items())
+        if not fields:
+            return text
+        line, newline, rest = text.partition("\n")
+        return f"{line} [{fields}]{newline}{rest}"
+
+
+class _SamplingFilter(logging.Filter):
+    """Keep records below WARNING of sampled loggers at their configured rate."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self._rates = rates
+        # Logger name → the rate of its nearest configured ancestor (1.0 if none).
+        self._resolved: dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            parent = name
+            while parent not in self._rates and "." in parent:
+                parent = parent.rpartition(".")[0]
+            rate = self._resolved[name] = self._rates.get(parent, 1.0)
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """Stamp records with the bound fields and render their message before queuing.
+
+    The listener thread formats records later, so everything that depends on the
+    update being handled, or on objects that may change meanwhile, is captured here.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        for key, value in _fields.get().items():
+            record.__dict__.setdefault(key, value)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _ProcessFilter(logging.Filter):
+    def __init__(self, process: str):
+        super().__init__()
+        self._process = process
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.process_name = self._process
+        return True
+
+
+def setup(level: int | str = LOG_LEVEL, process: str | None = None) -> None:
+    """Route all logging through the queue; ``process`` names this process in every record."""
+    global _listener
+    if _listener is not None:
+        return
+    if LOG_FORMAT == "text":
+        prefix = f"{process} - " if process else ""
+        formatter = TextFormatter(f"%(asctime)s - {prefix}%(name)s - %(levelname)s - %(message)s")
+    else:
+        formatter = JsonFormatter()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(formatter)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _ContextQueueHandler(records)
+    handler.addFilter(_SamplingFilter(LOG_SAMPLE_RATES))
+    if process and LOG_FORMAT != "text":
+        handler.addFilter(_ProcessFilter(process))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop)
+
+
+def stop() -> None:
+    """Write out the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def update_fields(update: object, context) -> dict:
+    """Return the update id, user, school and teacher of an update being handled."""
+    fields = {}
+    if isinstance(update, Update):
+        fields["update_id"] = update.update_id
+        if update.effective_user:
+            fields["user_id"] = update.effective_user.id
+    session = getattr(context, "user_data", None)
+    if session is not None:
+        if session.school is not None:
+            fields["school"] = session.school
+        if session.teacher:
+            fields["teacher_id"] = session.teacher["id"]
+    return fields
+
+
+def _logged(callback):
+    name = callback.__name__
+    handled = logging.getLogger(f"updates.{name}")
+
+    @functools.wraps(callback)
+    async def handle(update, context):
+        with bind(handler=name, **update_fields(update, context)):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                handled.info(
+                    "Handled %s", name, extra={"duration_ms": round((time.perf_counter() - started) * 1000, 2)}
+                )
+
+    return handle
+
+
+def instrument(application: Application) -> None:
+    """Wrap every handler callback of ``application`` to bind the update's fields and
+    log the handled update."""
+    wrap_callbacks(application, _logged)
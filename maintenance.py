@@ -0,0 +1,233 @@
+"""Database maintenance — online backups, statistics refresh, incremental vacuum and WAL checkpoint.
+
+Runs daily from the JobQueue, on demand through /maintenance, or from the shell:
+
+    python maintenance.py                # backup + ANALYZE + incremental vacuum + WAL checkpoint
+    python maintenance.py --convert      # one-off switch to auto_vacuum=INCREMENTAL (bot stopped)
+    python maintenance.py --school north
+
+Each run works on the current school's shard and its own backup directory.
+"""
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import aiosqlite
+
+import tenancy
+from config import (
+    BACKUP_DIR,
+    BACKUP_KEEP,
+    MAINTENANCE_STEP_PAGES,
+    MAINTENANCE_STEP_SLEEP,
+    SQLITE_BUSY_TIMEOUT_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+# One lock per school: a run for one school never waits on another's.
+_locks: dict[str, asyncio.Lock] = {}
+
+
+@dataclass
+class MaintenanceReport:
+    """What one maintenance run did and how long each step took."""
+
+    backup_path: str | None = None
+    backup_bytes: int = 0
+    backup_steps: int = 0
+    backup_s: float = 0.0
+    removed_backups: list[str] = field(default_factory=list)
+    analyze_s: float = 0.0
+    vacuum_pages: int = 0
+    vacuum_s: float = 0.0
+    checkpoint_pages: int = 0
+    checkpoint_s: float = 0.0
+    total_s: float = 0.0
+    notes: list[str] = field(default_factory=list)
+
+
+def _lock() -> asyncio.Lock:
+    return _locks.setdefault(tenancy.current(), asyncio.Lock())
+
+
+def is_running() -> bool:
+    """Return True while maintenance runs for the current school."""
+    return _lock().locked()
+
+
+async def run_maintenance() -> MaintenanceReport:
+    """Back up, rotate old backups, refresh statistics and vacuum, one step after another."""
+    async with _lock():
+        report = MaintenanceReport()
+        started = time.perf_counter()
+        await _backup(report)
+        _rotate_backups(report)
+        await _analyze(report)
+        await _incremental_vacuum(report)
+        await _checkpoint(report)
+        report.total_s = time.perf_counter() - started
+        logger.info(
+            "Maintenance done in %.2f s: backup %.2f s (%d bytes, %d steps), analyze %.2f s, "
+            "vacuum %.2f s (%d pages), checkpoint %.2f s (%d pages), removed %d old backups.",
+            report.total_s, report.backup_s, report.backup_bytes, report.backup_steps,
+            report.analyze_s, report.vacuum_s, report.vacuum_pages,
+            report.checkpoint_s, report.checkpoint_pages, len(report.removed_backups),
+        )
+        return report
+
+
+@asynccontextmanager
+async def _connect():
+    """Open the current shard, waiting for the bot's writes instead of failing with SQLITE_BUSY."""
+    async with aiosqlite.connect(tenancy.shard_path()) as conn:
+        await conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        yield conn
+
+
+def _backup_dir() -> str:
+    return tenancy.scoped_dir(BACKUP_DIR)
+
+
+def _backup_prefix() -> str:
+    return os.path.splitext(os.path.basename(tenancy.shard_path()))[0]
+
+
+async def _backup(report: MaintenanceReport) -> None:
+    """Copy the live database with SQLite's online backup API.
+
+    The copy proceeds MAINTENANCE_STEP_PAGES pages at a time and sleeps between
+    steps, releasing the source lock so writers get in. It runs on the
+    connection's own thread, so the event loop is never blocked either.
+    """
+    os.makedirs(_backup_dir(), exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(_backup_dir(), f"{_backup_prefix()}-{stamp}.db")
+    partial = f"{path}.part"
+
+    def progress(status, remaining, total):
+        report.backup_steps += 1
+
+    started = time.perf_counter()
+    target = sqlite3.connect(partial, check_same_thread=False)
+    try:
+        async with _connect() as source:
+            await source.backup(
+                target, pages=MAINTENANCE_STEP_PAGES, progress=progress, sleep=MAINTENANCE_STEP_SLEEP
+            )
+    except BaseException:
+        target.close()
+        os.remove(partial)
+        raise
+    target.close()
+    os.replace(partial, path)
+    report.backup_s = time.perf_counter() - started
+    report.backup_path = path
+    report.backup_bytes = os.path.getsize(path)
+
+
+def _rotate_backups(report: MaintenanceReport) -> None:
+    """Keep only the newest BACKUP_KEEP backups (0 keeps them all)."""
+    if BACKUP_KEEP <= 0:
+        return
+    backups = sorted(glob.glob(os.path.join(_backup_dir(), f"{_backup_prefix()}-*.db")))
+    for path in backups[:-BACKUP_KEEP]:
+        os.remove(path)
+        report.removed_backups.append(path)
+
+
+async def _analyze(report: MaintenanceReport) -> None:
+    """Refresh the query planner's statistics."""
+    started = time.perf_counter()
+    async with _connect() as conn:
+        # Bound the rows ANALYZE samples per index so it stays quick on big tables.
+        await conn.execute("PRAGMA analysis_limit = 1000")
+        await conn.execute("ANALYZE")
+        await conn.execute("PRAGMA optimize")
+        await conn.commit()
+    report.analyze_s = time.perf_counter() - started
+
+
+async def _incremental_vacuum(report: MaintenanceReport) -> None:
+    """Return free pages to the filesystem in short transactions."""
+    started = time.perf_counter()
+    async with _connect() as conn:
+        async with conn.execute("PRAGMA auto_vacuum") as cursor:
+            mode = (await cursor.fetchone())[0]
+        if mode != AUTO_VACUUM_INCREMENTAL:
+            report.notes.append(
+                "auto_vacuum is not INCREMENTAL; run `python maintenance.py --convert` once with the bot stopped."
+            )
+            return
+
+        initial = previous = None
+        while True:
+            async with conn.execute("PRAGMA freelist_count") as cursor:
+                free = (await cursor.fetchone())[0]
+            initial = free if initial is None else initial
+            report.vacuum_pages = initial - free
+            if free == 0 or free == previous:
+                break
+            # incremental_vacuum frees one page per result row, so the rows must be drained.
+            async with conn.execute(f"PRAGMA incremental_vacuum({MAINTENANCE_STEP_PAGES})") as cursor:
+                await cursor.fetchall()
+            await conn.commit()
+            previous = free
+            await asyncio.sleep(MAINTENANCE_STEP_SLEEP)
+    report.vacuum_s = time.perf_counter() - started
+
+
+async def _checkpoint(report: MaintenanceReport) -> None:
+    """Copy the whole WAL into the database and truncate it.
+
+    Commits checkpoint automatically every SQLITE_WAL_AUTOCHECKPOINT pages, but
+    those checkpoints stop at the oldest open read snapshot and leave the file
+    at its largest size. This waits, up to the busy timeout, for quiet and resets
+    it.
+    """
+    started = time.perf_counter()
+    async with _connect() as conn:
+        async with conn.execute("PRAGMA wal_checkpoint(TRUNCATE)") as cursor:
+            busy, _, checkpointed = await cursor.fetchone()
+    if busy:
+        report.notes.append("WAL checkpoint was blocked by open readers or writers; it is retried on the next run.")
+    report.checkpoint_pages = max(checkpointed, 0)
+    report.checkpoint_s = time.perf_counter() - started
+
+
+def convert_to_incremental_vacuum() -> None:
+    """Switch an existing database to auto_vacuum=INCREMENTAL.
+
+    Needs a full VACUUM, which locks the database for its whole duration, so run
+    it with the bot stopped.
+    """
+    conn = sqlite3.connect(tenancy.shard_path())
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="صيانة قاعدة البيانات.")
+    parser.add_argument("--convert", action="store_true", help="تحويل القاعدة إلى auto_vacuum=INCREMENTAL")
+    parser.add_argument("--school", default=tenancy.DEFAULT_SCHOOL, help="معرّف المدرسة")
+    args = parser.parse_args()
+    tenancy.activate(args.school)
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    if args.convert:
+        convert_to_incremental_vacuum()
+        print("تم تحويل قاعدة البيانات إلى auto_vacuum=INCREMENTAL.")
+    else:
+        result = asyncio.run(run_maintenance())
+        print(result)
@@ -0,0 +1,234 @@
+"""On-demand sampling profiler for the running bot (see ``/profile``).
+
+A background thread records the Python stack of every other thread every
+PROFILE_INTERVAL_MS milliseconds for the requested window. This includes the
+event loop with the handlers and the ``db`` calls, and the worker threads where
+reports are built (``report.py`` runs in ``asyncio.to_thread``). A thread whose
+innermost frame is a blocking call of a function threads wait for work in (the
+selector's poll, ``Condition.wait``, the queue ``get`` of a thread-pool worker or
+an aiosqlite connection, a log listener's dequeue) is waiting, like the idle
+loop or a database thread between queries. Its samples are counted as idle and
+left out. Functions are matched by code object, so a busy thread on a line that
+happens to call ``dict.get`` still counts as working.
+
+The sampler only sees a thread once that thread hands over the GIL. The loop
+hands it over whenever it polls for I/O, so with the default 5 ms switch interval
+short bursts of handler code would be hidden behind ``select``. During a window
+the switch interval is lowered to 0.1 ms, so a busy thread yields the GIL where
+it actually is. Outside a window nothing runs and nothing is changed.
+
+The result is a hot-function table (samples where the function was running,
+and samples where it was on the stack) and the stacks in the collapsed format
+read by flamegraph.pl, speedscope and similar tools.
+"""
+import asyncio
+import concurrent.futures.thread
+import dis
+import functools
+import logging.handlers
+import os
+import selectors
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+import aiosqlite.core
+
+from config import PROFILE_INTERVAL_MS
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds a thread may hold the GIL while the sampler waits for it, during a window.
+_SWITCH_INTERVAL = 0.0001
+
+# Functions threads wait for work in, with the calls in them that block (None: all of it).
+_WAITING_IN = [
+    (threading.Condition.wait, None),
+    (getattr(threading.Thread, "_wait_for_tstate_lock", None), None),
+    (logging.handlers.QueueListener.dequeue, None),
+    (concurrent.futures.thread._worker, {"get"}),
+    (aiosqlite.core.Connection.run, {"get"}),
+] + [
+    (getattr(selectors, name).select, {"select", "_select", "poll", "control"})
+    for name in ("SelectSelector", "PollSelector", "EpollSelector", "DevpollSelector", "KqueueSelector")
+    if hasattr(selectors, name)
+]
+
+_running: "_Sampler | None" = None
+
+
+def _call_lines(code, names: set[str]) -> frozenset[int]:
+    """Lines of ``code`` taken up by a call of a method or attribute named in ``names``."""
+    lines = set()
+    calling = False
+    for instruction in dis.get_instructions(code):
+        if instruction.opname in ("LOAD_METHOD", "LOAD_ATTR") and instruction.argval in names:
+            calling = True
+        if calling:
+            lines.add(instruction.positions.lineno)
+            calling = instruction.opname != "CALL"
+    return frozenset(lines - {None})
+
+
+@functools.cache
+def _waiting_calls() -> dict:
+    """Code object → the lines where a thread in it is waiting (None: every line)."""
+    return {
+        function.__code__: None if names is None else _call_lines(function.__code__, names)
+        for function, names in _WAITING_IN
+        if function is not None
+    }
+
+
+def _location(path: str) -> str:
+    if path.startswith(_ROOT + os.sep):
+        return os.path.relpath(path, _ROOT)
+    _, site, package_path = path.rpartition("site-packages" + os.sep)
+    return package_path if site else os.path.basename(path)
+
+
+class _Sampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.idle = 0
+        self._labels: dict = {}
+        self._waiting = _waiting_calls()
+        self.started = 0.0
+        self._switch_interval = sys.getswitchinterval()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_qualname} ({_location(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _is_waiting(self, frame) -> bool:
+        code = frame.f_code
+        if code not in self._waiting:
+            return False
+        lines = self._waiting[code]
+        return lines is None or frame.f_lineno in lines
+
+    def _sample(self, me: int) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if self._is_waiting(frame):
+                self.idle += 1
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread {ident}"))
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._sample(me)
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        sys.setswitchinterval(min(self._switch_interval, _SWITCH_INTERVAL))
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+
+@dataclass
+class ProfileResult:
+    """Stacks sampled during one profiling window, with how often each was seen."""
+
+    seconds: float
+    interval_ms: float
+    idle: int
+    stacks: Counter
+
+    @property
+    def samples(self) -> int:
+        """Samples of threads that were working (idle threads are not counted)."""
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """One ``thread;outer;...;inner count`` line per distinct stack."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hot_functions(self, limit: int = 50) -> str:
+        """A table of the functions seen most, by samples spent in them and under them."""
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack[1:]):
+                total[function] += count
+        samples = self.samples or 1
+        lines = [
+            f"{self.samples} samples of working threads in {self.seconds:.1f} s "
+            f"every {self.interval_ms:g} ms ({self.idle} idle samples left out)",
+            "",
+            f"{'own %':>7s}{'total %':>9s}{'own':>8s}{'total':>8s}  function",
+        ]
+        for function, count in own.most_common(limit):
+            lines.append(
+                f"{100 * count / samples:7.1f}{100 * total[function] / samples:9.1f}"
+                f"{count:8d}{total[function]:8d}  {function}"
+            )
+        lines += ["", "By total (time under the function):", ""]
+        for function, count in total.most_common(limit):
+            lines.append(
+                f"{100 * own[function] / samples:7.1f}{100 * count / samples:9.1f}"
+                f"{own[function]:8d}{count:8d}  {function}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+def is_running() -> bool:
+    return _running is not None
+
+
+def start() -> None:
+    """Start sampling every thread of this process; see ``collect``."""
+    global _running
+    if _running is not None:
+        raise RuntimeError("A profile is already running.")
+    _running = _Sampler(PROFILE_INTERVAL_MS / 1000)
+    _running.start()
+
+
+def cancel() -> None:
+    """Stop a profile that nothing will ``collect``, discarding its samples."""
+    global _running
+    if _running is not None:
+        _running.stop()
+        _running = None
+
+
+async def collect(seconds: float) -> ProfileResult:
+    """Keep sampling until ``seconds`` after ``start``, then stop and return what was seen."""
+    global _running
+    sampler = _running
+    if sampler is None:
+        raise RuntimeError("No profile is running.")
+    try:
+        await asyncio.sleep(max(0.0, sampler.started + seconds - time.perf_counter()))
+    finally:
+        await asyncio.to_thread(sampler.stop)
+        _running = None
+    return ProfileResult(time.perf_counter() - sampler.started, PROFILE_INTERVAL_MS, sampler.idle, sampler.stacks)
+
+
+async def profile(seconds: float) -> ProfileResult:
+    """Sample every thread of this process for ``seconds`` and return what was seen."""
+    start()
+    return await collect(seconds)
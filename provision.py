@@ -0,0 +1,296 @@
+"""Provision a school's teachers and class rosters from the command line.
+
+    python provision.py admin --name "…" --telegram-id 123456789
+    python provision.py import roster.xlsx --school north --dry-run
+    python provision.py import roster.csv --school north
+
+An import file (CSV or XLSX, first row is the header) has one row per student
+with the columns ``teacher_telegram_id``, ``teacher_name``, ``is_admin`` and
+``student_name``. A row without a student registers only the teacher; a teacher's
+name and admin flag need to appear on one of their rows only. Teachers are
+upserted by Telegram id. Students are added until each class holds as many
+students of each name as the file lists, so importing the same file twice
+changes nothing; nobody is removed or moved.
+
+The whole file is checked before anything is written: a Telegram id listed with
+two names or admin flags, or already registered in another school, stops the
+import with every problem listed. The changes are then applied in one
+transaction of batched inserts. ``--dry-run`` prints the changes and writes
+nothing. The schema is created by ``db.init_db``, as when the bot starts.
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+import db
+import tenancy
+
+# Accepted header spellings → column.
+_COLUMNS = {
+    "teacher_telegram_id": "teacher_telegram_id",
+    "telegram_id": "teacher_telegram_id",
+    "معرف المعلم": "teacher_telegram_id",
+    "teacher_name": "teacher_name",
+    "teacher": "teacher_name",
+    "اسم المعلم": "teacher_name",
+    "is_admin": "is_admin",
+    "admin": "is_admin",
+    "مشرف": "is_admin",
+    "student_name": "student_name",
+    "student": "student_name",
+    "اسم الطالب": "student_name",
+}
+_TRUE = {"1", "true", "yes", "y", "نعم"}
+_FALSE = {"", "0", "false", "no", "n", "لا"}
+
+
+@dataclass
+class TeacherRow:
+    telegram_id: int
+    name: str | None = None
+    is_admin: bool | None = None
+    line: int = 0
+
+
+@dataclass
+class Roster:
+    """What an import file asks for: teachers by Telegram id and their students' names."""
+
+    teachers: dict[int, TeacherRow] = field(default_factory=dict)
+    students: dict[int, Counter] = field(default_factory=dict)
+    errors: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Plan:
+    """The changes an import makes to a school."""
+
+    new_teachers: list[tuple[int, str, bool]] = field(default_factory=list)
+    changed_teachers: list[tuple[dict, tuple[int, str, bool]]] = field(default_factory=list)
+    unchanged_teachers: int = 0
+    new_students: list[tuple[int, str]] = field(default_factory=list)
+    teacher_names: dict[int, str] = field(default_factory=dict)
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def teacher_rows(self) -> list[tuple[int, str, bool]]:
+        return self.new_teachers + [row for _, row in self.changed_teachers]
+
+
+def read_rows(path: str) -> list[dict[str, str]]:
+    """Return the data rows of a CSV or XLSX file as dicts keyed by column."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = [
+                ["" if value is None else str(value) for value in row]
+                for row in wb.worksheets[0].iter_rows(values_only=True)
+            ]
+        finally:
+            wb.close()
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.reader(f))
+    if not rows:
+        return []
+    header = [_COLUMNS.get(h.strip().lower(), h.strip().lower()) for h in rows[0]]
+    missing = {"teacher_telegram_id"} - set(header)
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(sorted(missing))}")
+    return [
+        {column: value.strip() for column, value in zip(header, row)}
+        for row in rows[1:]
+        if any(value.strip() for value in row)
+    ]
+
+
+def parse_roster(rows: list[dict[str, str]]) -> Roster:
+    """Collect teachers and students from file rows, noting every inconsistency."""
+    roster = Roster()
+    for line, row in enumerate(rows, start=2):
+        raw_id = row.get("teacher_telegram_id", "")
+        # Spreadsheets often store ids as floats ("123456789.0").
+        try:
+            telegram_id = int(float(raw_id)) if raw_id.endswith(".0") else int(raw_id)
+        except ValueError:
+            roster.errors.append(f"السطر {line}: معرّف تيليجرام غير صالح: {raw_id!r}")
+            continue
+
+        name = row.get("teacher_name") or None
+        flag = row.get("is_admin", "").lower()
+        if flag not in _TRUE | _FALSE:
+            roster.errors.append(f"السطر {line}: قيمة المشرف غير مفهومة: {flag!r}")
+            continue
+        is_admin = True if flag in _TRUE else (False if flag else None)
+
+        teacher = roster.teachers.setdefault(telegram_id, TeacherRow(telegram_id, line=line))
+        if name:
+            if teacher.name and teacher.name != name:
+                roster.errors.append(
+                    f"السطر {line}: المعرّف {telegram_id} مكرر باسمين مختلفين: "
+                    f"{teacher.name!r} (السطر {teacher.line}) و{name!r}"
+                )
+            elif not teacher.name:
+                teacher.name, teacher.line = name, line
+        if is_admin is not None:
+            if teacher.is_admin is not None and teacher.is_admin != is_admin:
+                roster.errors.append(f"السطر {line}: المعرّف {telegram_id} مكرر بقيمتي مشرف مختلفتين")
+            teacher.is_admin = is_admin
+
+        if row.get("student_name"):
+            roster.students.setdefault(telegram_id, Counter())[row["student_name"]] += 1
+    return roster
+
+
+async def plan_import(roster: Roster, school: str, new_school: bool = False) -> Plan:
+    """Compare a roster with the current school and return the changes importing it makes.
+
+    With ``new_school`` the school's database does not exist yet and is not created.
+    """
+    plan = Plan(errors=list(roster.errors))
+    registered = await tenancy.memberships()
+    existing = {} if new_school else {t["telegram_user_id"]: t for t in await db.get_all_teachers()}
+
+    for telegram_id, row in roster.teachers.items():
+        other_school = registered.get(telegram_id)
+        if other_school is not None and other_school != school:
+            plan.errors.append(f"المعرّف {telegram_id} مسجّل في مدرسة أخرى: {other_school}")
+            continue
+        current = existing.get(telegram_id)
+        if current is None:
+            if not row.name:
+                plan.errors.append(f"السطر {row.line}: المعلم {telegram_id} جديد ولا يوجد له اسم")
+                continue
+            plan.new_teachers.append((telegram_id, row.name, bool(row.is_admin)))
+            plan.teacher_names[telegram_id] = row.name
+            continue
+        wanted = (
+            telegram_id,
+            row.name or current["name"],
+            bool(current["is_admin"]) if row.is_admin is None else row.is_admin,
+        )
+        plan.teacher_names[telegram_id] = wanted[1]
+        if wanted[1:] != (current["name"], bool(current["is_admin"])):
+            plan.changed_teachers.append((current, wanted))
+        else:
+            plan.unchanged_teachers += 1
+
+    for telegram_id, names in roster.students.items():
+        if telegram_id not in plan.teacher_names:
+            continue  # the teacher has an error already
+        have = Counter()
+        if telegram_id in existing:
+            have.update(s["name"] for s in await db.get_students_by_teacher(existing[telegram_id]["id"]))
+        for name, count in (names - have).items():
+            plan.new_students.extend([(telegram_id, name)] * count)
+    return plan
+
+
+def print_plan(plan: Plan) -> None:
+    for telegram_id, name, is_admin in plan.new_teachers:
+        print(f"+ معلم جديد: {name} ({telegram_id}){' — مشرف' if is_admin else ''}")
+    for current, (telegram_id, name, is_admin) in plan.changed_teachers:
+        changes = []
+        if name != current["name"]:
+            changes.append(f"الاسم: {current['name']} ← {name}")
+        if is_admin != bool(current["is_admin"]):
+            changes.append(f"مشرف: {'نعم' if is_admin else 'لا'}")
+        print(f"~ معلم ({telegram_id}): {'، '.join(changes)}")
+    per_teacher = Counter(telegram_id for telegram_id, _ in plan.new_students)
+    for telegram_id, count in per_teacher.items():
+        print(f"+ {count} طالب في صف {plan.teacher_names[telegram_id]}")
+    print(
+        f"الخلاصة: {len(plan.new_teachers)} معلم جديد، {len(plan.changed_teachers)} معلم معدّل، "
+        f"{plan.unchanged_teachers} دون تغيير، {len(plan.new_students)} طالب جديد."
+    )
+
+
+async def import_file(path: str, school: str, school_name: str | None, dry_run: bool) -> int:
+    """Import a roster file into ``school``; return the process exit status."""
+    started = time.perf_counter()
+    try:
+        roster = parse_roster(read_rows(path))
+    except (OSError, ValueError) as e:
+        print(f"تعذّرت قراءة الملف: {e}", file=sys.stderr)
+        return 1
+
+    # A dry run for a school that has no database yet compares against an empty one.
+    new_school = dry_run and db.backend() == "sqlite" and not os.path.exists(tenancy.shard_path(school))
+    await _open_school(school, school_name, create=not new_school, register=not dry_run)
+    try:
+        plan = await plan_import(roster, school, new_school)
+        if plan.errors:
+            for error in plan.errors:
+                print(f"✗ {error}", file=sys.stderr)
+            print(f"لم يُكتب شيء: {len(plan.errors)} خطأ.", file=sys.stderr)
+            return 1
+        print_plan(plan)
+        if dry_run:
+            print("تجربة فقط (--dry-run): لم يُكتب شيء.")
+            return 0
+        if plan.teacher_rows or plan.new_students:
+            await db.import_roster(plan.teacher_rows, plan.new_students)
+        print(f"تم الاستيراد في {time.perf_counter() - started:.2f} ث.")
+        return 0
+    finally:
+        await db.close()
+
+
+async def seed_admin(name: str, telegram_id: int, school: str, school_name: str | None) -> int:
+    """Register one admin teacher; return the process exit status."""
+    await _open_school(school, school_name)
+    try:
+        if await db.get_teacher_by_telegram_id(telegram_id):
+            print(f"المعلم بمعرّف تيليجرام {telegram_id} مسجّل مسبقاً.")
+            return 1
+        await db.add_teacher(telegram_id, name, is_admin=True)
+    finally:
+        await db.close()
+    print(f"تم تسجيل المعلم المشرف '{name}' (معرّف تيليجرام: {telegram_id}) بنجاح.")
+    return 0
+
+
+async def _open_school(school: str, school_name: str | None, create: bool = True, register: bool = True) -> None:
+    """Select ``school``; with ``register``, add it to the directory, and with ``create``, its schema.
+
+    A school missing from the directory is skipped by the jobs that loop over
+    schools, so it is registered even without ``school_name`` (named by its id).
+    An existing entry is renamed only when ``school_name`` is given.
+    """
+    await tenancy.init_directory()
+    if register and school != tenancy.DEFAULT_SCHOOL:
+        await tenancy.add_school(school, school_name or school, rename=bool(school_name))
+    tenancy.activate(school)
+    if create:
+        await db.init_db()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="تجهيز المعلمين والصفوف من سطر الأوامر.")
+    parser.add_argument("--school", default=tenancy.DEFAULT_SCHOOL, help="معرّف المدرسة")
+    parser.add_argument("--school-name", help="اسم المدرسة عند إنشائها")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    admin = commands.add_parser("admin", help="تسجيل معلم مشرف")
+    admin.add_argument("--name", required=True, help="اسم المعلم")
+    admin.add_argument("--telegram-id", required=True, type=int, help="معرّف تيليجرام للمعلم")
+
+    importer = commands.add_parser("import", help="استيراد المعلمين والطلاب من ملف CSV أو XLSX")
+    importer.add_argument("path", help="ملف CSV أو XLSX")
+    importer.add_argument("--dry-run", action="store_true", help="عرض التغييرات دون كتابتها")
+
+    args = parser.parse_args(argv)
+    if args.command == "admin":
+        return asyncio.run(seed_admin(args.name, args.telegram_id, args.school, args.school_name))
+    return asyncio.run(import_file(args.path, args.school, args.school_name, args.dry_run))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Opt-in slow-query log — times SQL statements and captures their query plans.
+
+Enabled by setting SLOW_QUERY_MS. When it is unset, connections are returned
+untouched and the only cost is a single boolean check per connection.
+"""
+import heapq
+import itertools
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import aiosqlite
+from aiosqlite.context import Result
+
+from config import SLOW_QUERY_KEEP, SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+enabled = SLOW_QUERY_MS is not None
+
+# Min-heap of the slowest statements since startup, bounded to SLOW_QUERY_KEEP.
+_slowest: list[tuple[float, int, "SlowQuery"]] = []
+_counter = itertools.count()
+
+
+@dataclass
+class SlowQuery:
+    """A statement that exceeded the slow-query threshold."""
+
+    sql: str
+    params: tuple
+    duration_ms: float
+    plan: list[str] = field(default_factory=list)
+    at: datetime = field(default_factory=datetime.now)
+
+
+def instrument(conn: aiosqlite.Connection) -> aiosqlite.Connection:
+    """Wrap ``execute``/``executemany`` on a connection with the slow-query timer."""
+    execute = conn.execute
+    executemany = conn.executemany
+
+    def timed_execute(sql, parameters=None):
+        return Result(_timed(execute, execute, sql, parameters))
+
+    def timed_executemany(sql, parameters):
+        return Result(_timed(executemany, execute, sql, parameters, many=True))
+
+    conn.execute = timed_execute
+    conn.executemany = timed_executemany
+    return conn
+
+
+async def _timed(method, explain, sql, parameters, many=False):
+    """Run a statement and record it if it was slower than the threshold.
+
+    The timing covers statement execution up to the first result row, which for
+    SQLite includes any sorting or aggregation the plan needs.
+    """
+    start = time.perf_counter()
+    cursor = await method(sql, parameters)
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms >= SLOW_QUERY_MS:
+        params = _first_params(parameters) if many else tuple(parameters or ())
+        plan = await _explain(explain, sql, params)
+        _record(SlowQuery(sql=_compact(sql), params=params, duration_ms=duration_ms, plan=plan))
+    return cursor
+
+
+def _first_params(parameters) -> tuple:
+    """Return the first parameter row of an executemany batch, for EXPLAIN."""
+    try:
+        return tuple(next(iter(parameters)))
+    except (StopIteration, TypeError):
+        return ()
+
+
+async def _explain(execute, sql: str, params: tuple) -> list[str]:
+    """Return the ``EXPLAIN QUERY PLAN`` detail lines for a statement.
+
+    ``execute`` is the connection's unwrapped method, so the EXPLAIN itself is
+    never timed or recorded.
+    """
+    try:
+        async with execute(f"EXPLAIN QUERY PLAN {sql}", params) as cursor:
+            rows = await cursor.fetchall()
+    except sqlite3.Error:
+        return []
+    return [row[3] for row in rows]
+
+
+def _record(entry: SlowQuery) -> None:
+    logger.warning(
+        "Slow query (%.1f ms): %s params=%r plan=%s",
+        entry.duration_ms, entry.sql, entry.params, " | ".join(entry.plan) or "-",
+    )
+    item = (entry.duration_ms, next(_counter), entry)
+    if len(_slowest) < SLOW_QUERY_KEEP:
+        heapq.heappush(_slowest, item)
+    else:
+        heapq.heappushpop(_slowest, item)
+
+
+def _compact(sql: str) -> str:
+    """Collapse whitespace so multi-line SQL logs on one line."""
+    return " ".join(sql.split())
+
+
+def slowest(n: int) -> list[SlowQuery]:
+    """Return up to ``n`` of the slowest recorded statements, slowest first."""
+    return [entry for _, _, entry in heapq.nlargest(n, _slowest)]
+
+
+def reset() -> None:
+    """Forget all recorded statements."""
+    _slowest.clear()
@@ -1,27 +1,41 @@
-"""Excel report generation for attendance data."""
+"""Excel report generation for attendance data.
+
+Styles and layouts come from ``report_templates``.
+"""
+import asyncio
 import calendar
 import io
 from datetime import date, datetime
 
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
 from openpyxl.utils import get_column_letter
 
 import db
+import report_templates
+from config import REPORT_LAYOUT
+from report_templates import Layout
 
 
-async def generate_attendance_report(teacher_id: int, year: int, month: int) -> io.BytesIO:
+async def generate_attendance_report(
+    teacher_id: int, year: int, month: int, layout: str = REPORT_LAYOUT, on_row=None
+) -> io.BytesIO:
     """Generate an Excel attendance report for a teacher's class for a given month.
 
+    ``layout`` names one of ``report_templates.LAYOUTS``. The queries run on the
+    event loop; the workbook is built and saved in a worker thread so a large
+    report does not stall other updates. ``on_row``, if given, is called from
+    that thread after each student row with the rows written and the total.
     Returns a BytesIO buffer containing the .xlsx file.
     """
-    all_teachers = await db.get_all_teachers()
-    teacher = next((t for t in all_teachers if t["id"] == teacher_id), None)
-    teacher_name = teacher["name"] if teacher else "غير معروف"
+    report_layout = report_templates.get_layout(layout)
+    # One consistent view of the class, read without holding up roll calls.
+    async with db.snapshot(year, month):
+        all_teachers = await db.get_all_teachers()
+        teacher = next((t for t in all_teachers if t["id"] == teacher_id), None)
+        teacher_name = teacher["name"] if teacher else "غير معروف"
 
-    students = await db.get_students_by_teacher(teacher_id)
-    attendance_records = await db.get_attendance_for_month(teacher_id, year, month)
-    attendance_dates = await db.get_attendance_dates_for_month(teacher_id, year, month)
+        students = await db.get_students_by_teacher(teacher_id)
+        attendance_records = await db.get_attendance_for_month(teacher_id, year, month)
+        attendance_dates = await db.get_attendance_dates_for_month(teacher_id, year, month)
 
     # Build a set of (student_id, date_str) for quick lookup
     attendance_set: set[tuple[int, str]] = set()
@@ -29,93 +43,82 @@ async def generate_attendance_report(teacher_id: int, year: int, month: int) ->
         if record["date"]:
             attendance_set.add((record["student_id"], record["date"]))
 
+    return await asyncio.to_thread(
+        _render_workbook, teacher_name, students, attendance_set, attendance_dates, year, month, report_layout, on_row
+    )
+
+
+def _render_workbook(
+    teacher_name: str,
+    students: list[dict],
+    attendance_set: set[tuple[int, str]],
+    attendance_dates: list[str],
+    year: int,
+    month: int,
+    layout: Layout,
+    on_row=None,
+) -> io.BytesIO:
+    """Build the report workbook and save it to a buffer."""
     month_name = calendar.month_name[month]
 
-    wb = Workbook()
+    wb = report_templates.new_workbook()
     ws = wb.active
     ws.title = f"{month_name} {year}"
 
-    # ── Styles ────────────────────────────────────────────────────────────
-    header_font = Font(bold=True, size=14)
-    sub_header_font = Font(bold=True, size=11)
-    cell_font = Font(size=10)
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_text = Font(bold=True, size=10, color="FFFFFF")
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
-    center = Alignment(horizontal="center", vertical="center")
-
     # ── Title rows ────────────────────────────────────────────────────────
-    # Column count is dynamic: Student Name + N dates + Total
+    # Column count is dynamic: Student Name + N dates + Total (+ Percentage)
     date_col_count = len(attendance_dates)
-    last_col = 1 + date_col_count + 1
+    total_col = 1 + date_col_count + 1
+    last_col = total_col + 1 if layout.percentage else total_col
 
     ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=last_col)
-    title_cell = ws.cell(row=1, column=1, value=f"تقرير الحضور — {month_name} {year}")
-    title_cell.font = header_font
-    title_cell.alignment = Alignment(horizontal="center")
+    ws.cell(row=1, column=1, value=f"تقرير الحضور — {month_name} {year}").style = report_templates.TITLE
 
     ws.merge_cells(start_row=2, start_column=1, end_row=2, end_column=last_col)
-    teacher_cell = ws.cell(row=2, column=1, value=f"المعلم: {teacher_name}")
-    teacher_cell.font = sub_header_font
-    teacher_cell.alignment = Alignment(horizontal="center")
+    ws.cell(row=2, column=1, value=f"المعلم: {teacher_name}").style = report_templates.SUBTITLE
 
     # ── Header row ────────────────────────────────────────────────────────
     header_row = 4
-    name_header = ws.cell(row=header_row, column=1, value="اسم الطالب")
-    name_header.font = header_text
-    name_header.fill = header_fill
-    name_header.border = thin_border
-    name_header.alignment = center
-
-    for idx, date_str in enumerate(attendance_dates):
-        dt = datetime.strptime(date_str, "%Y-%m-%d")
-        label = dt.strftime("%d-%B-%Y")
-        cell = ws.cell(row=header_row, column=idx + 2, value=label)
-        cell.font = header_text
-        cell.fill = header_fill
-        cell.border = thin_border
-        cell.alignment = center
-
-    total_header = ws.cell(row=header_row, column=last_col, value="المجموع")
-    total_header.font = header_text
-    total_header.fill = header_fill
-    total_header.border = thin_border
-    total_header.alignment = center
+    labels = [datetime.strptime(d, "%Y-%m-%d").strftime("%d-%B-%Y") for d in attendance_dates]
+    headers = ["اسم الطالب", *labels, "المجموع"]
+    if layout.percentage:
+        headers.append("النسبة")
+    for col, label in enumerate(headers, start=1):
+        ws.cell(row=header_row, column=col, value=label).style = report_templates.HEADER
 
     # ── Data rows ─────────────────────────────────────────────────────────
     for i, student in enumerate(students):
         row = header_row + 1 + i
-        name_cell = ws.cell(row=row, column=1, value=student["name"])
-        name_cell.font = cell_font
-        name_cell.border = thin_border
+        ws.cell(row=row, column=1, value=student["name"]).style = report_templates.NAME
 
         total = 0
         for idx, date_str in enumerate(attendance_dates):
             cell = ws.cell(row=row, column=idx + 2)
-            cell.border = thin_border
-            cell.alignment = center
-            cell.font = cell_font
+            cell.style = report_templates.MARK
             if (student["id"], date_str) in attendance_set:
                 cell.value = "✓"
                 total += 1
 
-        total_cell = ws.cell(row=row, column=last_col, value=total)
-        total_cell.font = Font(bold=True, size=10)
-        total_cell.border = thin_border
-        total_cell.alignment = center
+        ws.cell(row=row, column=total_col, value=total).style = report_templates.TOTAL
+        if layout.percentage:
+            rate = total / date_col_count if date_col_count else 0
+            ws.cell(row=row, column=total_col + 1, value=rate).style = report_templates.PERCENT
+        if on_row is not None:
+            on_row(i + 1, len(students))
+
+    if layout.highlight_absences and date_col_count and students:
+        report_templates.highlight_absences(
+            ws, f"B{header_row + 1}:{get_column_letter(date_col_count + 1)}{header_row + len(students)}"
+        )
 
     # ── Column widths ─────────────────────────────────────────────────────
     ws.column_dimensions["A"].width = 25
     for idx in range(date_col_count):
         col_letter = get_column_letter(idx + 2)
         ws.column_dimensions[col_letter].width = 16
-    total_col_letter = get_column_letter(last_col)
-    ws.column_dimensions[total_col_letter].width = 7
+    ws.column_dimensions[get_column_letter(total_col)].width = 7
+    if layout.percentage:
+        ws.column_dimensions[get_column_letter(total_col + 1)].width = 8
 
     # ── Save to buffer ────────────────────────────────────────────────────
     buffer = io.BytesIO()
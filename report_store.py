@@ -0,0 +1,77 @@
+"""On-disk store of pre-generated monthly reports.
+
+Only closed months are stored: attendance is only ever recorded for today, so a
+closed month's report changes only when a roster changes, and ``db.py`` calls
+``invalidate`` for the affected teachers when that happens. Each school's
+reports live in its own subdirectory, since teacher ids are per shard.
+"""
+import calendar
+import glob
+import io
+import os
+from datetime import date
+
+import tenancy
+from config import REPORT_LAYOUT, REPORT_STORE_DIR
+
+
+def is_closed_month(year: int, month: int, today: date | None = None) -> bool:
+    """Return True if (year, month) is before the current month."""
+    today = today or date.today()
+    return (year, month) < (today.year, today.month)
+
+
+def previous_month(today: date | None = None) -> tuple[int, int]:
+    """Return (year, month) of the month before ``today``."""
+    today = today or date.today()
+    return (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+
+
+def report_filename(teacher_name: str, year: int, month: int) -> str:
+    return f"حضور_{teacher_name}_{calendar.month_name[month]}_{year}.xlsx"
+
+
+def report_caption(teacher_name: str, year: int, month: int) -> str:
+    return f"📊 تقرير الحضور لـ {teacher_name} — {calendar.month_name[month]} {year}"
+
+
+def _dir() -> str:
+    return tenancy.scoped_dir(REPORT_STORE_DIR)
+
+
+def _path(teacher_id: int, year: int, month: int) -> str:
+    # Named after the layout too, so changing REPORT_LAYOUT doesn't serve reports in the old one.
+    return os.path.join(_dir(), f"{teacher_id}_{year}_{month:02d}_{REPORT_LAYOUT}.xlsx")
+
+
+def get(teacher_id: int, year: int, month: int) -> io.BytesIO | None:
+    """Return a stored report, or None if it was never generated or was invalidated."""
+    try:
+        with open(_path(teacher_id, year, month), "rb") as f:
+            return io.BytesIO(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def put(teacher_id: int, year: int, month: int, buffer: io.BytesIO) -> None:
+    """Store a report for a closed month; reports for open months are ignored."""
+    if not is_closed_month(year, month):
+        return
+    os.makedirs(_dir(), exist_ok=True)
+    path = _path(teacher_id, year, month)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+
+
+def invalidate(*teacher_ids: int) -> None:
+    """Drop every stored report for the given teachers."""
+    for teacher_id in teacher_ids:
+        if teacher_id is None:
+            continue
+        for path in glob.glob(os.path.join(_dir(), f"{teacher_id}_*.xlsx")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,86 @@
+"""Report templates: the named styles reports are drawn with and the layouts they come in.
+
+Every style is registered once per workbook as a ``NamedStyle`` and cells refer
+to it by name, so a cell costs one style reference instead of its own font,
+border, fill and alignment objects. Anything that depends on a cell's value,
+such as highlighting absences, is a conditional format over the whole grid
+rather than per-cell styling.
+"""
+from dataclasses import dataclass
+
+from openpyxl import Workbook
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+TITLE = "report_title"
+SUBTITLE = "report_subtitle"
+HEADER = "report_header"
+NAME = "report_name"
+MARK = "report_mark"
+TOTAL = "report_total"
+PERCENT = "report_percent"
+
+_thin = Side(style="thin")
+_box = Border(left=_thin, right=_thin, top=_thin, bottom=_thin)
+_center = Alignment(horizontal="center", vertical="center")
+
+# Style name → NamedStyle arguments. NamedStyle objects bind to the workbook they
+# are added to, so each workbook gets its own, built from these.
+_STYLES = {
+    TITLE: dict(font=Font(bold=True, size=14), alignment=Alignment(horizontal="center")),
+    SUBTITLE: dict(font=Font(bold=True, size=11), alignment=Alignment(horizontal="center")),
+    HEADER: dict(
+        font=Font(bold=True, size=10, color="FFFFFF"),
+        fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+        border=_box,
+        alignment=_center,
+    ),
+    NAME: dict(font=Font(size=10), border=_box),
+    MARK: dict(font=Font(size=10), border=_box, alignment=_center),
+    TOTAL: dict(font=Font(bold=True, size=10), border=_box, alignment=_center),
+    PERCENT: dict(font=Font(bold=True, size=10), border=_box, alignment=_center, number_format="0%"),
+}
+
+_ABSENT_FILL = PatternFill(bgColor="FFC7CE")
+
+
+@dataclass(frozen=True)
+class Layout:
+    """What a report shows besides the student names, the attendance grid and the totals."""
+
+    name: str
+    percentage: bool = False  # attendance rate column after the total
+    highlight_absences: bool = False  # shade blank grid cells
+
+
+LAYOUTS = {
+    layout.name: layout
+    for layout in (
+        Layout("classic"),
+        Layout("detailed", percentage=True, highlight_absences=True),
+    )
+}
+
+
+def get_layout(name: str) -> Layout:
+    """Return the layout called ``name``."""
+    try:
+        return LAYOUTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown report layout {name!r}; expected one of {', '.join(LAYOUTS)}") from None
+
+
+def new_workbook() -> Workbook:
+    """Return an empty workbook with every report style registered."""
+    wb = Workbook()
+    for name, kwargs in _STYLES.items():
+        wb.add_named_style(NamedStyle(name=name, **kwargs))
+    return wb
+
+
+def highlight_absences(ws, cell_range: str) -> None:
+    """Shade the blank cells of ``cell_range`` (an attendance grid) as absences."""
+    first_cell = cell_range.split(":")[0]
+    ws.conditional_formatting.add(
+        cell_range, FormulaRule(formula=[f"LEN({first_cell})=0"], fill=_ABSENT_FILL, stopIfTrue=True)
+    )
@@ -0,0 +1,73 @@
+"""Student-name search: Arabic normalization shared by the index and the queries.
+
+Names are indexed and searched in a normalized form, so a search for "احمد"
+finds "أَحْمَد" and "اسامه" finds "أسامة":
+
+- diacritics (tashkeel, the combining maddah and hamza marks, superscript
+  alef) and tatweel are removed,
+- alef with hamza or madda and alef wasla become a bare alef,
+- taa marbuta becomes haa and alef maqsura becomes yaa.
+
+The same table drives ``normalize`` in Python, the SQL expression the SQLite
+triggers index with, and the ``translate()`` call of the PostgreSQL index, so
+the three can't drift apart.
+"""
+import re
+
+# Character → replacement ("" removes it).
+_FOLD = {
+    **{chr(c): "" for c in range(0x064B, 0x0656)},  # fathatan … sukun, maddah above, hamza above and below
+    "ٰ": "",  # superscript alef
+    "ـ": "",  # tatweel
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ة": "ه",
+    "ى": "ي",
+}
+_TABLE = str.maketrans(_FOLD)
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Return ``text`` in the form names are indexed in."""
+    return text.translate(_TABLE).lower()
+
+
+def tokens(text: str) -> list[str]:
+    """Split a typed search into normalized words."""
+    return _TOKEN.findall(normalize(text))
+
+
+def sqlite_normalize(column: str) -> str:
+    """Return a SQLite expression normalizing ``column`` like ``normalize`` does.
+
+    Built from ``replace()`` alone, so triggers using it work on any connection,
+    including the plain ``sqlite3`` ones of the CLIs, without a registered function.
+    Case is left to the FTS5 tokenizer, which folds it.
+    """
+    expr = column
+    for char, replacement in _FOLD.items():
+        expr = f"replace({expr}, '{char}', '{replacement}')"
+    return expr
+
+
+def sqlite_match(text: str) -> str | None:
+    """Return an FTS5 query matching names with a word starting with each typed word."""
+    words = tokens(text)
+    return " ".join(f'"{word}"*' for word in words) if words else None
+
+
+def postgres_normalize(column: str) -> str:
+    """Return a PostgreSQL expression normalizing ``column`` like ``normalize`` does."""
+    # translate() maps the leading characters and deletes the rest, so removals go last.
+    source = "".join(c for c, r in _FOLD.items() if r) + "".join(c for c, r in _FOLD.items() if not r)
+    target = "".join(r for r in _FOLD.values() if r)
+    return f"translate({column}, '{source}', '{target}')"
+
+
+def postgres_match(text: str) -> str | None:
+    """Return a ``to_tsquery('simple', …)`` query with a prefix term per typed word."""
+    words = tokens(text)
+    return " & ".join(f"{word}:*" for word in words) if words else None
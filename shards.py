@@ -0,0 +1,279 @@
+"""Bounded LRU cache of open SQLite shard connections.
+
+Each shard keeps one writer connection, used by one coroutine at a time, and up
+to ``readers`` read-only connections opened on demand for reports and
+statistics. In WAL mode the readers never wait for the writer nor hold it up.
+When more than ``capacity`` shards are open the least recently used one is
+closed, once whoever is using its connections is done.
+
+Writes are not run by their callers. ``write`` queues them for the shard's
+writer task (``GroupCommit``), which runs everything queued, up to
+``batch_size`` writes gathered for at most ``batch_window`` seconds, in one
+transaction and resolves each caller once that transaction is committed. Each
+write runs in its own savepoint, so one that fails is undone and reported to its
+caller without affecting the rest of the batch.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WriteStats:
+    """Group-commit counters of every shard since startup (or the last ``reset``)."""
+
+    writes: int = 0
+    commits: int = 0
+    failed_commits: int = 0
+    largest_batch: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "writes": self.writes,
+            "commits": self.commits,
+            "failed_commits": self.failed_commits,
+            "commits_per_s": round(self.commits / elapsed, 1) if elapsed else 0.0,
+            "avg_batch": round(self.writes / self.commits, 2) if self.commits else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+
+write_stats = WriteStats()
+
+Write = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+class Shard:
+    """One open shard: its writer connection, the lock that serializes its use, and its readers."""
+
+    __slots__ = ("path", "conn", "lock", "idle_readers", "reader_count", "writer")
+
+    def __init__(self, path: str, conn: aiosqlite.Connection, batch_window: float = 0.0, batch_size: int = 1):
+        self.path = path
+        self.conn = conn
+        self.lock = asyncio.Lock()
+        self.idle_readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self.reader_count = 0
+        self.writer = GroupCommit(self, batch_window, batch_size)
+
+
+class GroupCommit:
+    """A shard's writer task: runs queued writes on the writer connection, many per transaction."""
+
+    def __init__(self, shard: Shard, batch_window: float, batch_size: int):
+        self._shard = shard
+        self.batch_window = batch_window
+        self.batch_size = max(batch_size, 1)
+        self.closing = False
+        self._queue: asyncio.Queue[tuple[Write, asyncio.Future]] = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def submit(self, write: Write) -> Any:
+        """Queue ``write(conn)`` and return its result once the transaction running it is committed."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((write, future))
+        if self._queue.qsize() >= self.batch_size:
+            self._full.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_window and self._queue.qsize() + 1 < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.batch_window)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: list[tuple[Write, asyncio.Future]]) -> None:
+        conn = self._shard.conn
+        done: list[tuple[asyncio.Future, Any]] = []
+        async with self._shard.lock:
+            try:
+                await conn.execute("BEGIN IMMEDIATE")
+                for write, future in batch:
+                    if future.done():
+                        continue  # the caller was cancelled before its turn
+                    await conn.execute("SAVEPOINT write")
+                    try:
+                        result = await write(conn)
+                    except Exception as e:
+                        await conn.execute("ROLLBACK TO write")
+                        future.set_exception(e)
+                    else:
+                        done.append((future, result))
+                    await conn.execute("RELEASE write")
+                await conn.commit()
+            except BaseException as e:
+                if conn.in_transaction:
+                    await conn.rollback()
+                write_stats.failed_commits += 1
+                # Every write of the batch is undone, including those that had succeeded.
+                for _, future in batch:
+                    if future.done():
+                        continue
+                    if isinstance(e, Exception):
+                        future.set_exception(e)
+                    else:
+                        future.cancel()
+                if not isinstance(e, Exception):
+                    raise
+                logger.exception("Group commit of %d writes to %s failed", len(batch), self._shard.path)
+                return
+        write_stats.commits += 1
+        write_stats.writes += len(batch)
+        write_stats.largest_batch = max(write_stats.largest_batch, len(batch))
+        for future, result in done:
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self) -> None:
+        """Commit every queued write and stop the task."""
+        self.closing = True
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+Opener = Callable[[str], Awaitable[aiosqlite.Connection]]
+
+
+class ShardCache:
+    def __init__(
+        self,
+        capacity: int,
+        open_connection: Opener,
+        open_reader: Opener | None = None,
+        readers: int = 0,
+        batch_window: float = 0.0,
+        batch_size: int = 1,
+    ):
+        self.capacity = capacity
+        self._open_connection = open_connection
+        self._open_reader = open_reader
+        self.readers = readers if open_reader else 0
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self._shards: OrderedDict[str, Shard] = OrderedDict()
+        self._opening = asyncio.Lock()
+        self._closing: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    @asynccontextmanager
+    async def connection(self, path: str):
+        """Yield the shard's connection, held exclusively until the block exits.
+
+        A transaction left open by a failing block is rolled back so the next
+        user of the shard starts clean.
+        """
+        shard = await self._get(path)
+        async with shard.lock:
+            try:
+                yield shard.conn
+            except BaseException:
+                if shard.conn.in_transaction:
+                    await shard.conn.rollback()
+                raise
+
+    async def write(self, path: str, write: Write) -> Any:
+        """Run ``write(conn)`` on the shard's writer connection in its next group commit.
+
+        Returns the write's result, or raises its exception, once the
+        transaction is committed. ``write`` must not commit or roll back itself.
+        """
+        while True:
+            shard = await self._get(path)
+            if not shard.writer.closing:
+                return await shard.writer.submit(write)
+            # Evicted meanwhile; the next _get opens the shard again.
+
+    @asynccontextmanager
+    async def reader(self, path: str):
+        """Yield one of the shard's read-only connections, or its writer when readers are disabled.
+
+        A transaction left open by the block is rolled back before the
+        connection is handed to the next reader.
+        """
+        if not self.readers:
+            async with self.connection(path) as conn:
+                yield conn
+            return
+        shard = await self._get(path)
+        if shard.idle_readers.empty() and shard.reader_count < self.readers:
+            shard.reader_count += 1
+            try:
+                conn = await self._open_reader(path)
+            except BaseException:
+                shard.reader_count -= 1
+                raise
+        else:
+            conn = await shard.idle_readers.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                await conn.rollback()
+            shard.idle_readers.put_nowait(conn)
+
+    async def _get(self, path: str) -> Shard:
+        shard = self._shards.get(path)
+        if shard is None:
+            async with self._opening:
+                shard = self._shards.get(path)
+                if shard is None:
+                    shard = Shard(path, await self._open_connection(path), self.batch_window, self.batch_size)
+                    self._shards[path] = shard
+                    self._evict()
+        self._shards.move_to_end(path)
+        return shard
+
+    def _evict(self) -> None:
+        while len(self._shards) > self.capacity:
+            _, shard = self._shards.popitem(last=False)
+            logger.info("Closing shard %s (cache full).", shard.path)
+            task = asyncio.create_task(self._close(shard))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(shard: Shard) -> None:
+        await shard.writer.close()
+        async with shard.lock:
+            await shard.conn.close()
+        # Waits for readers in use to be handed back.
+        for _ in range(shard.reader_count):
+            await (await shard.idle_readers.get()).close()
+
+    async def close(self) -> None:
+        """Close every open shard."""
+        shards = list(self._shards.values())
+        self._shards.clear()
+        await asyncio.gather(*(self._close(s) for s in shards), *self._closing)
@@ -0,0 +1,22 @@
+"""Storage backends behind a common repository interface.
+
+SQLite (one shard per school) is the default. Set STORAGE_BACKEND=postgres and
+DATABASE_URL to use PostgreSQL instead; it needs the optional ``asyncpg`` package.
+"""
+from config import DATABASE_URL, STORAGE_BACKEND
+from storage.base import Repository
+
+BACKENDS = ("sqlite", "postgres")
+
+
+def create_repository(backend: str = STORAGE_BACKEND) -> Repository:
+    """Return a repository for ``backend``; it connects lazily on first use."""
+    if backend == "sqlite":
+        from storage.sqlite import SQLiteRepository
+
+        return SQLiteRepository()
+    if backend == "postgres":
+        from storage.postgres import PostgresRepository
+
+        return PostgresRepository(DATABASE_URL)
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}; expected one of {', '.join(BACKENDS)}.")
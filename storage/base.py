@@ -0,0 +1,141 @@
+"""The repository interface every storage backend implements."""
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+
+
+class Repository(ABC):
+    """Teachers, students and attendance of the current school (see ``tenancy``).
+
+    Rows are returned as plain dicts with the same keys on every backend, and
+    dates as YYYY-MM-DD strings. Mutations that affect a class return the id the
+    caller needs to invalidate cached reports or the school directory.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def init(self):
+        """Create the current school's tables if they don't exist."""
+
+    @abstractmethod
+    async def close(self):
+        """Release every open connection."""
+
+    @asynccontextmanager
+    async def snapshot(self, year: int | None = None, month: int | None = None):
+        """Run the block's reads in one read-only transaction, seeing one consistent state.
+
+        Writes from other connections made meanwhile are invisible to the block and
+        are not held up by it. ``year`` and ``month`` name the month whose attendance
+        the block reads, if it may be archived. Without an override, reads run as usual.
+        """
+        yield
+
+    # ── Teachers ──
+
+    @abstractmethod
+    async def get_teacher_by_telegram_id(self, telegram_user_id: int) -> dict | None: ...
+
+    @abstractmethod
+    async def get_all_teachers(self) -> list[dict]: ...
+
+    @abstractmethod
+    async def add_teacher(self, telegram_user_id: int, name: str, is_admin: bool) -> int:
+        """Insert a teacher and return its id."""
+
+    @abstractmethod
+    async def remove_teacher(self, teacher_id: int) -> int | None:
+        """Delete a teacher with their students, attendance and removal record; return their Telegram id."""
+
+    @abstractmethod
+    async def import_roster(
+        self, teachers: list[tuple[int, str, bool]], students: list[tuple[int, str]]
+    ) -> dict[int, int]:
+        """Upsert (telegram_user_id, name, is_admin) teachers by Telegram id and add
+        (teacher's telegram_user_id, name) students, all in one transaction.
+
+        Return the school's teacher ids by Telegram id.
+        """
+
+    # ── Students ──
+
+    @abstractmethod
+    async def get_students_by_teacher(self, teacher_id: int) -> list[dict]: ...
+
+    @abstractmethod
+    async def get_student_by_id(self, student_id: int) -> dict | None: ...
+
+    @abstractmethod
+    async def add_student(self, name: str, teacher_id: int) -> int:
+        """Insert a student and return its id."""
+
+    @abstractmethod
+    async def remove_student(self, student_id: int) -> int | None:
+        """Delete a student with their attendance and removal record; return the teacher id they had."""
+
+    @abstractmethod
+    async def update_student_name(self, student_id: int, new_name: str) -> int | None:
+        """Rename a student; return their teacher id."""
+
+    @abstractmethod
+    async def move_student(self, student_id: int, new_teacher_id: int) -> int | None:
+        """Move a student to another class; return the teacher id they had."""
+
+    @abstractmethod
+    async def move_students(self, student_ids: list[int], new_teacher_id: int) -> dict[int, int]:
+        """Move students to another class in one transaction; return the teacher id each
+        moved student had, by student id. Ids of students that no longer exist are skipped."""
+
+    @abstractmethod
+    async def search_students(self, text: str, teacher_id: int | None, limit: int) -> list[dict]:
+        """Find students whose name has a word starting with each typed word (see ``search``).
+
+        Searches one class, or the whole school when ``teacher_id`` is None. Rows also
+        carry ``teacher_name``.
+        """
+
+    # ── Attendance ──
+
+    @abstractmethod
+    async def mark_attendance(self, student_id: int, date: str): ...
+
+    @abstractmethod
+    async def remove_attendance(self, student_id: int, date: str): ...
+
+    @abstractmethod
+    async def get_attendance_for_date(self, teacher_id: int, date: str) -> set[int]: ...
+
+    @abstractmethod
+    async def get_attendance_for_month(self, teacher_id: int, year: int, month: int) -> list[dict]: ...
+
+    @abstractmethod
+    async def get_attendance_dates_for_month(self, teacher_id: int, year: int, month: int) -> list[str]: ...
+
+    # ── Audit log ──
+
+    @abstractmethod
+    async def add_audit_entries(self, entries: list[tuple[int, int, str, str, str]]):
+        """Append (teacher_id, student_id, date, action, changed_at) rows in one transaction."""
+
+    @abstractmethod
+    async def get_attendance_history(self, student_id: int, limit: int) -> list[dict]:
+        """Return a student's latest attendance changes, newest first, with the teacher's name."""
+
+    # ── Removals ──
+
+    @abstractmethod
+    async def start_removal(self, kind: str, target_id: int, chat_id: int | None, message_id: int | None) -> int:
+        """Record that a teacher or student (``kind``) is being removed, and the status
+        message reporting it; return how many attendance rows are left to delete.
+
+        The record is dropped by ``remove_teacher`` or ``remove_student``.
+        """
+
+    @abstractmethod
+    async def delete_attendance_batch(self, kind: str, target_id: int, limit: int) -> int:
+        """Delete up to ``limit`` attendance rows of a teacher's class or of a student,
+        in one transaction; return how many were deleted."""
+
+    @abstractmethod
+    async def pending_removals(self) -> list[dict]:
+        """Return the removals started and not finished: kind, target_id, chat_id, message_id."""
@@ -0,0 +1,432 @@
+"""PostgreSQL backend on an asyncpg connection pool.
+
+All schools share one database; ``teachers.school_id`` scopes every query to the
+current school. Statements are fixed strings, so asyncpg prepares each one once
+per pooled connection and reuses the prepared statement on later calls.
+"""
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import date as Date
+from datetime import datetime
+
+import asyncpg
+
+import search
+import tenancy
+from config import PG_POOL_MAX_SIZE, PG_POOL_MIN_SIZE
+from storage.base import Repository
+
+# Serializes schema creation across processes starting at the same time.
+_SCHEMA_LOCK_ID = 7_240_301
+
+# Named after the normalization it indexes, so a change to ``search`` builds a new index
+# (and drops the old one, which queries would no longer match).
+_NAME_SEARCH_INDEX = (
+    f"students_name_search_{hashlib.sha1(search.postgres_normalize('name').encode()).hexdigest()[:8]}_idx"
+)
+
+SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS teachers (
+        id BIGSERIAL PRIMARY KEY,
+        school_id TEXT NOT NULL,
+        telegram_user_id BIGINT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        is_admin INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS teachers_school_idx ON teachers (school_id);
+    CREATE TABLE IF NOT EXISTS students (
+        id BIGSERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        teacher_id BIGINT NOT NULL REFERENCES teachers(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS students_teacher_idx ON students (teacher_id);
+    DO $$
+    DECLARE stale TEXT;
+    BEGIN
+        FOR stale IN SELECT indexname FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = 'students'
+              AND indexname LIKE 'students_name_search_%'
+              AND indexname <> '{_NAME_SEARCH_INDEX}'
+        LOOP
+            EXECUTE format('DROP INDEX %I', stale);
+        END LOOP;
+    END $$;
+    CREATE INDEX IF NOT EXISTS {_NAME_SEARCH_INDEX} ON students
+        USING GIN (to_tsvector('simple', {search.postgres_normalize("name")}));
+    CREATE TABLE IF NOT EXISTS attendance (
+        id BIGSERIAL PRIMARY KEY,
+        student_id BIGINT NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+        date DATE NOT NULL,
+        UNIQUE (student_id, date)
+    );
+    CREATE TABLE IF NOT EXISTS attendance_audit (
+        id BIGSERIAL PRIMARY KEY,
+        school_id TEXT NOT NULL,
+        teacher_id BIGINT NOT NULL,
+        student_id BIGINT NOT NULL,
+        date DATE NOT NULL,
+        action TEXT NOT NULL,
+        changed_at TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS attendance_audit_student_idx
+        ON attendance_audit (school_id, student_id, changed_at);
+    CREATE TABLE IF NOT EXISTS removals (
+        school_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        target_id BIGINT NOT NULL,
+        chat_id BIGINT,
+        message_id BIGINT,
+        started_at TIMESTAMP NOT NULL DEFAULT now(),
+        PRIMARY KEY (kind, target_id)
+    );
+    CREATE OR REPLACE FUNCTION attendance_audit_append_only() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        RAISE EXCEPTION 'attendance_audit is append-only';
+    END
+    $$;
+    DROP TRIGGER IF EXISTS attendance_audit_append_only ON attendance_audit;
+    CREATE TRIGGER attendance_audit_append_only BEFORE UPDATE OR DELETE ON attendance_audit
+        FOR EACH ROW EXECUTE FUNCTION attendance_audit_append_only();
+"""
+
+# The connection of the current ``snapshot`` block, if any.
+_snapshot: ContextVar[asyncpg.Connection | None] = ContextVar("postgres_snapshot", default=None)
+
+# Names sort by code point (COLLATE "C"), as SQLite's default BINARY collation does.
+TEACHER_COLUMNS = "t.id, t.telegram_user_id, t.name, t.is_admin"
+
+GET_TEACHER = f"""
+    SELECT {TEACHER_COLUMNS} FROM teachers t WHERE t.telegram_user_id = $1 AND t.school_id = $2
+"""
+ALL_TEACHERS = f"""
+    SELECT {TEACHER_COLUMNS} FROM teachers t WHERE t.school_id = $1 ORDER BY t.name COLLATE "C", t.id
+"""
+ADD_TEACHER = """
+    INSERT INTO teachers (school_id, telegram_user_id, name, is_admin) VALUES ($1, $2, $3, $4) RETURNING id
+"""
+REMOVE_TEACHER = """
+    WITH removal AS (DELETE FROM removals WHERE kind = 'teacher' AND target_id = $1 AND school_id = $2)
+    DELETE FROM teachers WHERE id = $1 AND school_id = $2 RETURNING telegram_user_id
+"""
+UPSERT_TEACHER = """
+    INSERT INTO teachers (school_id, telegram_user_id, name, is_admin) VALUES ($1, $2, $3, $4)
+    ON CONFLICT (telegram_user_id) DO UPDATE SET name = excluded.name, is_admin = excluded.is_admin
+    WHERE teachers.school_id = excluded.school_id
+"""
+TEACHER_IDS = """
+    SELECT telegram_user_id, id FROM teachers WHERE school_id = $1
+"""
+IMPORT_STUDENT = """
+    INSERT INTO students (name, teacher_id) VALUES ($1, $2)
+"""
+STUDENTS_BY_TEACHER = """
+    SELECT s.id, s.name, s.teacher_id FROM students s JOIN teachers t ON t.id = s.teacher_id
+    WHERE s.teacher_id = $1 AND t.school_id = $2
+    ORDER BY s.name COLLATE "C", s.id
+"""
+STUDENT_BY_ID = """
+    SELECT s.id, s.name, s.teacher_id FROM students s JOIN teachers t ON t.id = s.teacher_id
+    WHERE s.id = $1 AND t.school_id = $2
+"""
+ADD_STUDENT = """
+    INSERT INTO students (name, teacher_id)
+    SELECT $1::text, id FROM teachers WHERE id = $2 AND school_id = $3
+    RETURNING id
+"""
+REMOVE_STUDENT = """
+    WITH removal AS (DELETE FROM removals WHERE kind = 'student' AND target_id = $1 AND school_id = $2)
+    DELETE FROM students s USING teachers t
+    WHERE s.id = $1 AND t.id = s.teacher_id AND t.school_id = $2
+    RETURNING s.teacher_id
+"""
+RENAME_STUDENT = """
+    UPDATE students s SET name = $2 FROM teachers t
+    WHERE s.id = $1 AND t.id = s.teacher_id AND t.school_id = $3
+    RETURNING s.teacher_id
+"""
+MOVE_STUDENT = """
+    WITH old AS (
+        SELECT s.id, s.teacher_id FROM students s JOIN teachers t ON t.id = s.teacher_id
+        WHERE s.id = $1 AND t.school_id = $3
+        FOR UPDATE OF s
+    )
+    UPDATE students s SET teacher_id = $2 FROM old
+    WHERE s.id = old.id AND EXISTS (SELECT 1 FROM teachers WHERE id = $2 AND school_id = $3)
+    RETURNING old.teacher_id
+"""
+MOVE_STUDENTS = """
+    WITH old AS (
+        SELECT s.id, s.teacher_id FROM students s JOIN teachers t ON t.id = s.teacher_id
+        WHERE s.id = ANY($1::bigint[]) AND t.school_id = $3
+        FOR UPDATE OF s
+    )
+    UPDATE students s SET teacher_id = $2 FROM old
+    WHERE s.id = old.id AND EXISTS (SELECT 1 FROM teachers WHERE id = $2 AND school_id = $3)
+    RETURNING s.id, old.teacher_id
+"""
+# Must use the exact expression of the name search index (_NAME_SEARCH_INDEX) for it to apply.
+SEARCH_STUDENTS = f"""
+    SELECT s.id, s.name, s.teacher_id, t.name AS teacher_name
+    FROM students s JOIN teachers t ON t.id = s.teacher_id
+    WHERE t.school_id = $1
+      AND to_tsvector('simple', {search.postgres_normalize("s.name")}) @@ to_tsquery('simple', $2)
+      AND ($3::bigint IS NULL OR s.teacher_id = $3)
+    ORDER BY s.name COLLATE "C", s.id
+    LIMIT $4
+"""
+MARK_ATTENDANCE = """
+    INSERT INTO attendance (student_id, date)
+    SELECT s.id, $2::date FROM students s JOIN teachers t ON t.id = s.teacher_id
+    WHERE s.id = $1 AND t.school_id = $3
+    ON CONFLICT (student_id, date) DO NOTHING
+"""
+REMOVE_ATTENDANCE = """
+    DELETE FROM attendance a USING students s, teachers t
+    WHERE a.student_id = $1 AND a.date = $2
+      AND s.id = a.student_id AND t.id = s.teacher_id AND t.school_id = $3
+"""
+ATTENDANCE_FOR_DATE = """
+    SELECT a.student_id FROM attendance a
+    JOIN students s ON s.id = a.student_id
+    JOIN teachers t ON t.id = s.teacher_id
+    WHERE s.teacher_id = $1 AND t.school_id = $2 AND a.date = $3
+"""
+ATTENDANCE_FOR_MONTH = """
+    SELECT s.id AS student_id, s.name AS student_name, to_char(a.date, 'YYYY-MM-DD') AS date
+    FROM students s
+    JOIN teachers t ON t.id = s.teacher_id
+    LEFT JOIN attendance a ON a.student_id = s.id AND a.date >= $3 AND a.date < $4
+    WHERE s.teacher_id = $1 AND t.school_id = $2
+    ORDER BY s.name COLLATE "C", s.id, a.date
+"""
+ATTENDANCE_DATES_FOR_MONTH = """
+    SELECT DISTINCT to_char(a.date, 'YYYY-MM-DD') AS date
+    FROM attendance a
+    JOIN students s ON s.id = a.student_id
+    JOIN teachers t ON t.id = s.teacher_id
+    WHERE s.teacher_id = $1 AND t.school_id = $2 AND a.date >= $3 AND a.date < $4
+    ORDER BY 1
+"""
+ADD_AUDIT_ENTRY = """
+    INSERT INTO attendance_audit (school_id, teacher_id, student_id, date, action, changed_at)
+    VALUES ($1, $2, $3, $4, $5, $6)
+"""
+ATTENDANCE_HISTORY = """
+    SELECT to_char(l.date, 'YYYY-MM-DD') AS date, l.action,
+           to_char(l.changed_at, 'YYYY-MM-DD"T"HH24:MI:SS') AS changed_at,
+           l.teacher_id, t.name AS teacher_name
+    FROM attendance_audit l
+    LEFT JOIN teachers t ON t.id = l.teacher_id AND t.school_id = l.school_id
+    WHERE l.school_id = $1 AND l.student_id = $2
+    ORDER BY l.changed_at DESC, l.id DESC
+    LIMIT $3
+"""
+
+START_REMOVAL = """
+    INSERT INTO removals (school_id, kind, target_id, chat_id, message_id) VALUES ($1, $2, $3, $4, $5)
+    ON CONFLICT (kind, target_id) DO UPDATE SET chat_id = excluded.chat_id, message_id = excluded.message_id
+"""
+# The attendance rows a removal deletes, by kind; $1 is the teacher or student, $2 the school.
+REMOVAL_ROWS = {
+    "teacher": """
+        SELECT {columns} FROM attendance a
+        JOIN students s ON s.id = a.student_id
+        JOIN teachers t ON t.id = s.teacher_id
+        WHERE s.teacher_id = $1 AND t.school_id = $2
+    """,
+    "student": """
+        SELECT {columns} FROM attendance a
+        JOIN students s ON s.id = a.student_id
+        JOIN teachers t ON t.id = s.teacher_id
+        WHERE a.student_id = $1 AND t.school_id = $2
+    """,
+}
+COUNT_REMOVAL_ROWS = {kind: rows.format(columns="count(*)") for kind, rows in REMOVAL_ROWS.items()}
+DELETE_REMOVAL_ROWS = {
+    kind: f"DELETE FROM attendance WHERE id IN ({rows.format(columns='a.id')} LIMIT $3)"
+    for kind, rows in REMOVAL_ROWS.items()
+}
+PENDING_REMOVALS = """
+    SELECT kind, target_id, chat_id, message_id FROM removals WHERE school_id = $1 ORDER BY started_at
+"""
+
+
+def _month_range(year: int, month: int) -> tuple[Date, Date]:
+    return Date(year, month, 1), (Date(year + 1, 1, 1) if month == 12 else Date(year, month + 1, 1))
+
+
+class PostgresRepository(Repository):
+    name = "postgres"
+
+    def __init__(self, dsn: str | None, min_size: int = PG_POOL_MIN_SIZE, max_size: int = PG_POOL_MAX_SIZE):
+        if not dsn:
+            raise ValueError("DATABASE_URL must be set to use the postgres storage backend.")
+        self._dsn = dsn
+        self._min_size = min_size
+        self._max_size = max_size
+        self._pool: asyncpg.Pool | None = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        self._dsn, min_size=self._min_size, max_size=self._max_size
+                    )
+        return self._pool
+
+    async def init(self):
+        pool = await self._get_pool()
+        async with pool.acquire() as conn, conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", _SCHEMA_LOCK_ID)
+            await conn.execute(SCHEMA)
+
+    async def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    @asynccontextmanager
+    async def snapshot(self, year: int | None = None, month: int | None = None):
+        async with (await self._get_pool()).acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                token = _snapshot.set(conn)
+                try:
+                    yield
+                finally:
+                    _snapshot.reset(token)
+
+    async def _executor(self) -> asyncpg.Connection | asyncpg.Pool:
+        """The snapshot's connection inside a ``snapshot`` block, otherwise the pool."""
+        return _snapshot.get() or await self._get_pool()
+
+    async def _fetch(self, query: str, *args) -> list[asyncpg.Record]:
+        return await (await self._executor()).fetch(query, *args)
+
+    async def _fetchrow(self, query: str, *args) -> asyncpg.Record | None:
+        return await (await self._executor()).fetchrow(query, *args)
+
+    async def _fetchval(self, query: str, *args):
+        return await (await self._executor()).fetchval(query, *args)
+
+    async def _execute(self, query: str, *args):
+        return await (await self._executor()).execute(query, *args)
+
+    # ── Teachers ──
+
+    async def get_teacher_by_telegram_id(self, telegram_user_id: int) -> dict | None:
+        row = await self._fetchrow(GET_TEACHER, telegram_user_id, tenancy.current())
+        return dict(row) if row else None
+
+    async def get_all_teachers(self) -> list[dict]:
+        return [dict(r) for r in await self._fetch(ALL_TEACHERS, tenancy.current())]
+
+    async def add_teacher(self, telegram_user_id: int, name: str, is_admin: bool) -> int:
+        return await self._fetchval(ADD_TEACHER, tenancy.current(), telegram_user_id, name, 1 if is_admin else 0)
+
+    async def remove_teacher(self, teacher_id: int) -> int | None:
+        return await self._fetchval(REMOVE_TEACHER, teacher_id, tenancy.current())
+
+    async def import_roster(
+        self, teachers: list[tuple[int, str, bool]], students: list[tuple[int, str]]
+    ) -> dict[int, int]:
+        school = tenancy.current()
+        async with (await self._get_pool()).acquire() as conn, conn.transaction():
+            await conn.executemany(
+                UPSERT_TEACHER,
+                [(school, telegram_id, name, 1 if is_admin else 0) for telegram_id, name, is_admin in teachers],
+            )
+            teacher_ids = {row["telegram_user_id"]: row["id"] for row in await conn.fetch(TEACHER_IDS, school)}
+            await conn.executemany(
+                IMPORT_STUDENT, [(name, teacher_ids[telegram_user_id]) for telegram_user_id, name in students]
+            )
+        return teacher_ids
+
+    # ── Students ──
+
+    async def get_students_by_teacher(self, teacher_id: int) -> list[dict]:
+        return [dict(r) for r in await self._fetch(STUDENTS_BY_TEACHER, teacher_id, tenancy.current())]
+
+    async def get_student_by_id(self, student_id: int) -> dict | None:
+        row = await self._fetchrow(STUDENT_BY_ID, student_id, tenancy.current())
+        return dict(row) if row else None
+
+    async def add_student(self, name: str, teacher_id: int) -> int:
+        student_id = await self._fetchval(ADD_STUDENT, name, teacher_id, tenancy.current())
+        if student_id is None:
+            raise ValueError(f"Teacher {teacher_id} is not in school {tenancy.current()!r}.")
+        return student_id
+
+    async def remove_student(self, student_id: int) -> int | None:
+        return await self._fetchval(REMOVE_STUDENT, student_id, tenancy.current())
+
+    async def update_student_name(self, student_id: int, new_name: str) -> int | None:
+        return await self._fetchval(RENAME_STUDENT, student_id, new_name, tenancy.current())
+
+    async def move_student(self, student_id: int, new_teacher_id: int) -> int | None:
+        return await self._fetchval(MOVE_STUDENT, student_id, new_teacher_id, tenancy.current())
+
+    async def move_students(self, student_ids: list[int], new_teacher_id: int) -> dict[int, int]:
+        rows = await self._fetch(MOVE_STUDENTS, student_ids, new_teacher_id, tenancy.current())
+        return {row["id"]: row["teacher_id"] for row in rows}
+
+    async def search_students(self, text: str, teacher_id: int | None, limit: int) -> list[dict]:
+        match = search.postgres_match(text)
+        if match is None:
+            return []
+        rows = await self._fetch(SEARCH_STUDENTS, tenancy.current(), match, teacher_id, limit)
+        return [dict(r) for r in rows]
+
+    # ── Attendance ──
+
+    async def mark_attendance(self, student_id: int, date: str):
+        await self._execute(MARK_ATTENDANCE, student_id, Date.fromisoformat(date), tenancy.current())
+
+    async def remove_attendance(self, student_id: int, date: str):
+        await self._execute(REMOVE_ATTENDANCE, student_id, Date.fromisoformat(date), tenancy.current())
+
+    async def get_attendance_for_date(self, teacher_id: int, date: str) -> set[int]:
+        rows = await self._fetch(ATTENDANCE_FOR_DATE, teacher_id, tenancy.current(), Date.fromisoformat(date))
+        return {row[0] for row in rows}
+
+    async def get_attendance_for_month(self, teacher_id: int, year: int, month: int) -> list[dict]:
+        rows = await self._fetch(ATTENDANCE_FOR_MONTH, teacher_id, tenancy.current(), *_month_range(year, month))
+        return [dict(r) for r in rows]
+
+    async def get_attendance_dates_for_month(self, teacher_id: int, year: int, month: int) -> list[str]:
+        rows = await self._fetch(
+            ATTENDANCE_DATES_FOR_MONTH, teacher_id, tenancy.current(), *_month_range(year, month)
+        )
+        return [row[0] for row in rows]
+
+    # ── Audit log ──
+
+    async def add_audit_entries(self, entries: list[tuple[int, int, str, str, str]]):
+        school = tenancy.current()
+        rows = [
+            (school, teacher_id, student_id, Date.fromisoformat(date), action, datetime.fromisoformat(changed_at))
+            for teacher_id, student_id, date, action, changed_at in entries
+        ]
+        async with (await self._get_pool()).acquire() as conn, conn.transaction():
+            await conn.executemany(ADD_AUDIT_ENTRY, rows)
+
+    async def get_attendance_history(self, student_id: int, limit: int) -> list[dict]:
+        rows = await self._fetch(ATTENDANCE_HISTORY, tenancy.current(), student_id, limit)
+        return [dict(r) for r in rows]
+
+    # ── Removals ──
+
+    async def start_removal(self, kind: str, target_id: int, chat_id: int | None, message_id: int | None) -> int:
+        school = tenancy.current()
+        await self._execute(START_REMOVAL, school, kind, target_id, chat_id, message_id)
+        return await self._fetchval(COUNT_REMOVAL_ROWS[kind], target_id, school)
+
+    async def delete_attendance_batch(self, kind: str, target_id: int, limit: int) -> int:
+        status = await self._execute(DELETE_REMOVAL_ROWS[kind], target_id, tenancy.current(), limit)
+        return int(status.split()[-1])
+
+    async def pending_removals(self) -> list[dict]:
+        return [dict(r) for r in await self._fetch(PENDING_REMOVALS, tenancy.current())]
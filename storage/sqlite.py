@@ -0,0 +1,528 @@
+"""SQLite backend: one database file (shard) per school, opened through a bounded cache.
+
+Shards run in WAL mode, so the read-only connections reports and statistics use
+see a consistent snapshot without blocking the writer connection, and the writer
+never waits for them. Every change goes through the shard's group commit (see
+``shards``): repository methods pass their statements to ``_write`` as a function
+of the writer connection and never commit themselves.
+"""
+import json
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+import aiosqlite
+
+import archive
+import querylog
+import search
+import shards
+import tenancy
+from config import (
+    SHARD_CACHE_SIZE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_JOURNAL_SIZE_LIMIT,
+    SQLITE_READERS,
+    SQLITE_WAL_AUTOCHECKPOINT,
+    WRITE_BATCH_SIZE,
+    WRITE_BATCH_WINDOW_MS,
+)
+from storage.base import Repository
+
+
+async def _create_schema(db: aiosqlite.Connection):
+    """Create tables if they don't exist."""
+    # Only takes effect on a new, empty database; see maintenance.py --convert.
+    await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    await db.execute("PRAGMA foreign_keys = ON")
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS teachers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_user_id INTEGER UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            is_admin INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            teacher_id INTEGER NOT NULL,
+            FOREIGN KEY (teacher_id) REFERENCES teachers(id) ON DELETE CASCADE
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+            UNIQUE(student_id, date)
+        )
+    """)
+    await _create_search_index(db)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS archived_years (
+            year INTEGER PRIMARY KEY,
+            rows INTEGER NOT NULL,
+            archived_at TEXT NOT NULL
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_audit (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            teacher_id INTEGER NOT NULL,
+            student_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            action TEXT NOT NULL,
+            changed_at TEXT NOT NULL
+        )
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attendance_audit_student ON attendance_audit(student_id, changed_at)"
+    )
+    # Teachers and students being removed (see handlers/removals.py).
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS removals (
+            kind TEXT NOT NULL,
+            target_id INTEGER NOT NULL,
+            chat_id INTEGER,
+            message_id INTEGER,
+            started_at TEXT NOT NULL,
+            PRIMARY KEY (kind, target_id)
+        )
+    """)
+    # Append-only: history outlives the students and teachers it mentions.
+    for event in ("UPDATE", "DELETE"):
+        await db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS attendance_audit_no_{event.lower()}
+            BEFORE {event} ON attendance_audit
+            BEGIN SELECT RAISE(ABORT, 'attendance_audit is append-only'); END
+        """)
+    await db.commit()
+
+
+async def _create_search_index(db: aiosqlite.Connection):
+    """Create the FTS5 index of normalized student names and the triggers keeping it in step."""
+    async with db.execute("SELECT 1 FROM sqlite_master WHERE name = 'students_fts'") as cursor:
+        is_new = await cursor.fetchone() is None
+    await db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(name, tokenize = 'unicode61')")
+    new_name = search.sqlite_normalize("new.name")
+    async with db.execute("SELECT sql FROM sqlite_master WHERE name = 'students_fts_insert'") as cursor:
+        row = await cursor.fetchone()
+    # Names indexed by triggers of an older ``search`` normalization are indexed again.
+    stale = row is not None and new_name not in row[0]
+    if stale:
+        await db.execute("DROP TRIGGER students_fts_insert")
+        await db.execute("DROP TRIGGER IF EXISTS students_fts_update")
+        await db.execute("DELETE FROM students_fts")
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS students_fts_insert AFTER INSERT ON students BEGIN
+            INSERT INTO students_fts (rowid, name) VALUES (new.id, {new_name});
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS students_fts_update AFTER UPDATE OF name ON students BEGIN
+            UPDATE students_fts SET name = {new_name} WHERE rowid = new.id;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS students_fts_delete AFTER DELETE ON students BEGIN
+            DELETE FROM students_fts WHERE rowid = old.id;
+        END
+    """)
+    if is_new or stale:
+        # Databases created before the index existed, or before the normalization changed.
+        await db.execute(
+            f"INSERT INTO students_fts (rowid, name) SELECT id, {search.sqlite_normalize('name')} FROM students"
+        )
+
+
+# The read-only connection of the current ``snapshot`` block, if any.
+_snapshot: ContextVar[aiosqlite.Connection | None] = ContextVar("sqlite_snapshot", default=None)
+
+
+async def _open_shard(path: str) -> aiosqlite.Connection:
+    """Open a shard's long-lived writer connection, wrapped by the slow-query log when it is enabled."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = await aiosqlite.connect(path)
+    conn.row_factory = aiosqlite.Row
+    if querylog.enabled:
+        querylog.instrument(conn)
+    await _create_schema(conn)
+    # Persistent in the file; set after the schema so auto_vacuum still applies to new shards.
+    await conn.execute("PRAGMA journal_mode = WAL")
+    await conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    await conn.execute(f"PRAGMA wal_autocheckpoint = {SQLITE_WAL_AUTOCHECKPOINT}")
+    await conn.execute(f"PRAGMA journal_size_limit = {SQLITE_JOURNAL_SIZE_LIMIT}")
+    return conn
+
+
+async def _open_reader(path: str) -> aiosqlite.Connection:
+    """Open a read-only connection to a shard whose writer is open (so it is in WAL mode)."""
+    conn = await aiosqlite.connect(path)
+    conn.row_factory = aiosqlite.Row
+    if querylog.enabled:
+        querylog.instrument(conn)
+    await conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    await conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+@asynccontextmanager
+async def _borrowed(conn: aiosqlite.Connection):
+    yield conn
+
+
+@asynccontextmanager
+async def _no_archive():
+    yield "attendance"
+
+
+# The attendance rows a removal deletes, by kind; ``columns`` picks what to select.
+_REMOVAL_ROWS = {
+    "teacher": "SELECT {columns} FROM attendance a JOIN students s ON s.id = a.student_id WHERE s.teacher_id = ?",
+    "student": "SELECT {columns} FROM attendance a WHERE a.student_id = ?",
+}
+
+
+async def _teacher_of_student(db: aiosqlite.Connection, student_id: int) -> int | None:
+    async with db.execute("SELECT teacher_id FROM students WHERE id = ?", (student_id,)) as cursor:
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+
+class SQLiteRepository(Repository):
+    name = "sqlite"
+
+    def __init__(
+        self,
+        cache_size: int = SHARD_CACHE_SIZE,
+        readers: int = SQLITE_READERS,
+        batch_window_ms: float = WRITE_BATCH_WINDOW_MS,
+        batch_size: int = WRITE_BATCH_SIZE,
+    ):
+        self._shards = shards.ShardCache(
+            cache_size, _open_shard, _open_reader, readers, batch_window_ms / 1000, batch_size
+        )
+
+    def _connect(self):
+        """Use the current school's shard connection for the duration of an ``async with`` block.
+
+        Inside a ``snapshot`` block that is the snapshot's read-only connection.
+        """
+        conn = _snapshot.get()
+        if conn is not None:
+            return _borrowed(conn)
+        return self._shards.connection(tenancy.shard_path())
+
+    def _read(self):
+        """Like ``_connect``, but on a read-only connection, for report and statistics queries."""
+        conn = _snapshot.get()
+        if conn is not None:
+            return _borrowed(conn)
+        return self._shards.reader(tenancy.shard_path())
+
+    def _write(self, write: shards.Write):
+        """Run ``write(conn)`` in the current school's next group commit and return its result."""
+        return self._shards.write(tenancy.shard_path(), write)
+
+    @asynccontextmanager
+    async def snapshot(self, year: int | None = None, month: int | None = None):
+        if not self._shards.readers:
+            # Reads share the writer one statement at a time; a block-long transaction would hold it up.
+            yield
+            return
+        async with self._shards.reader(tenancy.shard_path()) as conn:
+            # ATTACH is not allowed inside a transaction, so an archived month is attached first.
+            async with archive.attendance_table(conn, year, month) if year else _no_archive():
+                await conn.execute("BEGIN")
+                token = _snapshot.set(conn)
+                try:
+                    yield
+                finally:
+                    _snapshot.reset(token)
+                    await conn.rollback()
+
+    async def init(self):
+        async with self._connect() as db:
+            await _create_schema(db)
+
+    async def close(self):
+        await self._shards.close()
+
+    # ── Teachers ──
+
+    async def get_teacher_by_telegram_id(self, telegram_user_id: int) -> dict | None:
+        async with self._connect() as db:
+            async with db.execute(
+                "SELECT * FROM teachers WHERE telegram_user_id = ?", (telegram_user_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    async def get_all_teachers(self) -> list[dict]:
+        async with self._connect() as db:
+            async with db.execute("SELECT * FROM teachers ORDER BY name, id") as cursor:
+                rows = await cursor.fetchall()
+                return [dict(r) for r in rows]
+
+    async def add_teacher(self, telegram_user_id: int, name: str, is_admin: bool) -> int:
+        async def write(db):
+            cursor = await db.execute(
+                "INSERT INTO teachers (telegram_user_id, name, is_admin) VALUES (?, ?, ?)",
+                (telegram_user_id, name, 1 if is_admin else 0),
+            )
+            return cursor.lastrowid
+
+        return await self._write(write)
+
+    async def remove_teacher(self, teacher_id: int) -> int | None:
+        async def write(db):
+            async with db.execute("SELECT telegram_user_id FROM teachers WHERE id = ?", (teacher_id,)) as cursor:
+                row = await cursor.fetchone()
+            await db.execute("DELETE FROM teachers WHERE id = ?", (teacher_id,))
+            await db.execute("DELETE FROM removals WHERE kind = 'teacher' AND target_id = ?", (teacher_id,))
+            return row[0] if row else None
+
+        return await self._write(write)
+
+    async def import_roster(
+        self, teachers: list[tuple[int, str, bool]], students: list[tuple[int, str]]
+    ) -> dict[int, int]:
+        async def write(db):
+            await db.executemany(
+                """
+                INSERT INTO teachers (telegram_user_id, name, is_admin) VALUES (?, ?, ?)
+                ON CONFLICT(telegram_user_id) DO UPDATE SET name = excluded.name, is_admin = excluded.is_admin
+                """,
+                [(telegram_user_id, name, 1 if is_admin else 0) for telegram_user_id, name, is_admin in teachers],
+            )
+            async with db.execute("SELECT telegram_user_id, id FROM teachers") as cursor:
+                teacher_ids = {telegram_user_id: teacher_id for telegram_user_id, teacher_id in await cursor.fetchall()}
+            await db.executemany(
+                "INSERT INTO students (name, teacher_id) VALUES (?, ?)",
+                [(name, teacher_ids[telegram_user_id]) for telegram_user_id, name in students],
+            )
+            return teacher_ids
+
+        return await self._write(write)
+
+    # ── Students ──
+
+    async def get_students_by_teacher(self, teacher_id: int) -> list[dict]:
+        async with self._connect() as db:
+            async with db.execute(
+                "SELECT * FROM students WHERE teacher_id = ? ORDER BY name, id", (teacher_id,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(r) for r in rows]
+
+    async def get_student_by_id(self, student_id: int) -> dict | None:
+        async with self._connect() as db:
+            async with db.execute("SELECT * FROM students WHERE id = ?", (student_id,)) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    async def add_student(self, name: str, teacher_id: int) -> int:
+        async def write(db):
+            cursor = await db.execute(
+                "INSERT INTO students (name, teacher_id) VALUES (?, ?)", (name, teacher_id)
+            )
+            return cursor.lastrowid
+
+        return await self._write(write)
+
+    async def remove_student(self, student_id: int) -> int | None:
+        async def write(db):
+            teacher_id = await _teacher_of_student(db, student_id)
+            await db.execute("DELETE FROM students WHERE id = ?", (student_id,))
+            await db.execute("DELETE FROM removals WHERE kind = 'student' AND target_id = ?", (student_id,))
+            return teacher_id
+
+        return await self._write(write)
+
+    async def update_student_name(self, student_id: int, new_name: str) -> int | None:
+        async def write(db):
+            teacher_id = await _teacher_of_student(db, student_id)
+            await db.execute("UPDATE students SET name = ? WHERE id = ?", (new_name, student_id))
+            return teacher_id
+
+        return await self._write(write)
+
+    async def move_student(self, student_id: int, new_teacher_id: int) -> int | None:
+        async def write(db):
+            old_teacher_id = await _teacher_of_student(db, student_id)
+            await db.execute(
+                "UPDATE students SET teacher_id = ? WHERE id = ?", (new_teacher_id, student_id)
+            )
+            return old_teacher_id
+
+        return await self._write(write)
+
+    async def move_students(self, student_ids: list[int], new_teacher_id: int) -> dict[int, int]:
+        ids = json.dumps(student_ids)
+
+        async def write(db):
+            async with db.execute(
+                "SELECT id, teacher_id FROM students WHERE id IN (SELECT value FROM json_each(?))", (ids,)
+            ) as cursor:
+                old_teacher_ids = dict(await cursor.fetchall())
+            await db.execute(
+                "UPDATE students SET teacher_id = ? WHERE id IN (SELECT value FROM json_each(?))",
+                (new_teacher_id, ids),
+            )
+            return old_teacher_ids
+
+        return await self._write(write)
+
+    async def search_students(self, text: str, teacher_id: int | None, limit: int) -> list[dict]:
+        match = search.sqlite_match(text)
+        if match is None:
+            return []
+        async with self._connect() as db:
+            async with db.execute(
+                """
+                SELECT s.id, s.name, s.teacher_id, t.name AS teacher_name
+                FROM students_fts
+                JOIN students s ON s.id = students_fts.rowid
+                JOIN teachers t ON t.id = s.teacher_id
+                WHERE students_fts MATCH ?1 AND (?2 IS NULL OR s.teacher_id = ?2)
+                ORDER BY s.name, s.id
+                LIMIT ?3
+                """,
+                (match, teacher_id, limit),
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(r) for r in rows]
+
+    # ── Attendance ──
+
+    async def mark_attendance(self, student_id: int, date: str):
+        async def write(db):
+            await db.execute(
+                "INSERT OR IGNORE INTO attendance (student_id, date) VALUES (?, ?)",
+                (student_id, date),
+            )
+
+        await self._write(write)
+
+    async def remove_attendance(self, student_id: int, date: str):
+        async def write(db):
+            await db.execute(
+                "DELETE FROM attendance WHERE student_id = ? AND date = ?",
+                (student_id, date),
+            )
+
+        await self._write(write)
+
+    async def get_attendance_for_date(self, teacher_id: int, date: str) -> set[int]:
+        async with self._connect() as db:
+            async with db.execute(
+                """
+                SELECT a.student_id FROM attendance a
+                JOIN students s ON a.student_id = s.id
+                WHERE s.teacher_id = ? AND a.date = ?
+                """,
+                (teacher_id, date),
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return {row[0] for row in rows}
+
+    async def get_attendance_for_month(self, teacher_id: int, year: int, month: int) -> list[dict]:
+        month_str = f"{year}-{month:02d}"
+        async with self._read() as db:
+            async with archive.attendance_table(db, year, month) as table, db.execute(
+                f"""
+                SELECT s.id as student_id, s.name as student_name, a.date
+                FROM students s
+                LEFT JOIN {table} a ON s.id = a.student_id AND a.date LIKE ?
+                WHERE s.teacher_id = ?
+                ORDER BY s.name, s.id, a.date
+                """,
+                (f"{month_str}%", teacher_id),
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(r) for r in rows]
+
+    async def get_attendance_dates_for_month(self, teacher_id: int, year: int, month: int) -> list[str]:
+        month_str = f"{year}-{month:02d}"
+        async with self._read() as db:
+            async with archive.attendance_table(db, year, month) as table, db.execute(
+                f"""
+                SELECT DISTINCT a.date
+                FROM {table} a
+                JOIN students s ON a.student_id = s.id
+                WHERE s.teacher_id = ? AND a.date LIKE ?
+                ORDER BY a.date ASC
+                """,
+                (teacher_id, f"{month_str}%"),
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [row[0] for row in rows]
+
+    # ── Audit log ──
+
+    async def add_audit_entries(self, entries: list[tuple[int, int, str, str, str]]):
+        async def write(db):
+            await db.executemany(
+                """
+                INSERT INTO attendance_audit (teacher_id, student_id, date, action, changed_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                entries,
+            )
+
+        await self._write(write)
+
+    async def get_attendance_history(self, student_id: int, limit: int) -> list[dict]:
+        async with self._read() as db:
+            async with db.execute(
+                """
+                SELECT l.date, l.action, l.changed_at, l.teacher_id, t.name AS teacher_name
+                FROM attendance_audit l
+                LEFT JOIN teachers t ON t.id = l.teacher_id
+                WHERE l.student_id = ?
+                ORDER BY l.changed_at DESC, l.id DESC
+                LIMIT ?
+                """,
+                (student_id, limit),
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(r) for r in rows]
+
+    # ── Removals ──
+
+    async def start_removal(self, kind: str, target_id: int, chat_id: int | None, message_id: int | None) -> int:
+        async def write(db):
+            await db.execute(
+                """
+                INSERT INTO removals (kind, target_id, chat_id, message_id, started_at)
+                VALUES (?, ?, ?, ?, datetime('now'))
+                ON CONFLICT(kind, target_id) DO UPDATE SET chat_id = excluded.chat_id, message_id = excluded.message_id
+                """,
+                (kind, target_id, chat_id, message_id),
+            )
+
+        await self._write(write)
+        async with self._connect() as db:
+            async with db.execute(_REMOVAL_ROWS[kind].format(columns="COUNT(*)"), (target_id,)) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def delete_attendance_batch(self, kind: str, target_id: int, limit: int) -> int:
+        async def write(db):
+            cursor = await db.execute(
+                f"DELETE FROM attendance WHERE id IN ({_REMOVAL_ROWS[kind].format(columns='a.id')} LIMIT ?)",
+                (target_id, limit),
+            )
+            return cursor.rowcount
+
+        return await self._write(write)
+
+    async def pending_removals(self) -> list[dict]:
+        async with self._connect() as db:
+            async with db.execute(
+                "SELECT kind, target_id, chat_id, message_id FROM removals ORDER BY started_at"
+            ) as cursor:
+                return [dict(r) for r in await cursor.fetchall()]
@@ -0,0 +1,146 @@
+"""Schools (tenants) and where each school's data lives.
+
+Every school has its own SQLite shard. The school of the update being handled is
+kept in a context variable, set once per update from the user's Telegram id (see
+``handlers.session.touch_session``) and explicitly by jobs that loop over schools.
+The directory database maps Telegram ids to schools; users without an entry —
+including every teacher of a single-school install — belong to DEFAULT_SCHOOL,
+whose shard is the original DB_PATH.
+"""
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import aiosqlite
+
+from config import DB_PATH, SHARD_DIR, TENANT_DIRECTORY_PATH
+
+DEFAULT_SCHOOL = "default"
+
+_SCHOOL_ID = re.compile(r"^[a-z0-9_-]{1,32}$")
+
+_current: ContextVar[str] = ContextVar("school", default=DEFAULT_SCHOOL)
+
+
+def current() -> str:
+    """Return the school of the update or job being handled."""
+    return _current.get()
+
+
+def activate(school: str) -> None:
+    """Bind ``school`` for the rest of the current update."""
+    _current.set(school)
+
+
+def _check_id(school: str) -> None:
+    if not _SCHOOL_ID.match(school):
+        raise ValueError(f"Invalid school id {school!r}: use 1-32 of a-z, 0-9, '_' and '-'.")
+
+
+@contextmanager
+def use(school: str):
+    """Bind ``school`` for the duration of a block, e.g. one iteration of a job."""
+    token = _current.set(school)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def shard_path(school: str | None = None) -> str:
+    """Return the SQLite file holding a school's teachers, students and attendance."""
+    school = school or current()
+    if school == DEFAULT_SCHOOL:
+        return DB_PATH
+    _check_id(school)
+    return os.path.join(SHARD_DIR, f"{school}.db")
+
+
+def scoped_dir(base: str, school: str | None = None) -> str:
+    """Return a school's subdirectory of ``base`` (``base`` itself for DEFAULT_SCHOOL)."""
+    school = school or current()
+    return base if school == DEFAULT_SCHOOL else os.path.join(base, school)
+
+
+# ── Directory ────────────────────────────────────────────────────────────────
+
+async def init_directory():
+    """Create the directory tables if they don't exist."""
+    async with aiosqlite.connect(TENANT_DIRECTORY_PATH) as conn:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schools (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS memberships (
+                telegram_user_id INTEGER PRIMARY KEY,
+                school_id TEXT NOT NULL
+            )
+        """)
+        await conn.commit()
+
+
+async def add_school(school: str, name: str, rename: bool = True):
+    """Register a school. Its shard is created on first use.
+
+    An already registered school gets ``name`` only with ``rename``.
+    """
+    _check_id(school)
+    on_conflict = "DO UPDATE SET name = excluded.name" if rename else "DO NOTHING"
+    async with aiosqlite.connect(TENANT_DIRECTORY_PATH) as conn:
+        await conn.execute(f"INSERT INTO schools (id, name) VALUES (?, ?) ON CONFLICT(id) {on_conflict}", (school, name))
+        await conn.commit()
+
+
+async def all_schools() -> list[str]:
+    """Return DEFAULT_SCHOOL followed by every registered school."""
+    async with aiosqlite.connect(TENANT_DIRECTORY_PATH) as conn:
+        async with conn.execute("SELECT id FROM schools WHERE id != ? ORDER BY id", (DEFAULT_SCHOOL,)) as cursor:
+            rows = await cursor.fetchall()
+    return [DEFAULT_SCHOOL] + [row[0] for row in rows]
+
+
+async def school_of(telegram_user_id: int) -> str | None:
+    """Return the school a Telegram user is registered in, or None if they are in none."""
+    async with aiosqlite.connect(TENANT_DIRECTORY_PATH) as conn:
+        async with conn.execute(
+            "SELECT school_id FROM memberships WHERE telegram_user_id = ?", (telegram_user_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else None
+
+
+async def assign(telegram_user_id: int, school: str):
+    """Record that a Telegram user is a teacher of ``school``."""
+    async with aiosqlite.connect(TENANT_DIRECTORY_PATH) as conn:
+        await conn.execute(
+            "INSERT OR REPLACE INTO memberships (telegram_user_id, school_id) VALUES (?, ?)",
+            (telegram_user_id, school),
+        )
+        await conn.commit()
+
+
+async def assign_many(telegram_user_ids: list[int], school: str):
+    """Record that many Telegram users are teachers of ``school``, in one transaction."""
+    async with aiosqlite.connect(TENANT_DIRECTORY_PATH) as conn:
+        await conn.executemany(
+            "INSERT OR REPLACE INTO memberships (telegram_user_id, school_id) VALUES (?, ?)",
+            [(telegram_user_id, school) for telegram_user_id in telegram_user_ids],
+        )
+        await conn.commit()
+
+
+async def memberships() -> dict[int, str]:
+    """Return the school of every Telegram user in the directory."""
+    async with aiosqlite.connect(TENANT_DIRECTORY_PATH) as conn:
+        async with conn.execute("SELECT telegram_user_id, school_id FROM memberships") as cursor:
+            return dict(await cursor.fetchall())
+
+
+async def unassign(telegram_user_id: int):
+    async with aiosqlite.connect(TENANT_DIRECTORY_PATH) as conn:
+        await conn.execute("DELETE FROM memberships WHERE telegram_user_id = ?", (telegram_user_id,))
+        await conn.commit()
@@ -0,0 +1,270 @@
+"""Lightweight per-update tracing, exported to a local JSONL file.
+
+A sampled update gets a root span named after its handler. Each ``db`` call it
+makes gets a child span, and so does each Bot API request (``answerCallbackQuery``,
+``editMessageText``, ...). A slow tap then shows where its time went. Sampling is
+decided once per update: TRACE_SAMPLE_RATE, or the handler's rate in
+TRACE_SAMPLE_RATES. Spans outside a sampled update cost one context-variable
+lookup. With every rate at 0, ``instrument`` and ``request`` wrap nothing.
+
+When the root span ends, its trace is written as one line in the OTLP/JSON shape
+(``resourceSpans`` → ``scopeSpans`` → ``spans``), which OpenTelemetry collectors
+and viewers read. Spans that end later, e.g. in a background job the handler
+started, are written on a line of their own with the same trace id. As with
+logging (see ``logs``), a listener thread writes the file and rotates it, so the
+event loop never waits on the disk.
+"""
+import atexit
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from telegram.ext import Application
+from telegram.request import BaseRequest
+
+import db
+import logs
+from config import (
+    TRACE_FILE,
+    TRACE_FILE_BACKUPS,
+    TRACE_FILE_MAX_BYTES,
+    TRACE_SAMPLE_RATE,
+    TRACE_SAMPLE_RATES,
+)
+from handlers.updates import wrap_callbacks
+
+enabled = TRACE_SAMPLE_RATE > 0 or any(rate > 0 for rate in TRACE_SAMPLE_RATES.values())
+
+# OTLP span kinds.
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+# OTLP status codes.
+_STATUS_OK, _STATUS_ERROR = 1, 2
+
+# Finished traces go to this logger, whose only handler queues them for the file.
+_exporter = logging.getLogger("tracing.spans")
+_exporter.propagate = False
+_listener: logging.handlers.QueueListener | None = None
+_resource: dict = {}
+
+_current: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "exported")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: list[Span] = []
+        self.exported = False
+
+
+class Span:
+    """One timed operation of a trace."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: _Trace, parent: "Span | None", name: str, kind: int, attributes: dict):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else ""
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.error: str | None = None
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _attributes(self.attributes),
+            "status": {"code": _STATUS_ERROR, "message": self.error} if self.error else {"code": _STATUS_OK},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _attributes(values: dict) -> list[dict]:
+    attributes = []
+    for key, value in values.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        attributes.append({"key": key, "value": typed})
+    return attributes
+
+
+def _export(spans: list[Span]) -> None:
+    line = {
+        "resourceSpans": [{
+            "resource": {"attributes": _attributes(_resource)},
+            "scopeSpans": [{"scope": {"name": "cm-attendance"}, "spans": [span.to_otlp() for span in spans]}],
+        }]
+    }
+    _exporter.info(json.dumps(line, ensure_ascii=False, separators=(",", ":")))
+
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, **attributes):
+    """Time the block as a child of the current span; do nothing outside a sampled trace."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    current = Span(parent.trace, parent, name, kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end_ns = time.time_ns()
+        if current.trace.exported:
+            _export([current])
+        else:
+            current.trace.spans.append(current)
+
+
+@contextmanager
+def _root(name: str, attributes: dict):
+    trace = _Trace()
+    root = Span(trace, None, name, SERVER, attributes)
+    token = _current.set(root)
+    try:
+        with logs.bind(trace_id=trace.trace_id):
+            yield root
+    except BaseException as e:
+        root.error = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        root.end_ns = time.time_ns()
+        trace.exported = True
+        _export([root, *trace.spans])
+
+
+def _traced_handler(callback):
+    name = callback.__name__
+    rate = TRACE_SAMPLE_RATES.get(name, TRACE_SAMPLE_RATE)
+    if rate <= 0:
+        return callback
+
+    @functools.wraps(callback)
+    async def handle(update, context):
+        if random.random() >= rate:
+            return await callback(update, context)
+        with _root(name, {"handler": name, **logs.update_fields(update, context)}):
+            return await callback(update, context)
+
+    return handle
+
+
+def _traced_call(name: str, function):
+    @functools.wraps(function)
+    async def call(*args, **kwargs):
+        if _current.get() is None:
+            return await function(*args, **kwargs)
+        with span(name):
+            return await function(*args, **kwargs)
+
+    return call
+
+
+class TracedRequest(BaseRequest):
+    """Bot API transport that times every request as a client span of the current trace."""
+
+    __slots__ = ("_inner",)
+
+    def __init__(self, inner: BaseRequest):
+        self._inner = inner
+
+    @property
+    def read_timeout(self) -> float | None:
+        return self._inner.read_timeout
+
+    async def initialize(self) -> None:
+        await self._inner.initialize()
+
+    async def shutdown(self) -> None:
+        await self._inner.shutdown()
+
+    async def do_request(self, url: str, method: str, request_data=None, **timeouts) -> tuple[int, bytes]:
+        if _current.get() is None:
+            return await self._inner.do_request(url, method, request_data, **timeouts)
+        endpoint = url.rsplit("/", 1)[-1]
+        with span(f"telegram {endpoint}", CLIENT, **{"telegram.method": endpoint}) as current:
+            status, payload = await self._inner.do_request(url, method, request_data, **timeouts)
+            current.attributes["http.response.status_code"] = status
+            return status, payload
+
+
+def request(inner: BaseRequest) -> BaseRequest:
+    """Return the Bot API transport to build the application with: ``inner``, traced if enabled."""
+    return TracedRequest(inner) if enabled else inner
+
+
+def instrument(application: Application) -> None:
+    """Trace sampled updates of ``application`` and every ``db`` call they make.
+
+    Call it after ``logs.instrument``, so the handled-update record carries the
+    trace id. The ``db`` module's coroutine functions are replaced with traced ones.
+    """
+    if not enabled:
+        return
+    wrap_callbacks(application, _traced_handler)
+    for name, function in list(vars(db).items()):
+        if not name.startswith("_") and inspect.iscoroutinefunction(function) and function.__module__ == db.__name__:
+            setattr(db, name, _traced_call(f"db.{name}", function))
+
+
+def setup(process: str | None = None) -> None:
+    """Start writing traces to TRACE_FILE (one file per process in worker mode)."""
+    global _listener
+    if not enabled or _listener is not None:
+        return
+    path = TRACE_FILE
+    if process:
+        root, ext = os.path.splitext(TRACE_FILE)
+        path = f"{root}.{process}{ext}"
+    _resource.update({"service.name": "cm-attendance-bot", "process.pid": os.getpid()})
+    if process:
+        _resource["service.instance.id"] = process
+
+    file = logging.handlers.RotatingFileHandler(
+        path, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8"
+    )
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _exporter.addHandler(logging.handlers.QueueHandler(records))
+    _exporter.setLevel(logging.INFO)
+    _listener = logging.handlers.QueueListener(records, file)
+    _listener.start()
+    atexit.register(stop)
+
+
+def stop() -> None:
+    """Write out the queued traces and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,316 @@
+"""Multi-process worker mode: a webhook front receiver and N bot worker processes.
+
+    python workers.py                 # WORKERS workers behind the webhook on WEBHOOK_PORT
+    python workers.py --workers 8
+
+The front process parses each incoming update only far enough to find its user
+and hands it to worker ``user_id % N`` over a pipe, so a user's conversation
+state, which lives in the worker's memory, always stays on the same worker.
+Workers run the full Application against the shared database. Cache
+invalidations one worker publishes (see ``invalidation``) are relayed to all
+the others through the front.
+
+The front never writes to a pipe from its event loop. Each worker has an outbox
+and a sender thread, so a worker whose pipe is full (busy with a long update)
+holds up only its own updates, not the routing of everyone else's.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+from multiprocessing.connection import Connection
+from typing import Callable
+from urllib.parse import urlparse
+
+import logs
+import tracing
+from config import BOT_TOKEN, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL, WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Telegram's updates are a few KB; a larger body is refused before it is read.
+MAX_UPDATE_BYTES = 1 << 20
+_MAX_HEADERS = 100
+
+
+def _user_id(update: dict) -> int | None:
+    """Return the id of the user (or, failing that, the chat) an update comes from."""
+    for value in update.values():
+        if isinstance(value, dict):
+            sender = value.get("from") or value.get("user") or value.get("chat")
+            if sender:
+                return sender["id"]
+    return None
+
+
+def route(update: dict, workers: int) -> int:
+    """Return the index of the worker that owns this update's user."""
+    user_id = _user_id(update)
+    return 0 if user_id is None else user_id % workers
+
+
+# ── Worker process ───────────────────────────────────────────────────────────
+
+def _worker_main(index: int, conn: Connection, request_factory: Callable | None, log_level: int) -> None:
+    logs.setup(log_level, f"worker{index}")
+    tracing.setup(f"worker{index}")
+    # The front handles Ctrl+C and tells workers to stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, conn, request_factory))
+
+
+async def _run_worker(index: int, conn: Connection, request_factory: Callable | None) -> None:
+    from telegram import Update
+
+    import bot
+    import invalidation
+
+    application = bot.build_application(
+        request=request_factory() if request_factory else None, global_jobs=index == 0
+    )
+    invalidation.set_relay(lambda kind, key: conn.send(("invalidate", kind, key)))
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    finished = 0
+
+    def report_finished():
+        nonlocal finished
+        conn.send(("processed", finished))
+        finished = 0
+
+    def on_finished(_task: asyncio.Task):
+        nonlocal finished
+        finished += 1
+        if finished == 1:
+            # Updates finishing in the same loop iteration are reported together.
+            loop.call_soon(report_finished)
+
+    def on_readable():
+        while conn.poll():
+            message = conn.recv()
+            if message[0] == "update":
+                update = Update.de_json(json.loads(message[1]), application.bot)
+                # Through the update processor, as run_polling does: up to CONCURRENT_UPDATES at once,
+                # each user's in arrival order, so different teachers' writes share group commits.
+                task = application.create_task(
+                    application.update_processor.process_update(update, application.process_update(update)),
+                    update=update,
+                )
+                task.add_done_callback(on_finished)
+            elif message[0] == "invalidate":
+                invalidation.deliver(message[1], message[2])
+            elif message[0] == "stop":
+                stopping.set()
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    loop.add_reader(conn.fileno(), on_readable)
+    conn.send(("ready", index))
+
+    await stopping.wait()
+    loop.remove_reader(conn.fileno())
+    # Waits for the updates still being handled.
+    await application.stop()
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+    conn.send(("stopped", index))
+
+
+# ── Front receiver ───────────────────────────────────────────────────────────
+
+class Front:
+    """Spawns the workers, routes updates to them and relays their invalidations.
+
+    ``request_factory`` is called in each worker to build its Bot API transport
+    (the load benchmarks pass the in-process fake); by default workers talk to
+    Telegram directly.
+    """
+
+    def __init__(self, workers: int, request_factory: Callable | None = None, log_level: int = logging.INFO):
+        self.workers = workers
+        self.request_factory = request_factory
+        self.log_level = log_level
+        self.sent = 0
+        self.processed = 0
+        self._conns: list[Connection] = []
+        self._outboxes: list[queue.SimpleQueue] = []
+        self._senders: list[threading.Thread] = []
+        self._processes: list[multiprocessing.Process] = []
+        self._ready = 0
+        self._stopped = 0
+        self._changed = asyncio.Event()
+
+    async def start(self) -> None:
+        context = multiprocessing.get_context("spawn")
+        loop = asyncio.get_running_loop()
+        for index in range(self.workers):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=_worker_main, args=(index, child, self.request_factory, self.log_level), name=f"worker{index}"
+            )
+            process.start()
+            child.close()
+            self._conns.append(parent)
+            self._processes.append(process)
+            self._outboxes.append(queue.SimpleQueue())
+            sender = threading.Thread(target=self._sender, args=(index,), name=f"sender{index}", daemon=True)
+            sender.start()
+            self._senders.append(sender)
+            loop.add_reader(parent.fileno(), self._on_readable, index)
+        await self._wait(lambda: self._ready == self.workers)
+        logger.info("%d workers ready.", self.workers)
+
+    def _send(self, index: int, message: tuple) -> None:
+        """Queue ``message`` for worker ``index``; its sender thread writes it to the pipe."""
+        self._outboxes[index].put(message)
+
+    def _sender(self, index: int) -> None:
+        conn, outbox = self._conns[index], self._outboxes[index]
+        while (message := outbox.get()) is not None:
+            try:
+                conn.send(message)
+            except OSError:
+                logger.error("Cannot write to worker %d; its updates are dropped.", index)
+                return
+
+    def _on_readable(self, index: int) -> None:
+        conn = self._conns[index]
+        try:
+            while conn.poll():
+                message = conn.recv()
+                if message[0] == "processed":
+                    self.processed += message[1]
+                elif message[0] == "invalidate":
+                    for other in range(self.workers):
+                        if other != index:
+                            self._send(other, message)
+                elif message[0] == "ready":
+                    self._ready += 1
+                elif message[0] == "stopped":
+                    self._stopped += 1
+        except EOFError:
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            if self._stopped < self.workers:
+                logger.error("Worker %d exited.", index)
+        self._changed.set()
+
+    async def _wait(self, condition: Callable[[], bool]) -> None:
+        while not condition():
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def wait_processed(self, count: int) -> None:
+        """Wait until workers have processed ``count`` updates in total."""
+        await self._wait(lambda: self.processed >= count)
+
+    def dispatch(self, body: bytes) -> int:
+        """Send a raw update to its worker and return the worker's index."""
+        index = route(json.loads(body), self.workers)
+        self._send(index, ("update", body))
+        self.sent += 1
+        return index
+
+    async def listen(self, host: str, port: int, secret: str = "", path: str = "") -> asyncio.Server:
+        """Accept Telegram's webhook POSTs on ``host:port``.
+
+        The method, path and secret token are checked, and the body size is capped
+        at MAX_UPDATE_BYTES, before any of the body is read. A refused request's body
+        is left unread, so its connection is closed after the response.
+        """
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while request_line := await reader.readline():
+                    headers = {}
+                    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        if len(headers) == _MAX_HEADERS:
+                            raise ValueError("Too many headers")
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                    length = int(headers.get("content-length", 0))
+                    if method != "POST" or (path and urlparse(target).path != path):
+                        status = "404 Not Found"
+                    elif secret and headers.get("x-telegram-bot-api-secret-token") != secret:
+                        status = "403 Forbidden"
+                    elif not 0 <= length <= MAX_UPDATE_BYTES:
+                        status = "413 Content Too Large"
+                    else:
+                        body = await reader.readexactly(length)
+                        try:
+                            self.dispatch(body)
+                            status = "200 OK"
+                        except (ValueError, KeyError, TypeError):
+                            status = "400 Bad Request"
+                    refused = not status.startswith(("200", "400"))  # its body is still unread
+                    closing = refused or headers.get("connection", "").lower() == "close"
+                    connection = "Connection: close\r\n" if closing else ""
+                    writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n{connection}\r\n".encode())
+                    await writer.drain()
+                    if closing:
+                        break
+            except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                pass
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+    async def stop(self) -> None:
+        for index in range(self.workers):
+            self._send(index, ("stop",))
+        await self._wait(lambda: self._stopped == self.workers)
+        for process in self._processes:
+            await asyncio.to_thread(process.join)
+        for outbox, sender in zip(self._outboxes, self._senders):
+            outbox.put(None)
+            await asyncio.to_thread(sender.join)
+        loop = asyncio.get_running_loop()
+        for conn in self._conns:
+            loop.remove_reader(conn.fileno())
+            conn.close()
+        self._conns.clear()
+        self._outboxes.clear()
+        self._senders.clear()
+
+
+async def serve(workers: int) -> None:
+    """Run the front receiver and its workers until SIGINT/SIGTERM."""
+    from telegram import Bot, Update
+
+    front = Front(workers)
+    await front.start()
+    server = await front.listen(
+        WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, urlparse(WEBHOOK_URL).path if WEBHOOK_URL else ""
+    )
+    if WEBHOOK_URL:
+        async with Bot(BOT_TOKEN) as telegram_bot:
+            await telegram_bot.set_webhook(
+                url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET or None, allowed_updates=Update.ALL_TYPES
+            )
+    logger.info("Receiving updates on %s:%d for %d workers.", WEBHOOK_LISTEN, WEBHOOK_PORT, workers)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    server.close()
+    await server.wait_closed()
+    await front.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the bot as a webhook front and worker processes.")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="number of worker processes")
+    args = parser.parse_args()
+    logs.setup(process="front")
+    asyncio.run(serve(args.workers))